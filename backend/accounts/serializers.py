@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from core.expansion import ExpandableFieldsMixin
 from .models import FarmerProfile, BuyerProfile
 
 User = get_user_model()
@@ -27,20 +28,36 @@ class BuyerProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class UserSerializer(serializers.ModelSerializer):
-    farmer_profile = FarmerProfileSerializer(read_only=True)
-    buyer_profile = BuyerProfileSerializer(read_only=True)
+class UserSummarySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    # Embedded in market and finance payloads: profiles are only rendered
+    # (and joined) when asked for, e.g. ?expand=buyer.buyer_profile
+    expandable_fields = {
+        'farmer_profile': (FarmerProfileSerializer, {}),
+        'buyer_profile': (BuyerProfileSerializer, {}),
+    }
     
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'phone', 'role', 
             'is_verified', 'first_name', 'last_name',
-            'farmer_profile', 'buyer_profile', 'created_at', 'updated_at'
+            'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'is_verified']
 
 
+class UserSerializer(UserSummarySerializer):
+    farmer_profile = FarmerProfileSerializer(read_only=True)
+    buyer_profile = BuyerProfileSerializer(read_only=True)
+    
+    class Meta(UserSummarySerializer.Meta):
+        fields = [
+            'id', 'username', 'email', 'phone', 'role', 
+            'is_verified', 'first_name', 'last_name',
+            'farmer_profile', 'buyer_profile', 'created_at', 'updated_at'
+        ]
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True, min_length=8)
@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agrobid.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from market import streams  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Live bid events (WebSocket / SSE) are served outside the Django request cycle
+    if scope['type'] in ('http', 'websocket') and streams.handles(scope):
+        await streams.bid_stream(scope, receive, send)
+    elif scope['type'] == 'websocket':
+        await send({'type': 'websocket.close', 'code': 4404})
+    else:
+        await django_application(scope, receive, send)
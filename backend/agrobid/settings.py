@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -56,6 +58,7 @@ INSTALLED_APPS = [
     'logistics',
     'finance',
     'ai_assistant',
+    'uploads',
 ]
 
 MIDDLEWARE = [
@@ -151,7 +154,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    # Uploaded media is stored once per distinct content (see uploads.storage)
+    'default': {
+        'BACKEND': 'uploads.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -166,6 +177,10 @@ CORS_ALLOWED_ORIGINS = config(
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Resumable upload protocol headers (uploads app)
+CORS_ALLOW_HEADERS = (*default_headers, 'upload-offset')
+CORS_EXPOSE_HEADERS = ['Upload-Offset', 'Upload-Length', 'Location']
+
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -196,6 +211,76 @@ SIMPLE_JWT = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Listing photos (market.images): upload limit, decoded size limit (a 40 MP
+# RGB image takes ~120 MB to decode), stored size cap and the number of
+# background threads rendering WebP variants (0 = inline)
+LISTING_IMAGE_MAX_BYTES = config('LISTING_IMAGE_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LISTING_IMAGE_MAX_PIXELS = config('LISTING_IMAGE_MAX_PIXELS', default=40_000_000, cast=int)
+LISTING_IMAGE_MAX_DIMENSION = config('LISTING_IMAGE_MAX_DIMENSION', default=2048, cast=int)
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+
+# Resumable uploads: chunks are spooled here until the upload is finalized
+UPLOAD_SPOOL_DIR = config('UPLOAD_SPOOL_DIR', default=str(BASE_DIR / 'upload_spool'))
+UPLOAD_CHUNK_MAX_BYTES = config('UPLOAD_CHUNK_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+UPLOAD_DOCUMENT_MAX_BYTES = config('UPLOAD_DOCUMENT_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+UPLOAD_SESSION_TTL_HOURS = config('UPLOAD_SESSION_TTL_HOURS', default=24, cast=int)
+
+# Cache lifetime for the read-only catalog endpoints (regions, crops, quality parameters)
+CATALOG_CACHE_SECONDS = config('CATALOG_CACHE_SECONDS', default=3600, cast=int)
+
+# Live bid stream (agrobid.asgi). Swap the backend to share events across nodes.
+PUBSUB_BACKEND = config('PUBSUB_BACKEND', default='core.pubsub.InMemoryBroker')
+STREAM_HEARTBEAT_SECONDS = config('STREAM_HEARTBEAT_SECONDS', default=25, cast=int)
+
+# Listing expiry sweeper. Set LISTING_EXPIRY_SWEEP_SECONDS > 0 to run it from
+# the `manage.py run_scheduler` process (one per deployment, never the web
+# workers); otherwise run `manage.py expire_listings` from cron.
+LISTING_EXPIRY_SWEEP_SECONDS = config('LISTING_EXPIRY_SWEEP_SECONDS', default=0, cast=int)
+LISTING_EXPIRY_BATCH_SIZE = config('LISTING_EXPIRY_BATCH_SIZE', default=500, cast=int)
+
+# Auction closer, same scheduling options as the expiry sweeper
+# (or `manage.py close_auctions` from cron).
+AUCTION_CLOSE_SECONDS = config('AUCTION_CLOSE_SECONDS', default=0, cast=int)
+AUCTION_CLOSE_BATCH_SIZE = config('AUCTION_CLOSE_BATCH_SIZE', default=200, cast=int)
+
+# Ledger balance snapshots, same scheduling options as the expiry sweeper
+# (or `manage.py snapshot_ledger` from cron).
+LEDGER_SNAPSHOT_SECONDS = config('LEDGER_SNAPSHOT_SECONDS', default=0, cast=int)
+
+# Payment gateway. The default client talks to PAYMENT_GATEWAY_URL; for local
+# development point it at `manage.py run_gateway_standin`. Webhooks are queued
+# and applied every WEBHOOK_PROCESS_SECONDS by `manage.py run_scheduler` when
+# > 0, otherwise run `manage.py process_webhooks` from cron or as a worker.
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='finance.gateway.HttpGateway')
+PAYMENT_GATEWAY_URL = config('PAYMENT_GATEWAY_URL', default='http://127.0.0.1:8765')
+PAYMENT_GATEWAY_KEY = config('PAYMENT_GATEWAY_KEY', default='')
+PAYMENT_GATEWAY_TIMEOUT = config('PAYMENT_GATEWAY_TIMEOUT', default=10, cast=int)
+# The default webhook secret is public, so production refuses to start with it
+DEV_WEBHOOK_SECRET = 'dev-webhook-secret'
+PAYMENT_WEBHOOK_SECRET = config('PAYMENT_WEBHOOK_SECRET', default=DEV_WEBHOOK_SECRET)
+if not DEBUG and PAYMENT_WEBHOOK_SECRET in ('', DEV_WEBHOOK_SECRET):
+    raise ImproperlyConfigured('Set PAYMENT_WEBHOOK_SECRET to the gateway\'s webhook secret when DEBUG is off')
+WEBHOOK_PROCESS_SECONDS = config('WEBHOOK_PROCESS_SECONDS', default=0, cast=int)
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=100, cast=int)
+
+# Escrow release: delivered orders are paid out to the farmer once the dispute
+# window has passed. Same scheduling options as the expiry sweeper (or
+# `manage.py release_escrow` from cron).
+ESCROW_DISPUTE_WINDOW_HOURS = config('ESCROW_DISPUTE_WINDOW_HOURS', default=72, cast=int)
+ESCROW_RELEASE_SECONDS = config('ESCROW_RELEASE_SECONDS', default=0, cast=int)
+ESCROW_RELEASE_BATCH_SIZE = config('ESCROW_RELEASE_BATCH_SIZE', default=200, cast=int)
+
+# Number of precomputed listing recommendations kept per buyer. New listings
+# and orders only queue rescoring work; it is applied every
+# RECOMMENDATIONS_PROCESS_SECONDS by `manage.py run_scheduler` when > 0,
+# otherwise run `manage.py process_recommendations` from cron or as a worker.
+RECOMMENDATIONS_PER_BUYER = config('RECOMMENDATIONS_PER_BUYER', default=50, cast=int)
+RECOMMENDATIONS_PROCESS_SECONDS = config('RECOMMENDATIONS_PROCESS_SECONDS', default=0, cast=int)
+RECOMMENDATIONS_BATCH_SIZE = config('RECOMMENDATIONS_BATCH_SIZE', default=500, cast=int)
+
+# Upper bound on the number of bids accepted by POST /api/bids/bulk/
+BULK_BID_MAX_ITEMS = config('BULK_BID_MAX_ITEMS', default=500, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -29,6 +29,7 @@ urlpatterns = [
     path('api/', include('market.urls')),
     path('api/', include('finance.urls')),
     path('api/', include('logistics.urls')),
+    path('api/', include('uploads.urls')),
     path('api/ai/', include('ai_assistant.urls')),
     
     # JWT token refresh
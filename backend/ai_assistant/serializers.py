@@ -21,6 +21,8 @@ class BidAnalysisSerializer(serializers.ModelSerializer):
     bid_amount = serializers.DecimalField(source='bid.amount_per_quintal', max_digits=10, decimal_places=2, read_only=True)
     buyer_name = serializers.CharField(source='bid.buyer.username', read_only=True)
     
+    select_related_fields = ['bid__buyer']
+    
     class Meta:
         model = BidAnalysis
         fields = [
@@ -36,6 +38,8 @@ class HistoricalPriceSerializer(serializers.ModelSerializer):
     
     crop_variety_name = serializers.CharField(source='crop_variety.name', read_only=True)
     
+    select_related_fields = ['crop_variety']
+    
     class Meta:
         model = HistoricalPrice
         fields = [
@@ -51,6 +55,8 @@ class MarketIntelligenceSerializer(serializers.ModelSerializer):
     
     crop_variety_name = serializers.CharField(source='crop_variety.name', read_only=True)
     
+    select_related_fields = ['crop_variety']
+    
     class Meta:
         model = MarketIntelligence
         fields = [
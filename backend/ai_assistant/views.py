@@ -11,6 +11,7 @@ from .serializers import (
     HistoricalPriceSerializer, MarketIntelligenceSerializer
 )
 from .services import get_ai_service
+from core.expansion import EagerLoadingMixin
 from market.models import CropListing, Bid
 
 
@@ -220,7 +221,7 @@ def get_negotiation_tips(request, listing_id):
 
 # ViewSets for admin/management access
 
-class PriceRecommendationViewSet(viewsets.ReadOnlyModelViewSet):
+class PriceRecommendationViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing price recommendations."""
     queryset = PriceRecommendation.objects.all()
     serializer_class = PriceRecommendationSerializer
@@ -234,7 +235,7 @@ class PriceRecommendationViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset.none()
 
 
-class BidAnalysisViewSet(viewsets.ReadOnlyModelViewSet):
+class BidAnalysisViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing bid analyses."""
     queryset = BidAnalysis.objects.all()
     serializer_class = BidAnalysisSerializer
@@ -248,7 +249,7 @@ class BidAnalysisViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset.none()
 
 
-class HistoricalPriceViewSet(viewsets.ReadOnlyModelViewSet):
+class HistoricalPriceViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing historical price data."""
     queryset = HistoricalPrice.objects.all()
     serializer_class = HistoricalPriceSerializer
@@ -257,7 +258,7 @@ class HistoricalPriceViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['transaction_date', 'price_per_quintal']
 
 
-class MarketIntelligenceViewSet(viewsets.ReadOnlyModelViewSet):
+class MarketIntelligenceViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing market intelligence."""
     queryset = MarketIntelligence.objects.all()
     serializer_class = MarketIntelligenceSerializer
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Region, CropVariety, QualityParameter
+from .models import Region, CropVariety, QualityParameter, PincodeCentroid
 
 
 @admin.register(Region)
@@ -20,3 +20,10 @@ class CropVarietyAdmin(admin.ModelAdmin):
 class QualityParameterAdmin(admin.ModelAdmin):
     list_display = ['parameter_name', 'acceptable_range']
     search_fields = ['parameter_name']
+
+
+@admin.register(PincodeCentroid)
+class PincodeCentroidAdmin(admin.ModelAdmin):
+    list_display = ['pincode', 'district', 'state', 'latitude', 'longitude']
+    list_filter = ['state']
+    search_fields = ['pincode', 'district']
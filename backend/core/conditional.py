@@ -0,0 +1,91 @@
+"""
+Conditional GET support (ETag / Last-Modified) for polled endpoints.
+
+The validator is a cheap watermark over the user-scoped queryset:
+``MAX(updated_at)`` plus a row count (so deletes are noticed), hashed together
+with the user and the full query string. A matching ``If-None-Match`` or
+``If-Modified-Since`` returns ``304 Not Modified`` before anything is
+serialized.
+
+Nested objects pulled in with ``?expand=`` are not part of the watermark.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, *parts):
+    raw = '|'.join(str(part) for part in (request.user.pk, request.get_full_path(), *parts))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def is_not_modified(request, etag, last_modified=None):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if if_modified_since and last_modified:
+        return int(last_modified.timestamp()) <= if_modified_since
+    return False
+
+
+def conditional_response(request, etag, last_modified, build_response):
+    """
+    Return a 304 if the client's validators still match, otherwise call
+    ``build_response()`` and stamp the validators on its response.
+    """
+    if is_not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build_response()
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: caches may store it but must revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def queryset_watermark(queryset, field='updated_at'):
+    """Return (last_modified, row_count) for a queryset in one query"""
+    mark = queryset.order_by().aggregate(last_modified=Max(field), count=Count('pk'))
+    return mark['last_modified'], mark['count']
+
+
+class ConditionalGetMixin:
+    """ViewSet mixin adding ETag / Last-Modified handling to list and retrieve"""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        last_modified, count = queryset_watermark(queryset)
+        etag = make_etag(request, last_modified, count)
+        return conditional_response(
+            request, etag, last_modified,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag(request, instance.pk, instance.updated_at)
+        return conditional_response(
+            request, etag, instance.updated_at,
+            lambda: Response(self.get_serializer(instance).data)
+        )
+
+
+class CatalogCacheMixin:
+    """Long-lived public cache headers for rarely changing reference data"""
+    cache_max_age = None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            max_age = self.cache_max_age or settings.CATALOG_CACHE_SECONDS
+            patch_cache_control(response, public=True, max_age=max_age)
+        return response
@@ -0,0 +1,125 @@
+"""
+Sparse fieldsets and on-demand expansion of related objects.
+
+Serializers using ``ExpandableFieldsMixin`` render relations as plain ids by
+default. Clients opt in to nested objects with ``?expand=listing,bid.buyer``
+and trim the payload with ``?fields=id,status,listing.id``. Dotted paths are
+handed down to the nested serializer.
+"""
+
+EXPAND_PARAM = 'expand'
+FIELDS_PARAM = 'fields'
+
+
+def parse_paths(value):
+    """Split a comma separated query param into a list of dotted paths"""
+    if not value:
+        return []
+    return [path.strip() for path in value.split(',') if path.strip()]
+
+
+def split_paths(paths):
+    """
+    Split dotted paths into the top-level names and the remaining sub-paths
+    per name: ['a', 'b.c', 'b.d'] -> ({'a', 'b'}, {'a': [], 'b': ['c', 'd']})
+    """
+    top, children = set(), {}
+    for path in paths:
+        name, _, rest = path.partition('.')
+        top.add(name)
+        children.setdefault(name, [])
+        if rest:
+            children[name].append(rest)
+    return top, children
+
+
+class ExpandableFieldsMixin:
+    """
+    Declare nested serializers for relations with ``expandable_fields``::
+
+        expandable_fields = {
+            'listing': (CropListingSerializer, {}),
+        }
+
+    The declared field of the same name (typically a read-only
+    PrimaryKeyRelatedField) is used when the relation is not expanded.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if expand is None:
+            expand = parse_paths(request.query_params.get(EXPAND_PARAM)) if request else []
+        if fields is None:
+            fields = parse_paths(request.query_params.get(FIELDS_PARAM)) if request else []
+
+        expand_names, expand_children = split_paths(expand)
+        field_names, field_children = split_paths(fields)
+
+        for name in expand_names & set(self.expandable_fields):
+            serializer_class, options = self.expandable_fields[name]
+            if issubclass(serializer_class, ExpandableFieldsMixin):
+                options = dict(
+                    options,
+                    expand=expand_children[name],
+                    fields=field_children.get(name, []),
+                )
+            self.fields[name] = serializer_class(read_only=True, **options)
+
+        if field_names:
+            for name in list(self.fields):
+                if name not in field_names and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+
+def get_eager_relations(serializer_class, expand=(), fields=(), prefix=''):
+    """
+    Return the ``(select_related, prefetch_related)`` lookups a serializer
+    needs to render the requested shape without a query per row.
+
+    Serializers declare the relations they always touch with
+    ``select_related_fields`` / ``prefetch_related_fields``; expanded
+    relations are joined and their serializers' declarations are added
+    under the relation's prefix. Relations trimmed away by ``fields`` are
+    skipped.
+    """
+    select = [prefix + name for name in getattr(serializer_class, 'select_related_fields', ())]
+    prefetch = [prefix + name for name in getattr(serializer_class, 'prefetch_related_fields', ())]
+
+    expandable = getattr(serializer_class, 'expandable_fields', {})
+    expand_names, expand_children = split_paths(expand)
+    field_names, field_children = split_paths(fields)
+    for name in expand_names & set(expandable):
+        if field_names and name not in field_names:
+            continue
+        child_class, options = expandable[name]
+        lookup = prefix + options.get('source', name).replace('.', '__')
+        select.append(lookup)
+        child_select, child_prefetch = get_eager_relations(
+            child_class, expand_children[name], field_children.get(name, []), lookup + '__'
+        )
+        select.extend(child_select)
+        prefetch.extend(child_prefetch)
+    return select, prefetch
+
+
+class EagerLoadingMixin:
+    """
+    ViewSet mixin that applies the serializer's eager-loading declarations
+    (plus whatever the request expands) in ``get_queryset``.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        select, prefetch = get_eager_relations(
+            self.get_serializer_class(),
+            parse_paths(params.get(EXPAND_PARAM)),
+            parse_paths(params.get(FIELDS_PARAM)),
+        )
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
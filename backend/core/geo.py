@@ -0,0 +1,68 @@
+"""
+Geographic helpers for distance searches.
+
+Listings are bucketed into a fixed lat/lon grid so a radius query only scans
+the handful of cells overlapping the search circle via an index range scan,
+instead of computing a distance for every row in the table.
+"""
+import math
+
+from django.db.models import Avg
+
+from .models import PincodeCentroid
+
+# ~11 km per cell of latitude; cells are smaller in km east-west
+GRID_CELL_DEGREES = 0.1
+
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LON_EQUATOR = 111.32
+
+
+def grid_cell(latitude, longitude):
+    """Return the (row, col) grid cell containing a point"""
+    return (
+        math.floor(latitude / GRID_CELL_DEGREES),
+        math.floor(longitude / GRID_CELL_DEGREES),
+    )
+
+
+def km_per_degree_lon(latitude):
+    return KM_PER_DEGREE_LON_EQUATOR * math.cos(math.radians(latitude))
+
+
+def grid_window(latitude, longitude, radius_km):
+    """Return ((row_min, row_max), (col_min, col_max)) covering a search circle"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / max(km_per_degree_lon(latitude), 1e-6)
+    row_min, col_min = grid_cell(latitude - dlat, longitude - dlon)
+    row_max, col_max = grid_cell(latitude + dlat, longitude + dlon)
+    return (row_min, row_max), (col_min, col_max)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in km"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def locate_pincode(pincode):
+    """Return (latitude, longitude) for a pincode, or None if unknown"""
+    if not pincode:
+        return None
+    return PincodeCentroid.objects.filter(pincode=pincode.strip()).values_list(
+        'latitude', 'longitude'
+    ).first()
+
+
+def locate_district(state, district):
+    """Return the centroid of all known pincodes in a district, or None"""
+    centre = PincodeCentroid.objects.filter(
+        state__iexact=state, district__iexact=district
+    ).aggregate(latitude=Avg('latitude'), longitude=Avg('longitude'))
+    if centre['latitude'] is None:
+        return None
+    return centre['latitude'], centre['longitude']
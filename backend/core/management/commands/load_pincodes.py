@@ -0,0 +1,46 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from core.models import PincodeCentroid
+
+DEFAULT_CSV = Path(__file__).resolve().parents[2] / 'data' / 'pincode_centroids.csv'
+
+
+class Command(BaseCommand):
+    help = 'Load pincode centroids from a CSV (pincode,district,state,latitude,longitude)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_CSV))
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        loaded = 0
+        batch = []
+
+        with open(options['path'], newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                batch.append(PincodeCentroid(
+                    pincode=row['pincode'].strip(),
+                    district=row['district'].strip(),
+                    state=row['state'].strip(),
+                    latitude=float(row['latitude']),
+                    longitude=float(row['longitude']),
+                ))
+                if len(batch) >= batch_size:
+                    loaded += self.save_batch(batch)
+                    batch = []
+        if batch:
+            loaded += self.save_batch(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} pincode centroids'))
+
+    def save_batch(self, batch):
+        PincodeCentroid.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['pincode'],
+            update_fields=['district', 'state', 'latitude', 'longitude'],
+        )
+        return len(batch)
@@ -0,0 +1,33 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from core import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic maintenance jobs declared by the apps until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', action='append', default=[], metavar='JOB',
+            help='Run only this job (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        jobs = scheduler.registered_jobs()
+        unknown = set(options['only']) - set(jobs)
+        if unknown:
+            raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}")
+
+        tasks = scheduler.start_registered(options['only'])
+        if not tasks:
+            raise CommandError('No jobs enabled; set their *_SECONDS settings above 0')
+        for task in tasks:
+            self.stdout.write(f'Running {task.name} every {task.interval_seconds}s')
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.stop_all()
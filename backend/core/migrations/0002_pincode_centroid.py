@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PincodeCentroid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.CharField(max_length=10, unique=True)),
+                ('district', models.CharField(max_length=50)),
+                ('state', models.CharField(max_length=50)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'district'], name='pincode_district_idx')],
+            },
+        ),
+    ]
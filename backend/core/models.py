@@ -15,6 +15,26 @@ class Region(models.Model):
         return f"{self.district}, {self.state}"
 
 
+class PincodeCentroid(models.Model):
+    """
+    Approximate centre of a postal pincode, used for distance searches.
+    Loaded from core/data/pincode_centroids.csv with `manage.py load_pincodes`.
+    """
+    pincode = models.CharField(max_length=10, unique=True)
+    district = models.CharField(max_length=50)
+    state = models.CharField(max_length=50)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'district'], name='pincode_district_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.pincode} ({self.district}, {self.state})"
+
+
 class CropVariety(models.Model):
     """
     Different varieties of Paddy rice.
@@ -0,0 +1,52 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PageNumberFallback(PageNumberPagination):
+    """Page-number mode of ``KeysetPagination``; honours the same ``?page_size=``"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination with a page-number fallback.
+
+    Cursor mode avoids the COUNT(*) and OFFSET scan of page numbers, so deep
+    pages cost the same as the first one. Clients that need page numbers
+    (e.g. the admin UI) opt in by sending ``?page=``. Views that use
+    OrderingFilter must declare a default ``ordering`` for the cursor key.
+
+    Views whose results can be ordered by a computed score (relevance,
+    distance) list the triggering query params in ``ranked_query_params``;
+    those requests also fall back to page numbers since a score is not a
+    stable cursor key.
+    """
+    ordering = '-created_at'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self):
+        self.page_number_paginator = None
+
+    def use_page_numbers(self, request, view):
+        params = request.query_params
+        if PageNumberPagination.page_query_param in params:
+            return True
+        return any(params.get(param) for param in getattr(view, 'ranked_query_params', ()))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_page_numbers(request, view):
+            self.page_number_paginator = PageNumberFallback()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        self.page_number_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.to_html()
+        return super().to_html()
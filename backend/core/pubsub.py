@@ -0,0 +1,90 @@
+"""
+Topic-based pub/sub used to push live events to streaming clients.
+
+Publishers call ``get_broker().publish(topic, message)`` from any thread;
+subscribers are asyncio consumers (one per open WebSocket/SSE connection)
+that read from a bounded per-connection queue.
+
+The backend is chosen with ``settings.PUBSUB_BACKEND``. ``InMemoryBroker``
+fans out within one process. A cross-node backend only has to implement the
+same ``subscribe`` / ``unsubscribe`` / ``publish`` methods, e.g. by relaying
+``publish`` through Redis and feeding received messages to a local
+``InMemoryBroker``.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """A single consumer's queue. Slow consumers lose their oldest messages."""
+
+    def __init__(self, topics, loop, max_queue=100):
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InMemoryBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, max_queue=100):
+        """Register a consumer on the running event loop"""
+        subscription = Subscription(topics, asyncio.get_running_loop(), max_queue)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def publish(self, topic, message):
+        """Thread-safe; may be called from sync request code"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Event loop already closed; the connection is gone
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, topic=None):
+        with self._lock:
+            if topic is not None:
+                return len(self._subscribers.get(topic, ()))
+            return len({s for subs in self._subscribers.values() for s in subs})
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.PUBSUB_BACKEND)()
+    return _broker
@@ -0,0 +1,80 @@
+"""
+Minimal in-process scheduler for periodic maintenance jobs.
+
+Apps declare their jobs with ``register()`` from ``AppConfig.ready()``;
+nothing runs until ``manage.py run_scheduler`` starts them, so migrate,
+shell, tests and every web worker stay free of background threads. Each job
+runs on its own daemon thread, so it only suits light batch work (sweepers,
+closers). Jobs can also be run from cron through their own management
+command; every job here is written to be safe when several processes run it
+at once.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_jobs = {}
+_tasks = {}
+_lock = threading.Lock()
+
+
+class PeriodicTask(threading.Thread):
+    def __init__(self, name, interval_seconds, func):
+        super().__init__(name=f'periodic-{name}', daemon=True)
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval_seconds):
+            try:
+                self.func()
+            except Exception:
+                logger.exception('Periodic task %s failed', self.name)
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_periodic(name, interval_seconds, func):
+    """Start ``func`` every ``interval_seconds`` unless a task with this name is already running"""
+    with _lock:
+        if name in _tasks:
+            return _tasks[name]
+        task = PeriodicTask(name, interval_seconds, func)
+        _tasks[name] = task
+        task.start()
+        return task
+
+
+def stop_all():
+    with _lock:
+        for task in _tasks.values():
+            task.stop()
+        _tasks.clear()
+
+
+def register(name, interval_setting, func):
+    """Declare a job run every ``settings.<interval_setting>`` seconds (0 disables it)"""
+    _jobs[name] = (interval_setting, func)
+
+
+def registered_jobs():
+    """Return ``{name: interval_seconds}`` for every declared job"""
+    return {name: getattr(settings, setting) for name, (setting, _) in _jobs.items()}
+
+
+def start_registered(names=None):
+    """Start the declared jobs (all, or only ``names``) with a non-zero interval"""
+    started = []
+    for name, (setting, func) in _jobs.items():
+        interval = getattr(settings, setting)
+        if interval and (not names or name in names):
+            started.append(start_periodic(name, interval, func))
+    return started
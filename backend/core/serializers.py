@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .expansion import ExpandableFieldsMixin
 from .models import Region, CropVariety, QualityParameter
 
 
@@ -8,7 +9,7 @@ class RegionSerializer(serializers.ModelSerializer):
         fields = ['id', 'state', 'district']
 
 
-class CropVarietySerializer(serializers.ModelSerializer):
+class CropVarietySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CropVariety
         fields = [
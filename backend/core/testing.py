@@ -0,0 +1,88 @@
+"""
+Test helpers shared by the app test suites.
+"""
+from datetime import timedelta
+from itertools import count
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User, FarmerProfile, BuyerProfile
+from core.models import CropVariety
+
+_sequence = count(1)
+
+
+def make_farmer(**kwargs):
+    n = next(_sequence)
+    user = User.objects.create(username=f'farmer{n}', phone=f'90000{n:05d}', role='FARMER', **kwargs)
+    FarmerProfile.objects.create(
+        user=user, address='Village road', state='Haryana', district='Karnal', pincode='132001'
+    )
+    return user
+
+
+def make_buyer(**kwargs):
+    n = next(_sequence)
+    user = User.objects.create(username=f'buyer{n}', phone=f'80000{n:05d}', role='BUYER', **kwargs)
+    BuyerProfile.objects.create(
+        user=user, company_name=f'Mill {n}', address='Mill road', state='Haryana',
+        district='Karnal', pincode='132001', gst_number=f'GST{n:012d}'
+    )
+    return user
+
+
+def make_variety(name='IR 64', price=2200):
+    variety, _ = CropVariety.objects.get_or_create(
+        name=name, defaults={'base_price_per_quintal': price}
+    )
+    return variety
+
+
+def make_listing(farmer, **kwargs):
+    from market.models import CropListing
+    fields = {
+        'crop_variety': make_variety(),
+        'quantity_quintals': 10,
+        'expected_price_per_quintal': 2200,
+        'location_description': 'Near the grain market',
+        'district': 'Karnal',
+        'state': 'Haryana',
+        'expires_at': timezone.now() + timedelta(days=3),
+    }
+    fields.update(kwargs)
+    return CropListing.objects.create(farmer=farmer, **fields)
+
+
+def make_bid(listing, buyer, amount=2300):
+    from market.models import Bid
+    return Bid.objects.create(listing=listing, buyer=buyer, amount_per_quintal=amount)
+
+
+class QueryCountAssertionsMixin:
+    """Assertions for catching N+1 queries on list endpoints"""
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(captured), response
+
+    def assertQueryCountConstant(self, url, add_rows, **params):
+        """
+        Fail if the number of queries a list endpoint runs grows with the
+        number of rows on the page. ``add_rows(n)`` must create ``n`` more
+        rows visible to the client.
+        """
+        add_rows(1)
+        small, response = self.count_queries(url, **params)
+        self.assertTrue(response.data['results'], 'list endpoint returned no rows')
+
+        add_rows(5)
+        large, response = self.count_queries(url, **params)
+        self.assertGreater(len(response.data['results']), 1)
+        self.assertEqual(
+            small, large,
+            f'{url} ran {small} queries for one row but {large} for a full page'
+        )
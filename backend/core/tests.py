@@ -1,3 +1,50 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
-# Create your tests here.
+from . import geo, scheduler
+from .models import PincodeCentroid
+
+
+class LoadPincodesTests(TestCase):
+    def load(self, *args):
+        out = StringIO()
+        call_command('load_pincodes', *args, stdout=out)
+        return out.getvalue()
+
+    def test_bundled_file_loads_and_reloads_in_place(self):
+        self.assertIn('Loaded 22 pincode centroids', self.load())
+        self.assertIn('Loaded 22 pincode centroids', self.load('--batch-size', '5'))
+        self.assertEqual(PincodeCentroid.objects.count(), 22)
+        self.assertEqual(geo.locate_pincode(' 132001 '), (29.6857, 76.9905))
+
+    def test_custom_file_updates_existing_rows(self):
+        self.load()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('pincode,district,state,latitude,longitude\n')
+            f.write('132001,Karnal City,Haryana,29.7,77.0\n')
+            f.write('110001,New Delhi,Delhi,28.6328,77.2197\n')
+        self.addCleanup(os.unlink, f.name)
+
+        self.assertIn('Loaded 2 pincode centroids', self.load(f.name))
+        self.assertEqual(PincodeCentroid.objects.count(), 23)
+        self.assertEqual(PincodeCentroid.objects.get(pincode='132001').district, 'Karnal City')
+        self.assertEqual(geo.locate_district('haryana', 'karnal city'), (29.7, 77.0))
+
+
+class SchedulerTests(TestCase):
+    def test_jobs_are_only_declared_at_startup(self):
+        jobs = scheduler.registered_jobs()
+        self.assertIn('listing-expiry', jobs)
+        self.assertIn('escrow-release', jobs)
+        self.assertEqual(scheduler._tasks, {})
+
+    def test_run_scheduler_refuses_unknown_or_disabled_jobs(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown job(s): nope'):
+            call_command('run_scheduler', '--only', 'nope')
+        with self.settings(LISTING_EXPIRY_SWEEP_SECONDS=0):
+            with self.assertRaisesMessage(CommandError, 'No jobs enabled'):
+                call_command('run_scheduler', '--only', 'listing-expiry')
@@ -1,10 +1,11 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from .conditional import CatalogCacheMixin
 from .models import Region, CropVariety, QualityParameter
 from .serializers import RegionSerializer, CropVarietySerializer, QualityParameterSerializer
 
 
-class RegionViewSet(viewsets.ReadOnlyModelViewSet):
+class RegionViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """List all regions (read-only)"""
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
@@ -13,7 +14,7 @@ class RegionViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['state', 'district']
 
 
-class CropVarietyViewSet(viewsets.ReadOnlyModelViewSet):
+class CropVarietyViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """List all crop varieties (read-only for users)"""
     queryset = CropVariety.objects.all()
     serializer_class = CropVarietySerializer
@@ -22,7 +23,7 @@ class CropVarietyViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['name', 'base_price_per_quintal']
 
 
-class QualityParameterViewSet(viewsets.ReadOnlyModelViewSet):
+class QualityParameterViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """List quality parameters (read-only)"""
     queryset = QualityParameter.objects.all()
     serializer_class = QualityParameterSerializer
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import EscrowTransaction
+from .models import (
+    EscrowTransaction, LedgerEntry, LedgerSnapshot, PaymentIntent, ReconciliationMismatch,
+    ReconciliationRun, UserBalance, WebhookEvent
+)
 
 
 @admin.register(EscrowTransaction)
@@ -9,3 +12,66 @@ class EscrowTransactionAdmin(admin.ModelAdmin):
     list_filter = ['transaction_type', 'status', 'payment_gateway', 'created_at']
     search_fields = ['order__id', 'user__username', 'gateway_transaction_id']
     list_select_related = ['order', 'user']
+
+
+@admin.register(UserBalance)
+class UserBalanceAdmin(admin.ModelAdmin):
+    list_display = ['user', 'earned', 'pending_release', 'paid', 'token_paid',
+                    'full_paid', 'updated_at']
+    search_fields = ['user__username']
+    list_select_related = ['user']
+    readonly_fields = ['earned', 'pending_release', 'releases_count', 'paid',
+                       'token_paid', 'full_paid', 'payments_count']
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'transaction', 'order', 'user', 'account', 'transaction_type',
+                    'amount', 'created_at']
+    list_filter = ['account', 'transaction_type', 'created_at']
+    search_fields = ['order__id', 'user__username']
+    list_select_related = ['transaction', 'order', 'user']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerSnapshot)
+class LedgerSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['account', 'user', 'balance', 'as_of']
+    list_filter = ['account', 'as_of']
+    search_fields = ['user__username']
+    list_select_related = ['user']
+
+
+@admin.register(PaymentIntent)
+class PaymentIntentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'buyer', 'transaction', 'gateway_order_id', 'created_at']
+    search_fields = ['order__id', 'buyer__username', 'gateway_order_id', 'idempotency_key']
+    list_select_related = ['order', 'buyer', 'transaction']
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['event_id']
+
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'source', 'status', 'rows', 'matched', 'mismatched',
+                    'started_at', 'finished_at']
+    list_filter = ['status', 'started_at']
+
+
+@admin.register(ReconciliationMismatch)
+class ReconciliationMismatchAdmin(admin.ModelAdmin):
+    list_display = ['run', 'line_number', 'kind', 'gateway_transaction_id',
+                    'settled_amount', 'recorded_amount', 'settled_status', 'recorded_status']
+    list_filter = ['kind', 'run']
+    search_fields = ['gateway_transaction_id']
+    raw_id_fields = ['run', 'transaction']
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
+    
+    def ready(self):
+        # Run by `manage.py run_scheduler`, never from web workers
+        from django.conf import settings
+        from core.scheduler import register
+        from .ledger import take_snapshot
+        from .payments import process_webhooks
+        from .releases import release_due_funds
+        register('ledger-snapshot', 'LEDGER_SNAPSHOT_SECONDS', take_snapshot)
+        register(
+            'payment-webhooks', 'WEBHOOK_PROCESS_SECONDS',
+            lambda: process_webhooks(batch_size=settings.WEBHOOK_BATCH_SIZE),
+        )
+        register(
+            'escrow-release', 'ESCROW_RELEASE_SECONDS',
+            lambda: release_due_funds(batch_size=settings.ESCROW_RELEASE_BATCH_SIZE),
+        )
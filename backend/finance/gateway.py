@@ -0,0 +1,86 @@
+"""
+Payment gateway clients.
+
+The gateway is chosen with ``settings.PAYMENT_GATEWAY``. ``HttpGateway``
+speaks a small JSON API (create an order, signed webhooks for its outcome)
+at ``PAYMENT_GATEWAY_URL``; ``finance.standin`` serves the same API locally
+for development and tests. A real provider only has to implement
+``create_order`` and ``verify_signature``.
+"""
+import hashlib
+import hmac
+import json
+import threading
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SIGNATURE_HEADER = 'X-Gateway-Signature'
+
+# Webhook event types
+PAYMENT_CAPTURED = 'payment.captured'
+PAYMENT_FAILED = 'payment.failed'
+
+
+class GatewayError(Exception):
+    pass
+
+
+def sign(body, secret):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class PaymentGateway(ABC):
+    """Interface the payment flow relies on"""
+
+    @abstractmethod
+    def create_order(self, reference, amount, idempotency_key):
+        """
+        Open a payment order for ``amount`` (INR) and return its gateway id.
+        Repeating a call with the same ``idempotency_key`` must return the
+        same order.
+        """
+
+    def verify_signature(self, body, signature):
+        return bool(signature) and hmac.compare_digest(
+            sign(body, settings.PAYMENT_WEBHOOK_SECRET), signature
+        )
+
+
+class HttpGateway(PaymentGateway):
+    def create_order(self, reference, amount, idempotency_key):
+        body = json.dumps({
+            'reference': reference, 'amount': str(Decimal(amount)), 'currency': 'INR'
+        }).encode()
+        request = Request(
+            f"{settings.PAYMENT_GATEWAY_URL.rstrip('/')}/orders",
+            data=body,
+            method='POST',
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {settings.PAYMENT_GATEWAY_KEY}',
+                'Idempotency-Key': idempotency_key,
+            },
+        )
+        try:
+            with urlopen(request, timeout=settings.PAYMENT_GATEWAY_TIMEOUT) as response:
+                return json.load(response)['id']
+        except (URLError, TimeoutError, ValueError, KeyError) as exc:
+            raise GatewayError(f'Payment gateway unavailable: {exc}') from exc
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = import_string(settings.PAYMENT_GATEWAY)()
+    return _gateway
@@ -0,0 +1,130 @@
+"""
+Double-entry escrow ledger.
+
+``EscrowTransaction.save()`` appends a balanced pair of ``LedgerEntry`` rows
+whenever a transaction becomes SUCCESS (and the reversing pair if it stops
+being SUCCESS), in the same database transaction, and derives
+``Order.payment_status`` from the ledger.
+
+Accounts, per user (debits positive, credits negative):
+
+* ``BUYER_WALLET`` - money the buyer has paid in (goes negative as they pay)
+* ``ESCROW`` - money held for the buyer's orders
+* ``FARMER_PAYABLE`` - money released to the farmer
+
+``take_snapshot()`` stores running balances, so ``balance_as_of()`` reads the
+latest snapshot plus the entries after it instead of the whole history.
+Snapshots are cut by entry id, not by ``created_at``: ids are handed out by
+the database in insert order, while ``created_at`` is stamped by whichever
+app server wrote the entry, and an entry committed after a snapshot with an
+earlier timestamp would otherwise fall between two snapshots for good.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from market.models import Order
+from .models import EscrowTransaction, LedgerEntry, LedgerSnapshot, expected_payment_status
+
+# Snapshots stop this far behind now so in-flight transactions are not missed
+SNAPSHOT_SETTLE = timedelta(minutes=5)
+
+
+def take_snapshot(as_of=None):
+    """
+    Snapshot every account balance that changed since the previous snapshot.
+    Returns the number of snapshot rows written.
+    """
+    as_of = as_of or timezone.now() - SNAPSHOT_SETTLE
+    previous = LedgerSnapshot.objects.aggregate(latest=Max('as_of'), covered=Max('last_entry_id'))
+    if previous['latest'] is not None and previous['latest'] >= as_of:
+        return 0
+    covered = previous['covered'] or 0
+    # Everything inserted up to the newest settled entry; whatever commits
+    # later gets a higher id and goes into the next snapshot
+    last_entry_id = LedgerEntry.objects.filter(created_at__lte=as_of).aggregate(last=Max('id'))['last']
+    if last_entry_id is None or last_entry_id <= covered:
+        return 0
+
+    entries = LedgerEntry.objects.filter(id__gt=covered, id__lte=last_entry_id)
+    opening = LedgerSnapshot.objects.filter(
+        account=OuterRef('account'), user=OuterRef('user')
+    ).order_by('-as_of').values('balance')[:1]
+    changes = entries.order_by().values('account', 'user').annotate(
+        delta=Sum('amount'), opening=Subquery(opening)
+    )
+
+    with transaction.atomic():
+        created = LedgerSnapshot.objects.bulk_create(
+            [
+                LedgerSnapshot(
+                    account=row['account'], user_id=row['user'],
+                    balance=(row['opening'] or 0) + row['delta'],
+                    as_of=as_of, last_entry_id=last_entry_id,
+                )
+                for row in changes
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+    return len(created)
+
+
+def balance_as_of(account, user, when=None):
+    """Balance of one account of a user at ``when`` (default: now)"""
+    when = when or timezone.now()
+    snapshot = LedgerSnapshot.objects.filter(
+        account=account, user=user, as_of__lte=when
+    ).order_by('-as_of').first()
+    tail = LedgerEntry.objects.filter(account=account, user=user, created_at__lte=when)
+    if snapshot is not None:
+        tail = tail.filter(id__gt=snapshot.last_entry_id)
+    opening = snapshot.balance if snapshot is not None else Decimal('0.00')
+    return opening + (tail.aggregate(total=Sum('amount'))['total'] or 0)
+
+
+def verify(chunk_size=2000):
+    """
+    Check every order's ledger against its transactions and payment status
+    in one streaming query. Yields ``(order_id, problem)`` pairs.
+    """
+    Type = EscrowTransaction.TransactionType
+
+    def paid(*types):
+        rows = EscrowTransaction.objects.filter(
+            order=OuterRef('pk'), status=EscrowTransaction.Status.SUCCESS, transaction_type__in=types
+        ).order_by().values('order')
+        return Coalesce(
+            Subquery(rows.annotate(t=Sum('amount')).values('t')),
+            Value(0), output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+
+    orders = Order.objects.annotate(
+        **LedgerEntry.objects.order_totals(OuterRef('pk')),
+        deposited=paid(Type.TOKEN, Type.FULL),
+        released=paid(Type.RELEASE),
+        refunded=paid(Type.REFUND),
+    ).order_by('pk').values(
+        'pk', 'final_amount', 'payment_status', 'deposited', 'released', 'refunded',
+        'ledger_deposited', 'ledger_released', 'ledger_refunded', 'ledger_net',
+    )
+
+    for order in orders.iterator(chunk_size=chunk_size):
+        if order['ledger_net'] != 0:
+            yield order['pk'], f"entries do not balance (net {order['ledger_net']})"
+        for name in ('deposited', 'released', 'refunded'):
+            if order[name] != order[f'ledger_{name}']:
+                yield order['pk'], (
+                    f"{name} {order[f'ledger_{name}']} in the ledger, "
+                    f"{order[name]} in transactions"
+                )
+        expected = expected_payment_status(
+            order['final_amount'], order['ledger_deposited'],
+            order['ledger_released'], order['ledger_refunded'],
+        )
+        if order['payment_status'] != expected:
+            yield order['pk'], f"payment status {order['payment_status']}, ledger says {expected}"
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from finance.payments import process_webhooks
+
+
+class Command(BaseCommand):
+    help = 'Apply queued payment gateway webhooks to their escrow transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.WEBHOOK_BATCH_SIZE)
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running, draining the queue every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed, failed = process_webhooks(batch_size=options['batch_size'])
+            self.stdout.write(f'Applied {processed} webhook events ({failed} failed)')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from finance.models import UserBalance
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized per-user escrow balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = list(get_user_model().objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(user_ids), batch_size):
+            with transaction.atomic():
+                UserBalance.objects.refresh(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt balances for {len(user_ids)} users'))
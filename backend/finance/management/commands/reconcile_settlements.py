@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from finance.reconciliation import SettlementColumns, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Match a gateway settlement CSV against escrow transactions and record mismatches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement CSV file')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--id-column', default='payment_id')
+        parser.add_argument('--amount-column', default='amount')
+        parser.add_argument('--status-column', default='status')
+
+    def handle(self, *args, **options):
+        columns = SettlementColumns(
+            options['id_column'], options['amount_column'], options['status_column']
+        )
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as handle:
+                run = reconcile(handle, options['path'], columns, chunk_size=options['chunk_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        style = self.style.SUCCESS if not run.mismatched else self.style.WARNING
+        self.stdout.write(style(
+            f'Run #{run.pk}: {run.rows} rows, {run.matched} matched, {run.mismatched} mismatches'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from finance.releases import release_due_funds
+
+
+class Command(BaseCommand):
+    help = 'Release escrow to farmers for delivered orders past the dispute window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ESCROW_RELEASE_BATCH_SIZE)
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running, releasing due orders every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_due_funds(batch_size=options['batch_size'])
+            self.stdout.write(f'Released escrow for {released} orders')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from finance.standin import StandInGateway
+
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the payment gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--webhook-url', default='http://127.0.0.1:8000/api/finance/webhook/',
+            help='Where settled payments are reported'
+        )
+
+    def handle(self, *args, **options):
+        server = StandInGateway(
+            ('127.0.0.1', options['port']),
+            secret=settings.PAYMENT_WEBHOOK_SECRET,
+            webhook_url=options['webhook_url'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Payment gateway stand-in listening on {server.url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from finance.ledger import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Store the ledger account balances that changed since the last snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running, taking a snapshot every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.stdout.write(f'Snapshotted {take_snapshot()} account balances')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from finance import ledger
+
+
+class Command(BaseCommand):
+    help = 'Check the escrow ledger against orders and their transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        problems = 0
+        for order_id, problem in ledger.verify(chunk_size=options['batch_size']):
+            problems += 1
+            self.stdout.write(f'Order #{order_id}: {problem}')
+        if problems:
+            raise CommandError(f'{problems} ledger problems found')
+        self.stdout.write(self.style.SUCCESS('Ledger is consistent with all orders'))
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+        ('market', '0002_listing_bid_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['-created_at'], name='escrow_created_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_balances(apps, schema_editor):
+    EscrowTransaction = apps.get_model('finance', 'EscrowTransaction')
+    UserBalance = apps.get_model('finance', 'UserBalance')
+    balances = {}
+    rows = (
+        EscrowTransaction.objects.filter(status='SUCCESS')
+        .values('order__farmer_id', 'order__buyer_id', 'transaction_type')
+        .annotate(total=Sum('amount'), count=Count('id')).order_by()
+    )
+    for row in rows:
+        farmer = balances.setdefault(row['order__farmer_id'], UserBalance(user_id=row['order__farmer_id']))
+        buyer = balances.setdefault(row['order__buyer_id'], UserBalance(user_id=row['order__buyer_id']))
+        kind = row['transaction_type']
+        if kind == 'RELEASE':
+            farmer.earned += row['total']
+            farmer.releases_count += row['count']
+        if kind in ('TOKEN', 'FULL'):
+            farmer.pending_release += row['total']
+        else:
+            farmer.pending_release -= row['total']
+        buyer.paid += row['total']
+        buyer.payments_count += row['count']
+        if kind == 'TOKEN':
+            buyer.token_paid += row['total']
+        elif kind == 'FULL':
+            buyer.full_paid += row['total']
+    UserBalance.objects.bulk_create(balances.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('finance', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('earned', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pending_release', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('releases_count', models.PositiveIntegerField(default=0)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('token_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('full_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
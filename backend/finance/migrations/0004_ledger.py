@@ -0,0 +1,87 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+POSTINGS = {
+    'TOKEN': ('ESCROW', 'BUYER_WALLET'),
+    'FULL': ('ESCROW', 'BUYER_WALLET'),
+    'RELEASE': ('FARMER_PAYABLE', 'ESCROW'),
+    'REFUND': ('BUYER_WALLET', 'ESCROW'),
+}
+
+
+def backfill_ledger(apps, schema_editor):
+    EscrowTransaction = apps.get_model('finance', 'EscrowTransaction')
+    LedgerEntry = apps.get_model('finance', 'LedgerEntry')
+    entries = []
+    transactions = EscrowTransaction.objects.filter(status='SUCCESS').values(
+        'pk', 'order_id', 'order__buyer_id', 'order__farmer_id', 'transaction_type', 'amount'
+    )
+    for txn in transactions.iterator(chunk_size=2000):
+        owners = {
+            'BUYER_WALLET': txn['order__buyer_id'],
+            'ESCROW': txn['order__buyer_id'],
+            'FARMER_PAYABLE': txn['order__farmer_id'],
+        }
+        debit, credit = POSTINGS[txn['transaction_type']]
+        for account, amount in ((debit, txn['amount']), (credit, -txn['amount'])):
+            entries.append(LedgerEntry(
+                transaction_id=txn['pk'], order_id=txn['order_id'], user_id=owners[account],
+                account=account, transaction_type=txn['transaction_type'], amount=amount,
+            ))
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+    # auto_now_add stamped the migration time; the entries belong to when
+    # their transaction happened
+    LedgerEntry.objects.update(created_at=models.Subquery(
+        EscrowTransaction.objects.filter(pk=models.OuterRef('transaction_id')).values('created_at')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_user_balance'),
+        ('market', '0014_listing_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('BUYER_WALLET', 'Buyer Wallet'), ('ESCROW', 'Escrow'), ('FARMER_PAYABLE', 'Farmer Payable')], max_length=20)),
+                ('transaction_type', models.CharField(choices=[('TOKEN', 'Token Payment (20%)'), ('FULL', 'Full Payment'), ('RELEASE', 'Release to Farmer'), ('REFUND', 'Refund to Buyer')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='market.order')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='finance.escrowtransaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+                'indexes': [models.Index(fields=['account', 'user', 'created_at'], name='ledger_account_user_idx'), models.Index(fields=['created_at'], name='ledger_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('BUYER_WALLET', 'Buyer Wallet'), ('ESCROW', 'Escrow'), ('FARMER_PAYABLE', 'Farmer Payable')], max_length=20)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('as_of', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'user', '-as_of'], name='ledger_snapshot_lookup_idx'), models.Index(fields=['-as_of'], name='ledger_snapshot_as_of_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ledgersnapshot',
+            constraint=models.UniqueConstraint(fields=('account', 'user', 'as_of'), name='ledger_snapshot_unique'),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
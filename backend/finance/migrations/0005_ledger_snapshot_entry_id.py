@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_entry_id(apps, schema_editor):
+    LedgerEntry = apps.get_model('finance', 'LedgerEntry')
+    LedgerSnapshot = apps.get_model('finance', 'LedgerSnapshot')
+    # Existing snapshots covered the entries stamped up to their as_of
+    last_entry = LedgerEntry.objects.filter(created_at__lte=OuterRef('as_of')).order_by('-id').values('id')[:1]
+    LedgerSnapshot.objects.update(last_entry_id=Coalesce(Subquery(last_entry), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgersnapshot',
+            name='last_entry_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_entry_id, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_payment_intents'),
+        ('market', '0014_listing_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationMismatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('MISSING', 'No matching transaction'), ('AMOUNT', 'Amount differs'), ('STATUS', 'Status differs'), ('INVALID', 'Unreadable row')], max_length=10)),
+                ('line_number', models.PositiveIntegerField()),
+                ('gateway_transaction_id', models.CharField(blank=True, max_length=100)),
+                ('settled_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('recorded_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('settled_status', models.CharField(blank=True, max_length=20)),
+                ('recorded_status', models.CharField(blank=True, max_length=10)),
+            ],
+            options={
+                'verbose_name_plural': 'reconciliation mismatches',
+                'ordering': ['run', 'line_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='RUNNING', max_length=10)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('matched', models.PositiveIntegerField(default=0)),
+                ('mismatched', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['gateway_transaction_id'], name='escrow_gateway_txn_idx'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationmismatch',
+            name='transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mismatches', to='finance.escrowtransaction'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationmismatch',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mismatches', to='finance.reconciliationrun'),
+        ),
+        migrations.AddIndex(
+            model_name='reconciliationmismatch',
+            index=models.Index(fields=['run', 'kind'], name='recon_mismatch_kind_idx'),
+        ),
+    ]
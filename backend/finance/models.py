@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from market.models import Order
 
 
@@ -33,5 +36,405 @@ class EscrowTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='escrow_created_idx'),
+            models.Index(fields=['gateway_transaction_id'], name='escrow_gateway_txn_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous_status = None
+            if not self._state.adding:
+                previous_status = EscrowTransaction.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('status', flat=True).first()
+            super().save(*args, **kwargs)
+            if LedgerEntry.objects.post(self, previous_status):
+                LedgerEntry.objects.sync_payment_status([self.order_id])
+            UserBalance.objects.refresh_for_orders([self.order_id])
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            UserBalance.objects.refresh_for_orders([self.order_id])
+        return result
+    
     def __str__(self):
         return f"{self.transaction_type} - ₹{self.amount} - {self.status}"
+
+
+class UserBalanceQuerySet(models.QuerySet):
+    def refresh(self, user_ids):
+        """
+        Recompute the balances of these users from ``EscrowTransaction`` in one
+        INSERT (for users without a row yet) and one UPDATE.
+        """
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return 0
+        self.bulk_create(
+            [UserBalance(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+        )
+
+        successful = EscrowTransaction.objects.filter(status=EscrowTransaction.Status.SUCCESS).order_by()
+        as_farmer = successful.filter(order__farmer=OuterRef('user_id')).values('order__farmer')
+        as_buyer = successful.filter(order__buyer=OuterRef('user_id')).values('order__buyer')
+        TYPE = EscrowTransaction.TransactionType
+
+        def total(transactions, **filters):
+            return Coalesce(
+                Subquery(transactions.filter(**filters).annotate(t=Sum('amount')).values('t')),
+                Value(0), output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+
+        def count(transactions, **filters):
+            return Coalesce(
+                Subquery(transactions.filter(**filters).annotate(c=Count('id')).values('c')),
+                Value(0),
+            )
+
+        return self.filter(user_id__in=user_ids).update(
+            earned=total(as_farmer, transaction_type=TYPE.RELEASE),
+            # Deposits still held: released and refunded money has left escrow
+            pending_release=(
+                total(as_farmer, transaction_type__in=[TYPE.TOKEN, TYPE.FULL])
+                - total(as_farmer, transaction_type__in=[TYPE.RELEASE, TYPE.REFUND])
+            ),
+            releases_count=count(as_farmer, transaction_type=TYPE.RELEASE),
+            paid=total(as_buyer),
+            token_paid=total(as_buyer, transaction_type=TYPE.TOKEN),
+            full_paid=total(as_buyer, transaction_type=TYPE.FULL),
+            payments_count=count(as_buyer),
+            updated_at=timezone.now(),
+        )
+
+    def refresh_for_orders(self, order_ids):
+        """Refresh the farmer and buyer balances of these orders"""
+        parties = Order.objects.filter(pk__in=order_ids).values_list('farmer_id', 'buyer_id')
+        return self.refresh([user_id for pair in parties for user_id in pair])
+
+
+class UserBalance(models.Model):
+    """
+    Materialized escrow totals per user, read by the finance dashboard.
+    
+    Kept in sync by ``EscrowTransaction.save()``/``delete()``; queryset
+    ``update()`` calls on transactions must call ``refresh()`` themselves.
+    ``manage.py rebuild_balances`` recomputes every row.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='balance'
+    )
+    
+    # As farmer
+    earned = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pending_release = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    releases_count = models.PositiveIntegerField(default=0)
+    
+    # As buyer
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    token_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    full_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = UserBalanceQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"Balance of {self.user_id}"
+
+
+class LedgerError(Exception):
+    pass
+
+
+class LedgerEntryQuerySet(models.QuerySet):
+    """Entries are only ever inserted; bulk updates and deletes are refused too"""
+    
+    def update(self, **kwargs):
+        raise LedgerError('Ledger entries are append-only')
+    
+    def delete(self):
+        raise LedgerError('Ledger entries are append-only')
+
+
+class LedgerEntryManager(models.Manager.from_queryset(LedgerEntryQuerySet)):
+    # transaction type -> (account debited, account credited)
+    POSTINGS = {
+        'TOKEN': ('ESCROW', 'BUYER_WALLET'),
+        'FULL': ('ESCROW', 'BUYER_WALLET'),
+        'RELEASE': ('FARMER_PAYABLE', 'ESCROW'),
+        'REFUND': ('BUYER_WALLET', 'ESCROW'),
+    }
+    
+    def post(self, escrow_transaction, previous_status=None):
+        """
+        Append the entries for a transaction status change: a balanced pair
+        when it becomes SUCCESS, the reversing pair when it stops being
+        SUCCESS. Returns the entries written.
+        """
+        succeeded = escrow_transaction.status == EscrowTransaction.Status.SUCCESS
+        was_successful = previous_status == EscrowTransaction.Status.SUCCESS
+        if succeeded == was_successful:
+            return []
+        
+        order = Order.objects.only('buyer_id', 'farmer_id').get(pk=escrow_transaction.order_id)
+        return self.bulk_create(
+            self.build_entries(escrow_transaction, order, reverse=not succeeded)
+        )
+    
+    def build_entries(self, escrow_transaction, order, reverse=False):
+        """The (unsaved) balanced pair of entries for a successful transaction"""
+        owners = {
+            'BUYER_WALLET': order.buyer_id,
+            # Money in escrow is held on the buyer's behalf until released
+            'ESCROW': order.buyer_id,
+            'FARMER_PAYABLE': order.farmer_id,
+        }
+        debit, credit = self.POSTINGS[escrow_transaction.transaction_type]
+        amount = -escrow_transaction.amount if reverse else escrow_transaction.amount
+        return [
+            LedgerEntry(
+                transaction=escrow_transaction, order_id=order.pk, user_id=owners[account],
+                account=account, transaction_type=escrow_transaction.transaction_type,
+                amount=signed,
+            )
+            for account, signed in ((debit, amount), (credit, -amount))
+        ]
+    
+    def order_totals(self, order_ref):
+        """Correlated subqueries for an order's deposited / released / refunded totals"""
+        Type = EscrowTransaction.TransactionType
+        
+        def total(**filters):
+            entries = self.filter(order=order_ref, **filters).order_by().values('order')
+            return Coalesce(
+                Subquery(entries.annotate(t=Sum('amount')).values('t')),
+                Value(0), output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+        
+        return {
+            'ledger_deposited': total(account='ESCROW', transaction_type__in=[Type.TOKEN, Type.FULL]),
+            'ledger_released': total(account='FARMER_PAYABLE', transaction_type=Type.RELEASE),
+            'ledger_refunded': total(account='BUYER_WALLET', transaction_type=Type.REFUND),
+            'ledger_net': total(),
+        }
+    
+    def sync_payment_status(self, order_ids):
+        """Set ``Order.payment_status`` from the ledger for these orders"""
+        orders = Order.objects.filter(pk__in=order_ids).annotate(
+            **self.order_totals(OuterRef('pk'))
+        ).only('payment_status', 'final_amount')
+        for order in orders:
+            expected = expected_payment_status(
+                order.final_amount, order.ledger_deposited,
+                order.ledger_released, order.ledger_refunded,
+            )
+            if order.payment_status != expected:
+                Order.objects.filter(pk=order.pk).update(
+                    payment_status=expected, updated_at=timezone.now()
+                )
+
+
+def expected_payment_status(final_amount, deposited, released, refunded):
+    """Order payment status implied by its ledger totals"""
+    Status = Order.PaymentStatus
+    if refunded > 0:
+        return Status.REFUNDED
+    if released > 0:
+        return Status.RELEASED
+    if deposited >= final_amount:
+        return Status.FULL_DEPOSITED
+    if deposited > 0:
+        return Status.TOKEN_DEPOSITED
+    return Status.PENDING
+
+
+class LedgerEntry(models.Model):
+    """
+    One side of a double-entry posting. Append-only: corrections are new,
+    reversing entries. Positive amounts are debits, negative are credits,
+    and the entries of every transaction sum to zero.
+    """
+    class Account(models.TextChoices):
+        BUYER_WALLET = 'BUYER_WALLET', 'Buyer Wallet'
+        ESCROW = 'ESCROW', 'Escrow'
+        FARMER_PAYABLE = 'FARMER_PAYABLE', 'Farmer Payable'
+    
+    transaction = models.ForeignKey(EscrowTransaction, on_delete=models.PROTECT, related_name='ledger_entries')
+    order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name='ledger_entries')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='ledger_entries')
+    
+    account = models.CharField(max_length=20, choices=Account.choices)
+    transaction_type = models.CharField(max_length=10, choices=EscrowTransaction.TransactionType.choices)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = LedgerEntryManager()
+    
+    class Meta:
+        verbose_name_plural = 'ledger entries'
+        indexes = [
+            models.Index(fields=['account', 'user', 'created_at'], name='ledger_account_user_idx'),
+            models.Index(fields=['created_at'], name='ledger_created_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise LedgerError('Ledger entries are append-only')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise LedgerError('Ledger entries are append-only')
+    
+    def __str__(self):
+        return f"{self.account} {self.amount:+} (txn {self.transaction_id})"
+
+
+class LedgerSnapshot(models.Model):
+    """
+    Balance of one account of one user over every entry up to
+    ``last_entry_id``, so ``ledger.balance_as_of()`` only has to add the
+    entries after it.
+    """
+    account = models.CharField(max_length=20, choices=LedgerEntry.Account.choices)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ledger_snapshots')
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    as_of = models.DateTimeField()
+    last_entry_id = models.BigIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'user', 'as_of'], name='ledger_snapshot_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['account', 'user', '-as_of'], name='ledger_snapshot_lookup_idx'),
+            models.Index(fields=['-as_of'], name='ledger_snapshot_as_of_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.account} of {self.user_id} = {self.balance} @ {self.as_of:%Y-%m-%d %H:%M}"
+
+
+class PaymentIntent(models.Model):
+    """
+    A buyer's request to pay for an order through the gateway. Keyed by the
+    client's Idempotency-Key so retries return the same intent; settles its
+    PENDING escrow transaction when the gateway's webhook is processed.
+    """
+    order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name='payment_intents')
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='payment_intents')
+    transaction = models.OneToOneField(EscrowTransaction, on_delete=models.PROTECT, related_name='intent')
+    
+    idempotency_key = models.CharField(max_length=64)
+    gateway_order_id = models.CharField(max_length=100, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['buyer', 'idempotency_key'], name='payment_intent_idempotency_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['gateway_order_id'], name='payment_intent_gateway_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Intent {self.idempotency_key} for order #{self.order_id}"
+
+
+class WebhookEvent(models.Model):
+    """
+    A gateway webhook, stored as received and applied later by
+    ``payments.process_webhooks``. ``event_id`` dedupes redeliveries.
+    """
+    class Status(models.TextChoices):
+        RECEIVED = 'RECEIVED', 'Received'
+        PROCESSED = 'PROCESSED', 'Processed'
+        FAILED = 'FAILED', 'Failed'
+    
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.RECEIVED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['received_at'], name='webhook_queue_idx',
+                condition=models.Q(status='RECEIVED'),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
+
+
+class ReconciliationRun(models.Model):
+    """One pass of ``manage.py reconcile_settlements`` over a gateway settlement file"""
+    class Status(models.TextChoices):
+        RUNNING = 'RUNNING', 'Running'
+        COMPLETED = 'COMPLETED', 'Completed'
+        FAILED = 'FAILED', 'Failed'
+    
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.RUNNING)
+    
+    rows = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    mismatched = models.PositiveIntegerField(default=0)
+    
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Reconciliation of {self.source} ({self.status})"
+
+
+class ReconciliationMismatch(models.Model):
+    """A settlement row that does not agree with our escrow transactions"""
+    class Kind(models.TextChoices):
+        MISSING = 'MISSING', 'No matching transaction'
+        AMOUNT = 'AMOUNT', 'Amount differs'
+        STATUS = 'STATUS', 'Status differs'
+        INVALID = 'INVALID', 'Unreadable row'
+    
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name='mismatches')
+    transaction = models.ForeignKey(
+        EscrowTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='mismatches'
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    
+    line_number = models.PositiveIntegerField()
+    gateway_transaction_id = models.CharField(max_length=100, blank=True)
+    settled_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    recorded_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    settled_status = models.CharField(max_length=20, blank=True)
+    recorded_status = models.CharField(max_length=10, blank=True)
+    
+    class Meta:
+        ordering = ['run', 'line_number']
+        verbose_name_plural = 'reconciliation mismatches'
+        indexes = [
+            models.Index(fields=['run', 'kind'], name='recon_mismatch_kind_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} at line {self.line_number} ({self.gateway_transaction_id})"
@@ -0,0 +1,206 @@
+"""
+Gateway payment flow.
+
+1. ``create_intent`` records a PENDING escrow transaction and its
+   ``PaymentIntent`` under the client's (required) Idempotency-Key, then
+   opens the gateway order. Retries with the same key return the same
+   intent; a new key is refused while the order does not need the payment.
+2. The gateway reports the outcome with a signed webhook; the view only
+   verifies and stores it as a ``WebhookEvent``.
+3. ``process_webhooks`` (``manage.py process_webhooks`` or the in-process
+   scheduler) applies queued events: a capture moves the transaction to
+   SUCCESS, which posts the ledger entries; a failure moves it to FAILED.
+"""
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from market.models import Order
+from .gateway import PAYMENT_CAPTURED, PAYMENT_FAILED, GatewayError, get_gateway
+from .models import EscrowTransaction, PaymentIntent, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SHARE = Decimal('0.20')
+
+TYPE = EscrowTransaction.TransactionType
+
+# Payment statuses an order may be in to take each kind of payment
+PAYABLE_STATUSES = {
+    TYPE.TOKEN: [Order.PaymentStatus.PENDING],
+    TYPE.FULL: [Order.PaymentStatus.PENDING, Order.PaymentStatus.TOKEN_DEPOSITED],
+}
+
+# An open or settled payment of these types rules out a new one of the key's type
+BLOCKING_TYPES = {
+    TYPE.TOKEN: [TYPE.TOKEN, TYPE.FULL],
+    TYPE.FULL: [TYPE.FULL],
+}
+
+# Events that keep raising unexpected errors are parked as FAILED after this
+MAX_ATTEMPTS = 5
+
+
+class PaymentError(Exception):
+    """A payment operation was refused; ``status_code`` is the HTTP status to report"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def payment_amount(order, transaction_type):
+    if transaction_type == TYPE.TOKEN:
+        return (order.final_amount * TOKEN_SHARE).quantize(Decimal('0.01'))
+    return order.final_amount
+
+
+def check_payable(order, transaction_type):
+    """Refuse a new payment the order no longer (or does not yet) need"""
+    if order.payment_status not in PAYABLE_STATUSES[transaction_type]:
+        raise PaymentError(
+            f'Order does not take a {transaction_type} payment while {order.payment_status}', 409
+        )
+    if EscrowTransaction.objects.filter(
+        order=order, transaction_type__in=BLOCKING_TYPES[transaction_type],
+        status__in=[EscrowTransaction.Status.PENDING, EscrowTransaction.Status.SUCCESS],
+    ).exists():
+        raise PaymentError('A payment for this order is already open or settled', 409)
+
+
+def create_intent(buyer, order_id, transaction_type, idempotency_key):
+    """
+    Create (or replay) the payment intent for a TOKEN or FULL payment and
+    make sure it has a gateway order. Returns ``(intent, created)``.
+    """
+    if transaction_type not in (TYPE.TOKEN, TYPE.FULL):
+        raise PaymentError('transaction_type must be TOKEN or FULL')
+    if not idempotency_key:
+        raise PaymentError('The Idempotency-Key header is required')
+
+    intent = PaymentIntent.objects.select_related('transaction').filter(
+        buyer=buyer, idempotency_key=idempotency_key
+    ).first()
+    created = intent is None
+    if created:
+        try:
+            with transaction.atomic():
+                # The order row lock serializes new intents for one order
+                order = Order.objects.select_for_update().filter(pk=order_id, buyer=buyer).first()
+                if order is None:
+                    raise PaymentError('Order not found', 404)
+                check_payable(order, transaction_type)
+                escrow_transaction = EscrowTransaction.objects.create(
+                    order=order,
+                    user=buyer,
+                    transaction_type=transaction_type,
+                    amount=payment_amount(order, transaction_type),
+                )
+                intent = PaymentIntent.objects.create(
+                    order=order, buyer=buyer, transaction=escrow_transaction,
+                    idempotency_key=idempotency_key,
+                )
+        except IntegrityError:
+            # A concurrent retry with the same key got there first
+            intent = PaymentIntent.objects.select_related('transaction').get(
+                buyer=buyer, idempotency_key=idempotency_key
+            )
+            created = False
+
+    if str(intent.order_id) != str(order_id) or intent.transaction.transaction_type != transaction_type:
+        raise PaymentError('Idempotency-Key was already used for a different payment', 422)
+
+    if not intent.gateway_order_id:
+        try:
+            gateway_order_id = get_gateway().create_order(
+                reference=f'intent-{intent.pk}',
+                amount=intent.transaction.amount,
+                idempotency_key=f'{buyer.pk}:{idempotency_key}',
+            )
+        except GatewayError as exc:
+            logger.warning('Opening gateway order for intent %s failed: %s', intent.pk, exc)
+            raise PaymentError('Payment gateway unavailable, retry with the same Idempotency-Key', 502)
+        PaymentIntent.objects.filter(pk=intent.pk).update(
+            gateway_order_id=gateway_order_id, updated_at=timezone.now()
+        )
+        intent.gateway_order_id = gateway_order_id
+    return intent, created
+
+
+def apply_event(event):
+    """Apply one webhook event to its escrow transaction"""
+    if event.event_type not in (PAYMENT_CAPTURED, PAYMENT_FAILED):
+        return
+    data = event.payload.get('data') or {}
+    intent = PaymentIntent.objects.filter(gateway_order_id=data.get('order_id') or '').first()
+    if intent is None:
+        raise PaymentError(f"Unknown gateway order {data.get('order_id')!r}")
+    escrow_transaction = EscrowTransaction.objects.select_for_update().get(pk=intent.transaction_id)
+    Status = EscrowTransaction.Status
+
+    if event.event_type == PAYMENT_CAPTURED:
+        try:
+            amount = Decimal(str(data.get('amount')))
+        except InvalidOperation:
+            amount = None
+        if amount != escrow_transaction.amount:
+            raise PaymentError(
+                f"Captured amount {data.get('amount')} does not match {escrow_transaction.amount}"
+            )
+        if escrow_transaction.status == Status.SUCCESS:
+            return
+        escrow_transaction.status = Status.SUCCESS
+        escrow_transaction.gateway_transaction_id = str(data.get('payment_id') or '')[:100]
+        escrow_transaction.save()
+    elif escrow_transaction.status == Status.PENDING:
+        # A failure reported after a capture is stale and ignored
+        escrow_transaction.status = Status.FAILED
+        escrow_transaction.save()
+
+
+def process_webhooks(batch_size=100):
+    """
+    Apply queued webhook events oldest first. Batches are claimed with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` so several workers can drain the
+    queue side by side. Returns ``(processed, failed)`` counts.
+    """
+    processed = failed = 0
+    while True:
+        retry_later = False
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status=WebhookEvent.Status.RECEIVED)
+                .order_by('received_at')[:batch_size]
+            )
+            now = timezone.now()
+            for event in events:
+                event.attempts += 1
+                try:
+                    with transaction.atomic():
+                        apply_event(event)
+                except PaymentError as exc:
+                    event.status = WebhookEvent.Status.FAILED
+                    event.error = exc.message
+                except Exception as exc:
+                    logger.exception('Applying webhook event %s failed', event.event_id)
+                    event.error = str(exc)
+                    if event.attempts >= MAX_ATTEMPTS:
+                        event.status = WebhookEvent.Status.FAILED
+                    else:
+                        retry_later = True
+                else:
+                    event.status = WebhookEvent.Status.PROCESSED
+                    event.error = ''
+                if event.status != WebhookEvent.Status.RECEIVED:
+                    event.processed_at = now
+                    if event.status == WebhookEvent.Status.PROCESSED:
+                        processed += 1
+                    else:
+                        failed += 1
+            WebhookEvent.objects.bulk_update(events, ['status', 'attempts', 'error', 'processed_at'])
+        if len(events) < batch_size or retry_later:
+            return processed, failed
@@ -0,0 +1,123 @@
+"""
+Reconciliation of gateway settlement files against escrow transactions.
+
+The settlement CSV is read row by row and handled in chunks: each chunk is
+matched against ``EscrowTransaction.gateway_transaction_id`` with a single
+``IN`` lookup and its mismatches are bulk-inserted before the next chunk is
+read, so memory stays bounded by the chunk size however large the file is.
+"""
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.utils import timezone
+
+from .models import EscrowTransaction, ReconciliationMismatch, ReconciliationRun
+
+# Gateway settlement status -> our transaction status
+SETTLEMENT_STATUSES = {
+    'captured': EscrowTransaction.Status.SUCCESS,
+    'settled': EscrowTransaction.Status.SUCCESS,
+    'success': EscrowTransaction.Status.SUCCESS,
+    'failed': EscrowTransaction.Status.FAILED,
+    'created': EscrowTransaction.Status.PENDING,
+    'pending': EscrowTransaction.Status.PENDING,
+}
+
+
+# Largest amount the report table can hold (max_digits=12, 2 decimal places)
+MAX_AMOUNT = Decimal('1e10')
+
+
+class SettlementColumns:
+    __slots__ = ('id', 'amount', 'status')
+
+    def __init__(self, id='payment_id', amount='amount', status='status'):
+        self.id = id
+        self.amount = amount
+        self.status = status
+
+
+def compare_chunk(run, rows, columns):
+    """
+    Match one chunk of ``(line_number, row)`` pairs against transactions and
+    return ``(matched, mismatches)``.
+    """
+    ids = {(row.get(columns.id) or '').strip() for _, row in rows} - {''}
+    recorded = {
+        txn['gateway_transaction_id']: txn
+        for txn in EscrowTransaction.objects.filter(gateway_transaction_id__in=ids).values(
+            'pk', 'gateway_transaction_id', 'amount', 'status'
+        )
+    }
+
+    matched = 0
+    mismatches = []
+    for line_number, row in rows:
+        gateway_id = (row.get(columns.id) or '').strip()
+        settled_status = (row.get(columns.status) or '').strip()
+        mismatch = ReconciliationMismatch(
+            run=run, line_number=line_number,
+            gateway_transaction_id=gateway_id[:100], settled_status=settled_status[:20],
+        )
+        try:
+            amount = Decimal((row.get(columns.amount) or '').strip())
+        except InvalidOperation:
+            amount = None
+        if amount is None or not amount.is_finite() or abs(amount) >= MAX_AMOUNT or not gateway_id:
+            mismatch.kind = ReconciliationMismatch.Kind.INVALID
+            mismatches.append(mismatch)
+            continue
+        mismatch.settled_amount = amount
+
+        txn = recorded.get(gateway_id)
+        if txn is None:
+            mismatch.kind = ReconciliationMismatch.Kind.MISSING
+            mismatches.append(mismatch)
+            continue
+        mismatch.transaction_id = txn['pk']
+        mismatch.recorded_amount = txn['amount']
+        mismatch.recorded_status = txn['status']
+        if txn['amount'] != mismatch.settled_amount:
+            mismatch.kind = ReconciliationMismatch.Kind.AMOUNT
+        elif SETTLEMENT_STATUSES.get(settled_status.lower(), settled_status.upper()) != txn['status']:
+            mismatch.kind = ReconciliationMismatch.Kind.STATUS
+        else:
+            matched += 1
+            continue
+        mismatches.append(mismatch)
+    return matched, mismatches
+
+
+def reconcile(lines, source, columns=None, chunk_size=2000):
+    """
+    Reconcile a settlement CSV given as an iterable of text lines (an open
+    file streams). Returns the finished ``ReconciliationRun``.
+    """
+    columns = columns or SettlementColumns()
+    reader = csv.DictReader(lines)
+    missing = {columns.id, columns.amount, columns.status} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Settlement file has no {', '.join(sorted(missing))} column")
+    run = ReconciliationRun.objects.create(source=source[:255])
+    # line_num counts the header as line 1, matching what a spreadsheet shows
+    numbered = ((reader.line_num, row) for row in reader)
+    try:
+        while True:
+            rows = list(islice(numbered, chunk_size))
+            if not rows:
+                break
+            matched, mismatches = compare_chunk(run, rows, columns)
+            ReconciliationMismatch.objects.bulk_create(mismatches, batch_size=1000)
+            run.rows += len(rows)
+            run.matched += matched
+            run.mismatched += len(mismatches)
+    except Exception:
+        run.status = ReconciliationRun.Status.FAILED
+        raise
+    else:
+        run.status = ReconciliationRun.Status.COMPLETED
+    finally:
+        run.finished_at = timezone.now()
+        run.save()
+    return run
@@ -0,0 +1,114 @@
+"""
+Escrow release scheduler.
+
+Delivered orders still holding funds are released to the farmer once
+``ESCROW_DISPUTE_WINDOW_HOURS`` have passed since delivery (an order moved to
+DISPUTED in the meantime is no longer DELIVERED and is skipped). Work is
+done per batch with set-based writes: one claiming UPDATE, one bulk INSERT
+of RELEASE transactions, one bulk INSERT of their ledger entries and one
+balance refresh. Batches are paged by ``(delivered_at, pk)``, so orders
+with nothing left in escrow (left for ``verify_ledger``) are stepped over
+rather than picked up again by every batch.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from market.models import Order
+from .models import EscrowTransaction, LedgerEntry, UserBalance
+
+HELD = [Order.PaymentStatus.TOKEN_DEPOSITED, Order.PaymentStatus.FULL_DEPOSITED]
+
+
+class ClaimLost(Exception):
+    """Another worker released part of the batch first; the batch is rolled back"""
+
+
+def due_orders(now):
+    cutoff = now - timedelta(hours=settings.ESCROW_DISPUTE_WINDOW_HOURS)
+    return Order.objects.filter(
+        order_status=Order.OrderStatus.DELIVERED, payment_status__in=HELD, delivered_at__lte=cutoff
+    )
+
+
+def release_batch(batch_size, now, after=None):
+    """
+    Release one batch of the due orders past the ``(delivered_at, pk)``
+    cursor ``after``; returns ``(orders picked up, orders released, cursor)``.
+    """
+    queryset = due_orders(now)
+    if after:
+        delivered_at, pk = after
+        queryset = queryset.filter(
+            Q(delivered_at__gt=delivered_at) | Q(delivered_at=delivered_at, pk__gt=pk)
+        )
+    with transaction.atomic():
+        orders = list(
+            queryset.select_for_update(skip_locked=True).order_by('delivered_at', 'pk')
+            .only('pk', 'buyer_id', 'farmer_id', 'delivered_at')[:batch_size]
+        )
+        if not orders:
+            return 0, 0, after
+        picked = len(orders)
+        cursor = (orders[-1].delivered_at, orders[-1].pk)
+
+        held = dict(
+            LedgerEntry.objects.filter(order__in=orders, account=LedgerEntry.Account.ESCROW)
+            .values('order').annotate(balance=Sum('amount')).order_by()
+            .values_list('order', 'balance')
+        )
+        # Orders with nothing left in escrow are for verify_ledger, not for us
+        orders = [order for order in orders if held.get(order.pk, 0) > 0]
+        if not orders:
+            return picked, 0, cursor
+
+        # The row locks already keep other workers away; the conditional
+        # UPDATE also covers databases without SKIP LOCKED
+        claimed = Order.objects.filter(
+            pk__in=[order.pk for order in orders], payment_status__in=HELD
+        ).update(payment_status=Order.PaymentStatus.RELEASED, updated_at=now)
+        if claimed != len(orders):
+            raise ClaimLost()
+
+        releases = EscrowTransaction.objects.bulk_create([
+            EscrowTransaction(
+                order_id=order.pk,
+                user_id=order.farmer_id,
+                transaction_type=EscrowTransaction.TransactionType.RELEASE,
+                amount=held[order.pk],
+                payment_gateway='ESCROW',
+                status=EscrowTransaction.Status.SUCCESS,
+            )
+            for order in orders
+        ])
+        LedgerEntry.objects.bulk_create([
+            entry
+            for order, release in zip(orders, releases)
+            for entry in LedgerEntry.objects.build_entries(release, order)
+        ])
+        UserBalance.objects.refresh(
+            [order.farmer_id for order in orders] + [order.buyer_id for order in orders]
+        )
+    return picked, len(orders), cursor
+
+
+def release_due_funds(batch_size=200, now=None):
+    """
+    Release escrow for every delivered order past the dispute window.
+    Safe to run from several workers at once. Returns the number of orders
+    released.
+    """
+    now = now or timezone.now()
+    released = 0
+    cursor = None
+    while True:
+        try:
+            picked, count, cursor = release_batch(batch_size, now, cursor)
+        except ClaimLost:
+            continue
+        released += count
+        if picked < batch_size:
+            return released
@@ -1,25 +1,39 @@
 from rest_framework import serializers
-from .models import EscrowTransaction
+from .models import EscrowTransaction, PaymentIntent
 from market.serializers import OrderSerializer
-from market.models import Order
-from accounts.serializers import UserSerializer
+from accounts.serializers import UserSummarySerializer
+from core.expansion import ExpandableFieldsMixin
 
 
-class EscrowTransactionSerializer(serializers.ModelSerializer):
-    order = OrderSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
-    order_id = serializers.PrimaryKeyRelatedField(
-        queryset=Order.objects.all(),
-        source='order',
-        write_only=True
-    )
+class EscrowTransactionSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    order = serializers.PrimaryKeyRelatedField(read_only=True)
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = EscrowTransaction
         fields = [
-            'id', 'order', 'order_id', 'user',
+            'id', 'order', 'user',
             'transaction_type', 'amount', 'payment_gateway',
             'gateway_transaction_id', 'status',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        # Transactions are opened by initiate_payment and settled by the
+        # gateway's webhooks, never written through this serializer
+        read_only_fields = fields
+    
+    expandable_fields = {
+        'order': (OrderSerializer, {}),
+        'user': (UserSummarySerializer, {}),
+    }
+
+
+class PaymentIntentSerializer(serializers.ModelSerializer):
+    transaction = EscrowTransactionSerializer(read_only=True)
+    
+    class Meta:
+        model = PaymentIntent
+        fields = [
+            'id', 'order', 'transaction', 'idempotency_key',
+            'gateway_order_id', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
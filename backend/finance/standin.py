@@ -0,0 +1,107 @@
+"""
+Local stand-in for the payment gateway, serving the API ``HttpGateway``
+expects. Orders are kept in memory; ``settle()`` plays the gateway's side
+of a payment by building (and, with a ``webhook_url``, delivering) the
+signed webhook, and ``POST /orders/<id>/pay`` (or ``/fail``) does the same
+over HTTP. Run it with ``manage.py run_gateway_standin``.
+"""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from .gateway import PAYMENT_CAPTURED, PAYMENT_FAILED, SIGNATURE_HEADER, sign
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        # /orders/<id>/pay and /orders/<id>/fail stand in for the buyer's checkout
+        parts = self.path.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'orders' and parts[2] in ('pay', 'fail'):
+            if parts[1] not in self.server.orders:
+                return self.reply(404, {'error': 'Unknown order'})
+            self.server.settle(parts[1], captured=parts[2] == 'pay')
+            return self.reply(200, self.server.orders[parts[1]])
+        if parts != ['orders']:
+            return self.reply(404, {'error': 'Not found'})
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self.reply(400, {'error': 'Invalid JSON'})
+        order = self.server.open_order(payload, self.headers.get('Idempotency-Key', ''))
+        self.reply(200, order)
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInGateway(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), secret='', webhook_url=None):
+        super().__init__(address, StandInHandler)
+        self.secret = secret
+        self.webhook_url = webhook_url
+        self.orders = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def open_order(self, payload, idempotency_key):
+        with self._lock:
+            if idempotency_key and idempotency_key in self._keys:
+                return self.orders[self._keys[idempotency_key]]
+            order = {
+                'id': f'order_{uuid.uuid4().hex[:14]}',
+                'reference': payload.get('reference'),
+                'amount': payload.get('amount'),
+                'status': 'created',
+            }
+            self.orders[order['id']] = order
+            if idempotency_key:
+                self._keys[idempotency_key] = order['id']
+            return order
+
+    def settle(self, order_id, captured=True, amount=None):
+        """Return ``(body, signature)`` for the webhook and deliver it if configured"""
+        order = self.orders[order_id]
+        order['status'] = 'paid' if captured else 'failed'
+        body = json.dumps({
+            'id': f'evt_{uuid.uuid4().hex[:14]}',
+            'type': PAYMENT_CAPTURED if captured else PAYMENT_FAILED,
+            'data': {
+                'order_id': order_id,
+                'payment_id': f'pay_{uuid.uuid4().hex[:14]}',
+                'amount': amount or order['amount'],
+            },
+        }).encode()
+        signature = sign(body, self.secret)
+        if self.webhook_url:
+            request = Request(self.webhook_url, data=body, method='POST', headers={
+                'Content-Type': 'application/json', SIGNATURE_HEADER: signature,
+            })
+            with urlopen(request, timeout=10):
+                pass
+        return body, signature
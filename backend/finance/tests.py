@@ -1,3 +1,498 @@
-from django.test import TestCase
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.testing import (
+    QueryCountAssertionsMixin, make_bid, make_buyer, make_farmer, make_listing
+)
+from market.models import Order
+from . import ledger
+from .models import (
+    EscrowTransaction, LedgerEntry, LedgerError, LedgerSnapshot, ReconciliationMismatch, UserBalance,
+    WebhookEvent,
+)
+from .payments import process_webhooks
+from .reconciliation import reconcile
+from .releases import release_due_funds
+from .standin import StandInGateway
+
+
+class StandInGatewayMixin:
+    """Point the payment gateway client at a stand-in server for each test"""
+
+    def setUp(self):
+        super().setUp()
+        self.gateway = StandInGateway(secret=settings.PAYMENT_WEBHOOK_SECRET).start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(PAYMENT_GATEWAY_URL=self.gateway.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def deliver(self, gateway_order_id, captured=True, amount=None):
+        body, signature = self.gateway.settle(gateway_order_id, captured, amount)
+        return self.client.generic(
+            'POST', '/api/finance/webhook/', body,
+            content_type='application/json', HTTP_X_GATEWAY_SIGNATURE=signature,
+        )
+
+
+class TransactionListQueryCountTests(StandInGatewayMixin, QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+
+    def add_transactions(self, n):
+        for _ in range(n):
+            bid = make_bid(make_listing(self.farmer), self.buyer)
+            self.client.force_authenticate(self.farmer)
+            order_id = self.client.post(f'/api/bids/{bid.pk}/accept/').data['id']
+            self.client.force_authenticate(self.buyer)
+            self.client.post(
+                '/api/finance/transactions/initiate_payment/', {'order_id': order_id},
+                HTTP_IDEMPOTENCY_KEY=f'pay-{order_id}',
+            )
+
+    def test_transactions_expanded(self):
+        self.assertQueryCountConstant(
+            '/api/finance/transactions/', self.add_transactions, expand='order.listing,user'
+        )
+
+
+class FinanceDashboardTests(StandInGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        bid = make_bid(make_listing(self.farmer), self.buyer, amount=2000)
+        self.client.force_authenticate(self.farmer)
+        self.order_id = self.client.post(f'/api/bids/{bid.pk}/accept/').data['id']
+
+    def pay(self, transaction_type):
+        self.client.force_authenticate(self.buyer)
+        intent = self.client.post('/api/finance/transactions/initiate_payment/', {
+            'order_id': self.order_id, 'transaction_type': transaction_type
+        }, HTTP_IDEMPOTENCY_KEY=f'pay-{transaction_type}').data
+        self.deliver(intent['gateway_order_id'])
+        process_webhooks()
+
+    def test_balances_follow_transaction_status(self):
+        self.pay('TOKEN')
+        self.pay('FULL')
+        token = EscrowTransaction.objects.get(transaction_type='TOKEN')
+        token.status = EscrowTransaction.Status.FAILED
+        token.save()
+
+        self.client.force_authenticate(self.buyer)
+        # One balance row plus the recent transactions
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/finance/dashboard/').data
+        full = EscrowTransaction.objects.get(transaction_type='FULL').amount
+        self.assertEqual(
+            (data['total_paid'], data['token_payments'], data['full_payments'], data['total_transactions']),
+            (float(full), 0.0, float(full), 1)
+        )
+        self.assertEqual(len(data['recent_transactions']), 1)
+
+        self.client.force_authenticate(self.farmer)
+        data = self.client.get('/api/finance/dashboard/').data
+        self.assertEqual((data['pending_releases'], data['total_earnings']), (float(full), 0.0))
+
+    def test_rebuild_repairs_drift(self):
+        self.pay('TOKEN')
+        expected = UserBalance.objects.get(user=self.buyer).paid
+        UserBalance.objects.all().delete()
+        call_command('rebuild_balances', stdout=StringIO())
+        self.assertEqual(UserBalance.objects.get(user=self.buyer).paid, expected)
+        self.assertEqual(UserBalance.objects.get(user=self.farmer).pending_release, expected)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        bid = make_bid(make_listing(self.farmer), self.buyer, amount=2000)
+        self.client.force_authenticate(self.farmer)
+        self.order = Order.objects.get(pk=self.client.post(f'/api/bids/{bid.pk}/accept/').data['id'])
+
+    def record(self, transaction_type, amount, status=EscrowTransaction.Status.SUCCESS):
+        return EscrowTransaction.objects.create(
+            order=self.order, user=self.buyer, transaction_type=transaction_type,
+            amount=amount, status=status,
+        )
+
+    def test_entries_balance_and_drive_payment_status(self):
+        full = self.record('FULL', self.order.final_amount)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, Order.PaymentStatus.FULL_DEPOSITED)
+        self.assertEqual(ledger.balance_as_of('ESCROW', self.buyer), self.order.final_amount)
+
+        release = self.record('RELEASE', self.order.final_amount, EscrowTransaction.Status.PENDING)
+        self.assertEqual(LedgerEntry.objects.filter(transaction=release).count(), 0)
+        release.status = EscrowTransaction.Status.SUCCESS
+        release.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, Order.PaymentStatus.RELEASED)
+        self.assertEqual(ledger.balance_as_of('FARMER_PAYABLE', self.farmer), self.order.final_amount)
+        self.assertEqual(ledger.balance_as_of('ESCROW', self.buyer), 0)
+
+        # Failing a settled transaction appends reversing entries
+        release.status = EscrowTransaction.Status.FAILED
+        release.save()
+        self.assertEqual(LedgerEntry.objects.filter(transaction=release).count(), 4)
+        self.assertEqual(ledger.balance_as_of('FARMER_PAYABLE', self.farmer), 0)
+        self.assertEqual(sum(e.amount for e in LedgerEntry.objects.all()), 0)
+        self.assertEqual(list(ledger.verify()), [])
+
+        with self.assertRaises(LedgerError):
+            LedgerEntry.objects.filter(transaction=full).first().delete()
+        with self.assertRaises(LedgerError):
+            LedgerEntry.objects.filter(transaction=full).delete()
+        with self.assertRaises(LedgerError):
+            LedgerEntry.objects.update(amount=0)
+
+    def test_backfill_dates_entries_by_their_transaction(self):
+        # bulk_create skips the post_save hook, as rows written before the ledger did
+        token, = EscrowTransaction.objects.bulk_create([EscrowTransaction(
+            order=self.order, user=self.buyer, transaction_type='TOKEN',
+            amount=Decimal('1000.00'), status=EscrowTransaction.Status.SUCCESS,
+        )])
+        paid_at = timezone.now() - timedelta(days=30)
+        EscrowTransaction.objects.filter(pk=token.pk).update(created_at=paid_at)
+        self.assertFalse(LedgerEntry.objects.exists())
+
+        # Migrations see the historical models, without the append-only manager
+        state = MigrationLoader(connection).project_state(('finance', '0004_ledger'))
+        import_module('finance.migrations.0004_ledger').backfill_ledger(state.apps, None)
+        self.assertEqual(
+            list(LedgerEntry.objects.values_list('created_at', flat=True)), [paid_at, paid_at]
+        )
+    
+    def test_balance_as_of_reads_snapshot_plus_tail(self):
+        self.record('TOKEN', Decimal('1000.00'))
+        snapshot_time = timezone.now()
+        self.assertEqual(ledger.take_snapshot(snapshot_time), 2)
+        self.record('TOKEN', Decimal('500.00'))
+
+        self.assertEqual(ledger.balance_as_of('ESCROW', self.buyer, snapshot_time), Decimal('1000.00'))
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger.balance_as_of('ESCROW', self.buyer), Decimal('1500.00'))
+        self.assertEqual(ledger.balance_as_of('BUYER_WALLET', self.buyer), Decimal('-1500.00'))
+
+    def test_late_entries_go_into_the_next_snapshot(self):
+        self.record('TOKEN', Decimal('1000.00'))
+        snapshot_time = timezone.now()
+        self.assertEqual(ledger.take_snapshot(snapshot_time), 2)
+        # Committed after the snapshot, stamped before it by a lagging clock
+        with mock.patch('django.utils.timezone.now', return_value=snapshot_time - timedelta(minutes=1)):
+            self.record('TOKEN', Decimal('500.00'))
+
+        self.assertEqual(ledger.balance_as_of('ESCROW', self.buyer), Decimal('1500.00'))
+        self.assertEqual(ledger.take_snapshot(timezone.now()), 2)
+        self.assertEqual(
+            LedgerSnapshot.objects.filter(account='ESCROW').latest('as_of').balance, Decimal('1500.00')
+        )
+        self.assertEqual(ledger.balance_as_of('ESCROW', self.buyer), Decimal('1500.00'))
+
+    def test_verifier_reports_drift(self):
+        self.record('TOKEN', Decimal('1000.00'))
+        Order.objects.filter(pk=self.order.pk).update(payment_status=Order.PaymentStatus.PENDING)
+        with self.assertRaises(CommandError):
+            call_command('verify_ledger', stdout=StringIO())
+
+
+class PaymentFlowTests(StandInGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        bid = make_bid(make_listing(self.farmer), self.buyer, amount=2000)
+        self.client.force_authenticate(self.farmer)
+        self.order_id = self.client.post(f'/api/bids/{bid.pk}/accept/').data['id']
+        self.client.force_authenticate(self.buyer)
+
+    def initiate(self, key='checkout-1', transaction_type='TOKEN'):
+        return self.client.post('/api/finance/transactions/initiate_payment/', {
+            'order_id': self.order_id, 'transaction_type': transaction_type
+        }, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_returns_the_same_intent(self):
+        first = self.initiate()
+        retry = self.initiate()
+        self.assertEqual((first.status_code, retry.status_code), (201, 200))
+        self.assertEqual(first.data['id'], retry.data['id'])
+        self.assertEqual(first.data['gateway_order_id'], retry.data['gateway_order_id'])
+        self.assertEqual(len(self.gateway.orders), 1)
+        self.assertEqual(EscrowTransaction.objects.get().status, EscrowTransaction.Status.PENDING)
+        self.assertEqual(Order.objects.get().payment_status, Order.PaymentStatus.PENDING)
+        self.assertEqual(self.initiate(transaction_type='FULL').status_code, 422)
+
+    def test_intents_only_open_for_payments_the_order_needs(self):
+        self.assertEqual(self.initiate(key='').status_code, 400)
+        self.assertEqual(self.initiate().status_code, 201)
+        # A second token payment under a fresh key, while the first is open
+        self.assertEqual(self.initiate(key='checkout-2').status_code, 409)
+
+        EscrowTransaction.objects.update(status=EscrowTransaction.Status.FAILED)
+        self.assertEqual(self.initiate(key='checkout-3').status_code, 201)
+
+        Order.objects.update(payment_status=Order.PaymentStatus.RELEASED)
+        response = self.initiate(key='checkout-4', transaction_type='FULL')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('RELEASED', response.data['error'])
+
+    def test_transactions_cannot_be_written_directly(self):
+        self.initiate()
+        url = f'/api/finance/transactions/{EscrowTransaction.objects.get().pk}/'
+        self.assertEqual(self.client.patch(url, {'amount': '1.00'}).status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.client.force_authenticate(self.farmer)
+        response = self.client.post('/api/finance/transactions/', {
+            'order_id': self.order_id, 'transaction_type': 'RELEASE', 'amount': '2000.00'
+        })
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(EscrowTransaction.objects.count(), 1)
+
+    def test_webhook_is_queued_then_applied_once(self):
+        intent = self.initiate().data
+        body, signature = self.gateway.settle(intent['gateway_order_id'])
+        for _ in range(2):  # the gateway redelivers
+            response = self.client.generic(
+                'POST', '/api/finance/webhook/', body,
+                content_type='application/json', HTTP_X_GATEWAY_SIGNATURE=signature,
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.Status.RECEIVED)
+        self.assertEqual(EscrowTransaction.objects.get().status, EscrowTransaction.Status.PENDING)
+
+        self.assertEqual(process_webhooks(), (1, 0))
+        transaction = EscrowTransaction.objects.get()
+        self.assertEqual(transaction.status, EscrowTransaction.Status.SUCCESS)
+        self.assertTrue(transaction.gateway_transaction_id.startswith('pay_'))
+        self.assertEqual(Order.objects.get().payment_status, Order.PaymentStatus.TOKEN_DEPOSITED)
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+    def test_rejected_webhooks(self):
+        intent = self.initiate().data
+        body, _ = self.gateway.settle(intent['gateway_order_id'])
+        response = self.client.generic(
+            'POST', '/api/finance/webhook/', body,
+            content_type='application/json', HTTP_X_GATEWAY_SIGNATURE='forged',
+        )
+        self.assertEqual(response.status_code, 401)
+
+        self.deliver(intent['gateway_order_id'], amount='1.00')
+        self.deliver(intent['gateway_order_id'], captured=False)
+        self.assertEqual(process_webhooks(), (1, 1))
+        self.assertIn('does not match', WebhookEvent.objects.get(status=WebhookEvent.Status.FAILED).error)
+        self.assertEqual(EscrowTransaction.objects.get().status, EscrowTransaction.Status.FAILED)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        farmer, buyer = make_farmer(), make_buyer()
+        bid = make_bid(make_listing(farmer), buyer, amount=2000)
+        self.client = APIClient()
+        self.client.force_authenticate(farmer)
+        order = Order.objects.get(pk=self.client.post(f'/api/bids/{bid.pk}/accept/').data['id'])
+        for number, status in enumerate(['SUCCESS', 'SUCCESS', 'PENDING']):
+            EscrowTransaction.objects.create(
+                order=order, user=buyer, transaction_type='TOKEN', amount=Decimal('100.00'),
+                status=status, gateway_transaction_id=f'pay_{number}',
+            )
+
+    def test_mismatches_are_recorded_with_one_lookup_per_chunk(self):
+        lines = [
+            'payment_id,amount,status\n',
+            'pay_0,100.00,captured\n',
+            'pay_1,99.50,captured\n',
+            'pay_2,100.00,captured\n',
+            'pay_9,100.00,captured\n',
+            ',abc,captured\n',
+        ]
+        # The run's INSERT and UPDATE, plus one lookup and one insert per chunk
+        # of 2 rows (the last chunk has no ids to look up)
+        with self.assertNumQueries(7):
+            run = reconcile(iter(lines), 'settlement.csv', chunk_size=2)
+
+        self.assertEqual((run.rows, run.matched, run.mismatched), (5, 1, 4))
+        self.assertEqual(
+            list(run.mismatches.values_list('line_number', 'kind', 'gateway_transaction_id')),
+            [
+                (3, ReconciliationMismatch.Kind.AMOUNT, 'pay_1'),
+                (4, ReconciliationMismatch.Kind.STATUS, 'pay_2'),
+                (5, ReconciliationMismatch.Kind.MISSING, 'pay_9'),
+                (6, ReconciliationMismatch.Kind.INVALID, ''),
+            ]
+        )
+
+    def test_command_rejects_files_without_the_columns(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('id,value\npay_0,100.00\n')
+        self.addCleanup(os.remove, handle.name)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_settlements', handle.name, stdout=StringIO())
+
+
+class StatementExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        bid = make_bid(make_listing(self.farmer), self.buyer, amount=2000)
+        self.client.force_authenticate(self.farmer)
+        order = Order.objects.get(pk=self.client.post(f'/api/bids/{bid.pk}/accept/').data['id'])
+        for amount, status in [('100.00', 'SUCCESS'), ('250.00', 'SUCCESS'), ('75.00', 'FAILED')]:
+            EscrowTransaction.objects.create(
+                order=order, user=self.buyer, transaction_type='TOKEN',
+                amount=Decimal(amount), status=status,
+            )
+
+    def test_statement_streams_rows_then_totals(self):
+        self.client.force_authenticate(self.buyer)
+        response = self.client.get('/api/finance/transactions/statement/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['Date', 'Transaction', 'Order'])
+        self.assertEqual(len([line for line in lines[1:] if ',TOKEN,' in line]), 3)
+        self.assertIn('Transactions,3', lines)
+        self.assertIn('Total Token Payment (20%) (successful),350.00', lines)
+
+    def test_statement_is_scoped_and_validates_dates(self):
+        self.client.force_authenticate(make_buyer())
+        lines = b''.join(self.client.get('/api/finance/transactions/statement/').streaming_content)
+        self.assertIn(b'Transactions,0', lines)
+        response = self.client.get('/api/finance/transactions/statement/', {'start': '2026-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_statement_as_xlsx(self):
+        self.client.force_authenticate(self.buyer)
+        response = self.client.get('/api/finance/transactions/statement/', {'file_format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.xlsx"', response['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3 + 1 + 2 + len(EscrowTransaction.TransactionType.choices))
+        self.assertIn('<t>Amount (INR)</t>', sheet)
+        self.assertIn('<c><v>350.00</v></c>', sheet)
+
+        response = self.client.get('/api/finance/transactions/statement/', {'file_format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_statement_streams_asynchronously_under_asgi(self):
+        response = await AsyncClient().get(
+            '/api/finance/transactions/statement/',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.buyer)}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertIn(b'Transactions,3', lines)
+
+
+class EscrowReleaseTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+
+    def delivered_order(self, hours_ago=100, held=True):
+        bid = make_bid(make_listing(self.farmer), self.buyer, amount=2000)
+        self.client.force_authenticate(self.farmer)
+        order = Order.objects.get(pk=self.client.post(f'/api/bids/{bid.pk}/accept/').data['id'])
+        if held:
+            EscrowTransaction.objects.create(
+                order=order, user=self.buyer, transaction_type='FULL',
+                amount=order.final_amount, status='SUCCESS',
+            )
+        else:
+            # Marked as paid with no money in escrow
+            Order.objects.filter(pk=order.pk).update(payment_status=Order.PaymentStatus.FULL_DEPOSITED)
+        Order.objects.filter(pk=order.pk).update(
+            order_status=Order.OrderStatus.DELIVERED,
+            delivered_at=timezone.now() - timedelta(hours=hours_ago),
+        )
+        return order
+
+    def test_delivery_starts_the_dispute_window(self):
+        order = self.delivered_order()
+        Order.objects.filter(pk=order.pk).update(delivered_at=None, order_status='IN_TRANSIT')
+        url = f'/api/logistics/shipments/{order.shipment.pk}/update_status/'
+        # The farmer is the payee and cannot start the countdown
+        self.client.force_authenticate(self.farmer)
+        self.assertEqual(self.client.post(url, {'status': 'DELIVERED'}).status_code, 403)
+
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.post(url, {'status': 'DELIVERED'}).status_code, 200)
+        order.refresh_from_db()
+        first_delivery = order.delivered_at
+        self.assertIsNotNone(first_delivery)
+
+        self.client.post(url, {'status': 'IN_TRANSIT'})
+        order.refresh_from_db()
+        self.assertIsNone(order.delivered_at)
+        self.client.post(url, {'status': 'DELIVERED'})
+        order.refresh_from_db()
+        self.assertGreater(order.delivered_at, first_delivery)
+
+    def test_due_orders_are_released_in_set_based_batches(self):
+        self.delivered_order()
+        with self.settings(ESCROW_DISPUTE_WINDOW_HOURS=72):
+            with self.assertNumQueries(9):
+                self.assertEqual(release_due_funds(batch_size=10), 1)
+
+        orders = [self.delivered_order() for _ in range(3)]
+        recent = self.delivered_order(hours_ago=1)
+        with self.settings(ESCROW_DISPUTE_WINDOW_HOURS=72):
+            # Same statements for a batch of three as for one
+            with self.assertNumQueries(9):
+                self.assertEqual(release_due_funds(batch_size=10), 3)
+            self.assertEqual(release_due_funds(), 0)
+
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.payment_status, Order.PaymentStatus.RELEASED)
+        recent.refresh_from_db()
+        self.assertEqual(recent.payment_status, Order.PaymentStatus.FULL_DEPOSITED)
+
+        released = sum(order.final_amount for order in orders) + Order.objects.exclude(
+            pk__in=[o.pk for o in orders] + [recent.pk]
+        ).get().final_amount
+        balance = UserBalance.objects.get(user=self.farmer)
+        self.assertEqual(balance.earned, released)
+        self.assertEqual(balance.pending_release, recent.final_amount)
+        self.assertEqual(ledger.balance_as_of('FARMER_PAYABLE', self.farmer), released)
+        self.assertEqual(list(ledger.verify()), [])
+
+    def test_orders_with_nothing_held_do_not_block_the_queue(self):
+        # Paid orders with nothing in escrow are left for verify_ledger
+        for _ in range(2):
+            self.delivered_order(hours_ago=200, held=False)
+        order = self.delivered_order()
+        with self.settings(ESCROW_DISPUTE_WINDOW_HOURS=72):
+            self.assertEqual(release_due_funds(batch_size=2), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, Order.PaymentStatus.RELEASED)
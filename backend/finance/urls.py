@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EscrowTransactionViewSet, finance_dashboard
+from .views import EscrowTransactionViewSet, finance_dashboard, payment_webhook
 
 router = DefaultRouter()
 router.register(r'transactions', EscrowTransactionViewSet, basename='transaction')
 
 urlpatterns = [
     path('finance/dashboard/', finance_dashboard, name='finance-dashboard'),
+    path('finance/webhook/', payment_webhook, name='payment-webhook'),
     path('finance/', include(router.urls)),
 ]
@@ -1,21 +1,41 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Q
-from decimal import Decimal
-from .models import EscrowTransaction
-from .serializers import EscrowTransactionSerializer
-from market.models import Order
+from rest_framework.permissions import AllowAny, IsAuthenticated
+import json
+from datetime import datetime, time, timedelta
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from core.conditional import ConditionalGetMixin, conditional_response, make_etag
+from core.expansion import EagerLoadingMixin
+from core.pagination import KeysetPagination
+from . import payments, statements
+from .gateway import SIGNATURE_HEADER, get_gateway
+from .models import EscrowTransaction, UserBalance, WebhookEvent
+from .serializers import EscrowTransactionSerializer, PaymentIntentSerializer
 
 
-class EscrowTransactionViewSet(viewsets.ModelViewSet):
-    """View and create escrow transactions"""
+# file_format -> (writer, content type). Not "format": DRF reserves it
+STATEMENT_FORMATS = {
+    'csv': (statements.statement_rows, 'text/csv'),
+    'xlsx': (statements.statement_xlsx, statements.XLSX_CONTENT_TYPE),
+}
+
+
+class EscrowTransactionViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    View escrow transactions. They are only ever created through
+    ``initiate_payment`` and settled by the gateway's webhooks.
+    """
     queryset = EscrowTransaction.objects.all()
     serializer_class = EscrowTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_fields = ['status', 'transaction_type', 'order']
     ordering_fields = ['created_at']
+    ordering = ['-created_at']
     
     def get_queryset(self):
         # Users see transactions for their orders only
@@ -28,120 +48,142 @@ class EscrowTransactionViewSet(viewsets.ModelViewSet):
             return queryset.filter(order__buyer=user)
         return queryset.none()
     
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
-    
-    @action(detail=False, methods=['post'])
-    def initiate_payment(self, request):
-        """Initiate a payment for an order"""
-        order_id = request.data.get('order_id')
-        transaction_type = request.data.get('transaction_type', 'TOKEN')
-        
+    @action(detail=False, methods=['get'])
+    def statement(self, request):
+        """
+        Stream a statement of the user's transactions between ``start`` and
+        ``end`` (YYYY-MM-DD, inclusive; default the last 365 days) as CSV, or
+        as XLSX with ``file_format=xlsx``. The ``status`` /
+        ``transaction_type`` / ``order`` filters also apply.
+        """
+        params = request.query_params
         try:
-            order = Order.objects.get(id=order_id, buyer=request.user)
-        except Order.DoesNotExist:
+            end = parse_date(params['end']) if 'end' in params else timezone.localdate()
+            start = parse_date(params['start']) if 'start' in params else end - timedelta(days=365)
+        except (ValueError, TypeError):
+            start = end = None
+        if not start or not end or start > end:
             return Response(
-                {'error': 'Order not found'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'start and end must be dates (YYYY-MM-DD) with start <= end'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        file_format = params.get('file_format', 'csv')
+        if file_format not in STATEMENT_FORMATS:
+            return Response(
+                {'error': f"file_format must be one of: {', '.join(STATEMENT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Calculate amount based on transaction type
-        if transaction_type == 'TOKEN':
-            amount = order.final_amount * Decimal('0.20')  # 20% token
-        else:
-            amount = order.final_amount
-        
-        # Create transaction (mock payment for MVP)
-        transaction = EscrowTransaction.objects.create(
-            order=order,
-            user=request.user,
-            transaction_type=transaction_type,
-            amount=amount,
-            status='SUCCESS',  # Mock success for MVP
-            gateway_transaction_id=f'TXN{order.id}{transaction_type}'
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            created_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+            created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
         )
-        
-        # Update order payment status
-        if transaction_type == 'TOKEN':
-            order.payment_status = 'TOKEN_DEPOSITED'
-        elif transaction_type == 'FULL':
-            order.payment_status = 'FULL_DEPOSITED'
-        order.save()
+        write, content_type = STATEMENT_FORMATS[file_format]
+        content = write(queryset)
+        if isinstance(request._request, ASGIRequest):
+            content = statements.aiter_chunks(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="statement-{start}-{end}.{file_format}"'
+        return response
+    
+    @action(detail=False, methods=['post'])
+    def initiate_payment(self, request):
+        """
+        Open a gateway payment for an order. The escrow transaction stays
+        PENDING until the gateway's webhook is processed. The Idempotency-Key
+        header is required; retrying with the same key returns the same
+        intent.
+        """
+        try:
+            intent, created = payments.create_intent(
+                request.user,
+                request.data.get('order_id'),
+                request.data.get('transaction_type', 'TOKEN'),
+                request.headers.get('Idempotency-Key', '')[:64],
+            )
+        except payments.PaymentError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
         
         return Response(
-            EscrowTransactionSerializer(transaction).data,
-            status=status.HTTP_201_CREATED
+            PaymentIntentSerializer(intent, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
         )
 
 
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def payment_webhook(request):
+    """
+    Receive a gateway webhook. Only the signature is checked here; the event
+    is queued for ``payments.process_webhooks`` so bursts are acknowledged
+    at the cost of a single INSERT each.
+    """
+    body = request.body
+    if not get_gateway().verify_signature(body, request.headers.get(SIGNATURE_HEADER, '')):
+        return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        event = json.loads(body)
+        event_id, event_type = str(event['id']), str(event['type'])
+    except (ValueError, KeyError, TypeError):
+        return Response({'error': 'Malformed event'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Redeliveries of an event already queued are acknowledged and dropped
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(event_id=event_id[:100], event_type=event_type[:50], payload=event)
+    ], ignore_conflicts=True)
+    return Response({'received': True})
+
+
+RECENT_TRANSACTION_FIELDS = [
+    'id', 'order_id', 'user_id', 'transaction_type', 'amount', 'payment_gateway',
+    'gateway_transaction_id', 'status', 'created_at', 'updated_at',
+]
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def finance_dashboard(request):
     """Get finance dashboard statistics for the logged-in user"""
     user = request.user
     
+    if user.role not in ('FARMER', 'BUYER'):
+        return Response({'error': 'Invalid user role'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Totals are materialized per user; the row is touched on every
+    # transaction change, so its updated_at doubles as the watermark
+    balance = UserBalance.objects.filter(user=user).first() or UserBalance(user=user)
+    return conditional_response(
+        request, make_etag(request, balance.updated_at), balance.updated_at,
+        lambda: build_finance_dashboard(user, balance)
+    )
+
+
+def build_finance_dashboard(user, balance):
+    successful = EscrowTransaction.objects.filter(status='SUCCESS').only(*RECENT_TRANSACTION_FIELDS)
+    
     if user.role == 'FARMER':
         # Farmer's earnings
-        transactions = EscrowTransaction.objects.filter(
-            order__farmer=user,
-            transaction_type='RELEASE',
-            status='SUCCESS'
-        )
-        
-        total_earnings = transactions.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        pending_releases = EscrowTransaction.objects.filter(
-            order__farmer=user,
-            transaction_type__in=['TOKEN', 'FULL'],
-            status='SUCCESS'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        total_transactions = transactions.count()
-        
-        # Recent transactions
-        recent = transactions.order_by('-created_at')[:10]
-        
+        recent = successful.filter(order__farmer=user, transaction_type='RELEASE')
         return Response({
             'role': 'FARMER',
-            'total_earnings': float(total_earnings),
-            'pending_releases': float(pending_releases),
-            'total_transactions': total_transactions,
-            'recent_transactions': EscrowTransactionSerializer(recent, many=True).data
-        })
-    
-    elif user.role == 'BUYER':
-        # Buyer's payments
-        transactions = EscrowTransaction.objects.filter(
-            order__buyer=user,
-            status='SUCCESS'
-        )
-        
-        total_paid = transactions.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        token_payments = transactions.filter(
-            transaction_type='TOKEN'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        full_payments = transactions.filter(
-            transaction_type='FULL'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        total_transactions = transactions.count()
-        
-        # Recent transactions
-        recent = transactions.order_by('-created_at')[:10]
-        
-        return Response({
-            'role': 'BUYER',
-            'total_paid': float(total_paid),
-            'token_payments': float(token_payments),
-            'full_payments': float(full_payments),
-            'total_transactions': total_transactions,
-            'recent_transactions': EscrowTransactionSerializer(recent, many=True).data
+            'total_earnings': float(balance.earned),
+            'pending_releases': float(balance.pending_release),
+            'total_transactions': balance.releases_count,
+            'recent_transactions': EscrowTransactionSerializer(
+                recent.order_by('-created_at')[:10], many=True
+            ).data
         })
     
-    return Response({'error': 'Invalid user role'}, status=status.HTTP_400_BAD_REQUEST)
+    # Buyer's payments
+    recent = successful.filter(order__buyer=user)
+    return Response({
+        'role': 'BUYER',
+        'total_paid': float(balance.paid),
+        'token_payments': float(balance.token_paid),
+        'full_payments': float(balance.full_paid),
+        'total_transactions': balance.payments_count,
+        'recent_transactions': EscrowTransactionSerializer(
+            recent.order_by('-created_at')[:10], many=True
+        ).data
+    })
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0001_initial'),
+        ('market', '0002_listing_bid_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['-created_at'], name='shipment_created_idx'),
+        ),
+    ]
@@ -29,5 +29,10 @@ class Shipment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='shipment_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Shipment for Order #{self.order.id} - {self.status}"
@@ -2,10 +2,11 @@ from rest_framework import serializers
 from .models import Shipment
 from market.serializers import OrderSerializer
 from market.models import Order
+from core.expansion import ExpandableFieldsMixin
 
 
-class ShipmentSerializer(serializers.ModelSerializer):
-    order = OrderSerializer(read_only=True)
+class ShipmentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    order = serializers.PrimaryKeyRelatedField(read_only=True)
     order_id = serializers.PrimaryKeyRelatedField(
         queryset=Order.objects.all(),
         source='order',
@@ -22,3 +23,7 @@ class ShipmentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    expandable_fields = {
+        'order': (OrderSerializer, {}),
+    }
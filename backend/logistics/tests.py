@@ -1,3 +1,24 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from core.testing import (
+    QueryCountAssertionsMixin, make_bid, make_buyer, make_farmer, make_listing
+)
+
+
+class ShipmentListQueryCountTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+
+    def add_shipments(self, n):
+        self.client.force_authenticate(self.farmer)
+        for _ in range(n):
+            bid = make_bid(make_listing(self.farmer), make_buyer())
+            self.client.post(f'/api/bids/{bid.pk}/accept/')
+
+    def test_shipments_expanded(self):
+        self.assertQueryCountConstant(
+            '/api/logistics/shipments/', self.add_shipments,
+            expand='order.listing.crop_variety,order.buyer'
+        )
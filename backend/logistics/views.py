@@ -2,24 +2,32 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.utils import timezone
+from core.conditional import ConditionalGetMixin
+from core.expansion import EagerLoadingMixin
+from core.pagination import KeysetPagination
 from .models import Shipment
 from .serializers import ShipmentSerializer
 from market.models import Order
 
 
-class ShipmentViewSet(viewsets.ModelViewSet):
+class ShipmentViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     """View and manage shipments"""
     queryset = Shipment.objects.all()
     serializer_class = ShipmentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_fields = ['status', 'order']
     ordering_fields = ['created_at', 'pickup_date']
+    ordering = ['-created_at']
     
     def get_queryset(self):
         # Users see shipments for their orders only
         queryset = super().get_queryset()
         user = self.request.user
         
+        if user.is_staff:
+            return queryset
         if user.role == 'FARMER':
             return queryset.filter(order__farmer=user)
         elif user.role == 'BUYER':
@@ -28,7 +36,10 @@ class ShipmentViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
-        """Update shipment status"""
+        """
+        Update shipment status. Delivery starts the countdown to escrow
+        release, so only the buyer (or staff) can confirm it.
+        """
         shipment = self.get_object()
         new_status = request.data.get('status')
         
@@ -37,16 +48,28 @@ class ShipmentViewSet(viewsets.ModelViewSet):
                 {'error': 'Invalid status'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        order = shipment.order
+        if new_status == 'DELIVERED' and not (request.user.is_staff or request.user.pk == order.buyer_id):
+            return Response(
+                {'error': 'Only the buyer can confirm delivery'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
+        was_delivered = shipment.status == 'DELIVERED'
         shipment.status = new_status
         shipment.save()
         
         # Update order status accordingly
-        order = shipment.order
         if new_status == 'IN_TRANSIT':
             order.order_status = 'IN_TRANSIT'
-        elif new_status == 'DELIVERED':
+        if new_status == 'DELIVERED':
             order.order_status = 'DELIVERED'
+            # Starts the dispute window before escrow is released
+            if not was_delivered or order.delivered_at is None:
+                order.delivered_at = timezone.now()
+        else:
+            # A shipment taken back out of DELIVERED is re-timed on its next delivery
+            order.delivered_at = None
         order.save()
         
-        return Response(ShipmentSerializer(shipment).data)
+        return Response(self.get_serializer(shipment).data)
@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import CropListing, Bid, Order
+from .models import CropListing, Bid, BidRevision, BuyOrder, Order, SavedSearch, SavedSearchMatch
 
 
 @admin.register(CropListing)
 class CropListingAdmin(admin.ModelAdmin):
     list_display = ['id', 'farmer', 'crop_variety', 'quantity_quintals', 
-                    'expected_price_per_quintal', 'status', 'created_at']
+                    'expected_price_per_quintal', 'bids_count', 'status', 'created_at']
     list_filter = ['status', 'state', 'district', 'crop_variety']
     search_fields = ['farmer__username', 'location_description']
     list_select_related = ['farmer', 'crop_variety']
@@ -20,6 +20,39 @@ class BidAdmin(admin.ModelAdmin):
     list_select_related = ['buyer', 'listing']
 
 
+@admin.register(BidRevision)
+class BidRevisionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'bid', 'amount_per_quintal', 'created_at']
+    search_fields = ['bid__id']
+    raw_id_fields = ['bid']
+
+
+@admin.register(BuyOrder)
+class BuyOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'buyer', 'crop_variety', 'quantity_quintals', 'remaining_quintals',
+                    'max_price_per_quintal', 'status', 'created_at']
+    list_filter = ['status', 'crop_variety']
+    search_fields = ['buyer__username']
+    list_select_related = ['buyer', 'crop_variety']
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'buyer', 'crop_variety', 'state', 'district',
+                    'max_price_per_quintal', 'is_active', 'created_at']
+    list_filter = ['is_active', 'state', 'crop_variety']
+    search_fields = ['name', 'buyer__username']
+    list_select_related = ['buyer', 'crop_variety']
+
+
+@admin.register(SavedSearchMatch)
+class SavedSearchMatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'saved_search', 'buyer', 'listing', 'seen_at', 'created_at']
+    search_fields = ['buyer__username']
+    list_select_related = ['saved_search__buyer', 'buyer', 'listing']
+    raw_id_fields = ['saved_search', 'listing']
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'listing', 'buyer', 'farmer', 'final_amount', 
@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class MarketConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'market'
+    
+    def ready(self):
+        # Run by `manage.py run_scheduler`, never from web workers
+        from django.conf import settings
+        from core.scheduler import register
+        from .auctions import close_due_auctions
+        from .expiry import expire_listings
+        from .recommendations import process_queue
+        register(
+            'listing-expiry', 'LISTING_EXPIRY_SWEEP_SECONDS',
+            lambda: expire_listings(batch_size=settings.LISTING_EXPIRY_BATCH_SIZE),
+        )
+        register(
+            'auction-close', 'AUCTION_CLOSE_SECONDS',
+            lambda: close_due_auctions(batch_size=settings.AUCTION_CLOSE_BATCH_SIZE),
+        )
+        register(
+            'recommendations', 'RECOMMENDATIONS_PROCESS_SECONDS',
+            lambda: process_queue(batch_size=settings.RECOMMENDATIONS_BATCH_SIZE),
+        )
@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.utils import timezone
+from . import recommendations
+from .models import CropListing, Bid
+from .services import complete_sale
+
+
+def pick_winners(listings):
+    """
+    Return {listing_id: winning bid} for the given auction listings, using
+    ``Bid.Meta.ordering`` to rank bids and skipping those below the reserve.
+    """
+    winners = {}
+    bids = (
+        Bid.objects.filter(listing__in=listings, status=Bid.Status.PENDING)
+        .order_by('listing_id', *Bid._meta.ordering)
+    )
+    for bid in bids:
+        winners.setdefault(bid.listing_id, bid)
+    for listing in listings:
+        bid = winners.get(listing.pk)
+        reserve = listing.reserve_price_per_quintal
+        if bid is not None and reserve is not None and bid.amount_per_quintal < reserve:
+            del winners[listing.pk]
+    return winners
+
+
+def close_due_auctions(batch_size=200, now=None):
+    """
+    Close ACTIVE auction listings whose ``expires_at`` has passed.
+
+    Each batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+    workers can run this side by side on different rows, and every listing
+    is moved out of ACTIVE with a conditional UPDATE as a second guard. The
+    top bid at or above the reserve wins and goes through the same sale path
+    as a manual accept; auctions without one become EXPIRED.
+
+    Returns ``(sold, expired)`` counts.
+    """
+    now = now or timezone.now()
+    sold = expired = 0
+    while True:
+        with transaction.atomic():
+            listings = list(
+                CropListing.objects.select_for_update(skip_locked=True)
+                .filter(status=CropListing.Status.ACTIVE, is_auction=True, expires_at__lte=now)
+                .order_by('expires_at')[:batch_size]
+            )
+            if not listings:
+                return sold, expired
+
+            winners = pick_winners(listings)
+            buyer_ids = set()
+            for listing in listings:
+                bid = winners.get(listing.pk)
+                new_status = CropListing.Status.SOLD if bid else CropListing.Status.EXPIRED
+                claimed = CropListing.objects.filter(
+                    pk=listing.pk, status=CropListing.Status.ACTIVE
+                ).update(status=new_status, updated_at=now)
+                if not claimed:
+                    continue
+                if bid:
+                    complete_sale(listing, bid, now)
+                    buyer_ids.add(bid.buyer_id)
+                    sold += 1
+                else:
+                    Bid.objects.filter(listing=listing).update(
+                        status=Bid.Status.REJECTED, updated_at=now
+                    )
+                    expired += 1
+            recommendations.queue_buyers(buyer_ids)
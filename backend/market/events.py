@@ -0,0 +1,96 @@
+"""
+Live market events pushed to farmers and buyers over /ws/bids/ and
+/api/stream/bids/ (see market.streams).
+
+Events are published after the surrounding transaction commits to topics:
+``farmer:<id>`` (all bids on a farmer's listings), ``listing:<id>`` (one
+listing's bids, for its owner) and ``buyer:<id>`` (a buyer's own bids).
+Buyers following someone else's listing get ``market:<id>`` instead, which
+only carries the public summary (bid count and top price), never the
+competing bids themselves. Likewise only the owner and the winner see the
+winning bid of a sold listing; the other bidders are told that it sold and
+whether their own bid lost.
+"""
+from django.apps import apps
+from django.db import transaction
+
+from core.pubsub import get_broker
+
+BID_CREATED = 'bid.created'
+BID_UPDATED = 'bid.updated'
+LISTING_SOLD = 'listing.sold'
+
+
+def bid_payload(bid):
+    return {
+        'id': bid.pk,
+        'listing': bid.listing_id,
+        'buyer': bid.buyer_id,
+        'amount_per_quintal': f'{bid.amount_per_quintal:.2f}',
+        'total_amount': f'{bid.total_amount:.2f}',
+        'status': bid.status,
+        'updated_at': bid.updated_at.isoformat() if bid.updated_at else None,
+    }
+
+
+def listing_summaries(listing_ids):
+    """Return the public ``market:<id>`` payload per listing, read from the bid-stat columns"""
+    CropListing = apps.get_model('market', 'CropListing')
+    rows = CropListing.objects.filter(pk__in=listing_ids).values_list(
+        'pk', 'bids_count', 'highest_bid_amount'
+    )
+    return {
+        pk: {
+            'bids_count': count,
+            'highest_bid_amount': f'{highest:.2f}' if highest is not None else None,
+        }
+        for pk, count, highest in rows
+    }
+
+
+def publish(event, farmer_id, listing_id, buyer_ids=(), summary=None, **data):
+    message = {'type': event, 'listing': listing_id, **data}
+    topics = [f'farmer:{farmer_id}', f'listing:{listing_id}']
+    topics.extend(f'buyer:{buyer_id}' for buyer_id in buyer_ids)
+    public = {'type': event, 'listing': listing_id, **(summary or {})}
+
+    def send():
+        broker = get_broker()
+        for topic in topics:
+            broker.publish(topic, message)
+        broker.publish(f'market:{listing_id}', public)
+
+    transaction.on_commit(send)
+
+
+def bid_saved(bid, created, summary=None):
+    if summary is None:
+        summary = listing_summaries([bid.listing_id]).get(bid.listing_id)
+    publish(
+        BID_CREATED if created else BID_UPDATED,
+        bid.listing.farmer_id, bid.listing_id, [bid.buyer_id],
+        summary=summary, bid=bid_payload(bid),
+    )
+
+
+def listing_sold(listing, winning_bid, bidders=()):
+    """``bidders`` holds ``(buyer_id, bid status)`` for every bid on the listing"""
+    Bid = apps.get_model('market', 'Bid')
+    publish(
+        LISTING_SOLD, listing.farmer_id, listing.pk, [winning_bid.buyer_id],
+        summary={'status': listing.status}, bid=bid_payload(winning_bid),
+    )
+    others = {
+        buyer_id: {
+            'type': LISTING_SOLD, 'listing': listing.pk, 'status': listing.status,
+            'bid_lost': bid_status != Bid.Status.ACCEPTED,
+        }
+        for buyer_id, bid_status in bidders if buyer_id != winning_bid.buyer_id
+    }
+
+    def send():
+        broker = get_broker()
+        for buyer_id, message in others.items():
+            broker.publish(f'buyer:{buyer_id}', message)
+
+    transaction.on_commit(send)
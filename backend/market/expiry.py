@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.utils import timezone
+from .models import CropListing
+
+
+def expire_listings(batch_size=500, now=None):
+    """
+    Move ACTIVE fixed-price listings past ``expires_at`` to EXPIRED in chunks of
+    ``batch_size``. Each chunk is its own short transaction and the UPDATE
+    re-checks the status, so concurrent sweepers never double-count.
+    Auctions are left to ``market.auctions.close_due_auctions``.
+    Returns the number of listings expired.
+    """
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                CropListing.objects.filter(
+                    status=CropListing.Status.ACTIVE, is_auction=False, expires_at__lt=now
+                )
+                .order_by('expires_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return expired
+            expired += CropListing.objects.filter(
+                pk__in=ids, status=CropListing.Status.ACTIVE
+            ).update(status=CropListing.Status.EXPIRED, updated_at=now)
@@ -0,0 +1,81 @@
+import math
+
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+from rest_framework.settings import api_settings
+from core import geo
+from . import search
+
+
+class ListingSearchFilter(SearchFilter):
+    """
+    ``?search=`` backed by the listing full-text index, ranked by relevance.
+
+    Falls back to the default icontains search on databases without an index.
+    Must run after OrderingFilter so relevance wins unless the client asked
+    for an explicit ``?ordering=``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        if not search.is_available():
+            return super().filter_queryset(request, queryset, view)
+
+        queryset = search.search_listings(queryset, terms)
+        if api_settings.ORDERING_PARAM not in request.query_params:
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
+
+
+class ListingProximityFilter(BaseFilterBackend):
+    """
+    ``?near=<pincode>&radius_km=`` restricts listings to a radius around a
+    pincode centroid and orders them by distance. ``near=me`` uses the
+    buyer's own ``BuyerProfile.pincode``.
+
+    The grid-cell index narrows candidates to the cells overlapping the
+    circle; the distance is only computed for those rows.
+    """
+    near_param = 'near'
+    radius_param = 'radius_km'
+    default_radius_km = 50
+    max_radius_km = 500
+
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get(self.near_param, '').strip()
+        if not near:
+            return queryset
+
+        if near == 'me':
+            profile = getattr(request.user, 'buyer_profile', None)
+            near = profile.pincode if profile else ''
+        origin = geo.locate_pincode(near)
+        if origin is None:
+            raise ValidationError({self.near_param: f'Unknown pincode "{near}"'})
+
+        try:
+            radius_km = float(request.query_params.get(self.radius_param, self.default_radius_km))
+        except ValueError:
+            raise ValidationError({self.radius_param: 'Must be a number'})
+        if not math.isfinite(radius_km):
+            raise ValidationError({self.radius_param: 'Must be a finite number'})
+        radius_km = min(max(radius_km, 0), self.max_radius_km)
+
+        lat0, lon0 = origin
+        (row_min, row_max), (col_min, col_max) = geo.grid_window(lat0, lon0, radius_km)
+        dy = (F('latitude') - Value(lat0)) * Value(geo.KM_PER_DEGREE_LAT)
+        dx = (F('longitude') - Value(lon0)) * Value(geo.km_per_degree_lon(lat0))
+        queryset = queryset.filter(
+            grid_row__range=(row_min, row_max),
+            grid_col__range=(col_min, col_max),
+        ).annotate(
+            distance_km=Sqrt(ExpressionWrapper(dx * dx + dy * dy, output_field=FloatField()))
+        ).filter(distance_km__lte=radius_km)
+
+        if api_settings.ORDERING_PARAM not in request.query_params:
+            queryset = queryset.order_by('distance_km', *queryset.query.order_by)
+        return queryset
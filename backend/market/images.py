@@ -0,0 +1,182 @@
+"""
+Listing photo pipeline.
+
+Uploads are checked and re-encoded before they are saved: the size limit is
+enforced, EXIF orientation is applied and all metadata (GPS, camera) is
+dropped, and oversized photos are scaled down. Django spools large uploads to
+a temporary file, so nothing here holds the raw upload in memory.
+
+Smaller WebP variants for feed cards and detail views are generated after
+the listing is committed, on a small worker pool (``IMAGE_WORKERS``; 0 runs
+them inline), and recorded in ``CropListing.image_variants``.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = ('image1', 'image2', 'image3')
+
+# Variant name -> longest side in pixels
+VARIANTS = {'thumb': 320, 'medium': 960}
+VARIANT_QUALITY = 75
+ORIGINAL_QUALITY = 85
+
+
+class ImageRejected(Exception):
+    pass
+
+
+def clean_upload(upload):
+    """
+    Validate an uploaded photo and return a sanitized JPEG ``ContentFile``:
+    EXIF stripped, orientation applied, longest side capped at
+    ``LISTING_IMAGE_MAX_DIMENSION``. Photos over ``LISTING_IMAGE_MAX_PIXELS``
+    are rejected from their header, before any pixels are decoded.
+    """
+    if upload.size > settings.LISTING_IMAGE_MAX_BYTES:
+        limit_mb = settings.LISTING_IMAGE_MAX_BYTES / (1024 * 1024)
+        raise ImageRejected(f'Image is larger than {limit_mb:.0f} MB')
+    max_dimension = settings.LISTING_IMAGE_MAX_DIMENSION
+    try:
+        # Only the header is read here; the pixel check runs before decoding
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > settings.LISTING_IMAGE_MAX_PIXELS:
+            raise ImageRejected(f'Image is larger than {settings.LISTING_IMAGE_MAX_PIXELS // 1_000_000} megapixels')
+        if image.format == 'JPEG':
+            # Let libjpeg decode at 1/2 to 1/8 scale when that still covers the stored size
+            image.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+    except Image.DecompressionBombError:
+        raise ImageRejected('Image dimensions are too large')
+    except (UnidentifiedImageError, OSError):
+        raise ImageRejected('Upload a valid image')
+
+    image.thumbnail((max_dimension,) * 2)
+    buffer = BytesIO()
+    # Re-encoding without passing exif= drops all metadata
+    image.save(buffer, 'JPEG', quality=ORIGINAL_QUALITY, optimize=True)
+    name = os.path.splitext(os.path.basename(upload.name))[0] or 'photo'
+    return ContentFile(buffer.getvalue(), name=f'{name}.jpg')
+
+
+def variant_path(listing_id, field, variant):
+    return f'listings/variants/{listing_id}/{field}-{variant}.webp'
+
+
+def stale_fields(listing):
+    """Image fields whose variants are missing or were made from another file"""
+    variants = listing.image_variants or {}
+    return [
+        field for field in IMAGE_FIELDS
+        if getattr(listing, field) and variants.get(field, {}).get('source') != getattr(listing, field).name
+    ]
+
+
+def render_variant(source, size):
+    image = source if source.mode in ('RGB', 'RGBA') else source.convert('RGB')
+    image = image.copy()
+    image.thumbnail((size, size))
+    buffer = BytesIO()
+    image.save(buffer, 'WEBP', quality=VARIANT_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def generate_variants(listing_id):
+    """Render missing WebP variants for a listing and record them"""
+    CropListing = apps.get_model('market', 'CropListing')
+    listing = CropListing.objects.filter(pk=listing_id).only(*IMAGE_FIELDS, 'image_variants').first()
+    if listing is None:
+        return
+    fields = stale_fields(listing)
+    if not fields:
+        return
+
+    variants = {
+        field: data for field, data in (listing.image_variants or {}).items()
+        if getattr(listing, field, None)
+    }
+    for field in fields:
+        file = getattr(listing, field)
+        with file.open('rb') as handle:
+            source = Image.open(handle)
+            source.load()
+        entry = {'source': file.name}
+        for variant, size in VARIANTS.items():
+            path = variant_path(listing_id, field, variant)
+            # The storage names files by content; keep whatever name it returns
+            entry[variant] = default_storage.save(path, ContentFile(render_variant(source, size)))
+        variants[field] = entry
+
+    CropListing.objects.filter(pk=listing_id).update(image_variants=variants, updated_at=timezone.now())
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='image-variants'
+                )
+    return _executor
+
+
+def _run(listing_id):
+    try:
+        generate_variants(listing_id)
+    except Exception:
+        logger.exception('Generating image variants for listing %s failed', listing_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(listing_id):
+    """Queue variant generation once the current transaction commits"""
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(_run, listing_id))
+    else:
+        transaction.on_commit(lambda: generate_variants(listing_id))
+
+
+def image_urls(listing, request=None):
+    """
+    ``{'image1': {'original': url, 'thumb': url, 'medium': url, 'srcset': ...}, ...}``
+    for the listing's photos; variants are omitted until they have been rendered.
+    """
+    def absolute(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    variants = listing.image_variants or {}
+    urls = {}
+    for field in IMAGE_FIELDS:
+        file = getattr(listing, field)
+        if not file:
+            continue
+        entry = {'original': absolute(file.url)}
+        rendered = variants.get(field, {})
+        if rendered.get('source') == file.name:
+            srcset = []
+            for variant, size in VARIANTS.items():
+                entry[variant] = absolute(default_storage.url(rendered[variant]))
+                srcset.append(f'{entry[variant]} {size}w')
+            entry['srcset'] = ', '.join(srcset)
+        urls[field] = entry
+    return urls
@@ -0,0 +1,55 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from market.matching import OrderBook, RestingBuy, RestingListing
+
+DISTRICTS = ['Karnal', 'Kurukshetra', 'Ambala', 'Ludhiana', 'Amritsar', 'Patiala']
+
+
+class Command(BaseCommand):
+    help = 'Measure in-memory order book throughput (matches per second)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buy-orders', type=int, default=50000)
+        parser.add_argument('--listings', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        expires_at = now + timedelta(days=3)
+        book = OrderBook()
+
+        for pk in range(1, options['buy_orders'] + 1):
+            book.add_buy(RestingBuy(
+                pk, buyer_id=pk, price=Decimal(rng.randint(2000, 2600)),
+                created_at=now + timedelta(microseconds=pk),
+                remaining=Decimal(rng.randint(10, 200)),
+                districts=rng.sample(DISTRICTS, rng.randint(0, 3)),
+            ))
+
+        listings = [
+            RestingListing(
+                pk, farmer_id=pk, price=Decimal(rng.randint(1900, 2500)),
+                created_at=now + timedelta(microseconds=pk),
+                remaining=Decimal(rng.randint(20, 300)), expires_at=expires_at,
+                district=rng.choice(DISTRICTS), moisture=Decimal('13.5'),
+            )
+            for pk in range(1, options['listings'] + 1)
+        ]
+
+        fills = 0
+        started = time.perf_counter()
+        for listing in listings:
+            fills += len(book.match_sell(listing, now))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(listings)} listings against {options["buy_orders"]} buy orders: '
+            f'{fills} fills in {elapsed:.2f}s ({fills / elapsed:,.0f} matches/s, '
+            f'{len(listings) / elapsed:,.0f} listings/s)'
+        ))
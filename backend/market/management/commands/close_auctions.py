@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from market.auctions import close_due_auctions
+
+
+class Command(BaseCommand):
+    help = 'Close auction listings past their expiry and pick the winning bids'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.AUCTION_CLOSE_BATCH_SIZE)
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running, closing due auctions every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sold, expired = close_due_auctions(batch_size=options['batch_size'])
+            self.stdout.write(f'Closed {sold + expired} auctions ({sold} sold, {expired} unsold)')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
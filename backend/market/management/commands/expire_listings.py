@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from market.expiry import expire_listings
+
+
+class Command(BaseCommand):
+    help = 'Mark active listings past their expiry as EXPIRED'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.LISTING_EXPIRY_BATCH_SIZE)
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running, sweeping every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_listings(batch_size=options['batch_size'])
+            self.stdout.write(f'Expired {expired} listings')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from market.models import CropListing
+
+
+class Command(BaseCommand):
+    help = 'Resolve listing coordinates and grid cells from the pincode centroid table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Re-resolve every listing, not only those without coordinates'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        listings = CropListing.objects.order_by('pk')
+        if not options['all']:
+            listings = listings.filter(latitude__isnull=True)
+
+        fields = ['latitude', 'longitude', 'grid_row', 'grid_col']
+        located = 0
+        batch = []
+        for listing in listings.only('pk', 'pincode', 'district', 'state').iterator(chunk_size=batch_size):
+            listing.locate()
+            located += listing.latitude is not None
+            batch.append(listing)
+            if len(batch) >= batch_size:
+                CropListing.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            CropListing.objects.bulk_update(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'Located {located} listings'))
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from market.recommendations import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Apply queued recommendation work (new listings, buyers with new orders)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.RECOMMENDATIONS_BATCH_SIZE)
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running, draining the queue every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done = process_queue(batch_size=options['batch_size'])
+            self.stdout.write(f'Processed {done} recommendation tasks')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
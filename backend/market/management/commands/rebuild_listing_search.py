@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from market import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for crop listings'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('This database has no listing search index'))
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Listing search index rebuilt'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from market.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the top listing recommendations for every buyer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Buyers scored per pass over the listings')
+
+    def handle(self, *args, **options):
+        buyers = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt recommendations for {buyers} buyers'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+from market.models import CropListing
+
+
+class Command(BaseCommand):
+    help = 'Verify the denormalized bid columns on listings and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drifted listings, do not repair them'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        listings = CropListing.objects.order_by('pk').annotate(
+            actual_count=Count('bids'),
+            actual_highest=Max('bids__amount_per_quintal'),
+            actual_last=Max('bids__created_at'),
+        ).values_list(
+            'pk', 'bids_count', 'highest_bid_amount', 'last_bid_at',
+            'actual_count', 'actual_highest', 'actual_last',
+        )
+
+        drifted = []
+        for pk, count, highest, last, actual_count, actual_highest, actual_last in listings.iterator(chunk_size=batch_size):
+            if (count, highest, last) != (actual_count, actual_highest, actual_last):
+                drifted.append(pk)
+                self.stdout.write(
+                    f'Listing #{pk}: stored ({count}, {highest}, {last}) '
+                    f'!= actual ({actual_count}, {actual_highest}, {actual_last})'
+                )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All listing bid stats are in sync'))
+            return
+
+        if options['check']:
+            self.stdout.write(self.style.WARNING(f'{len(drifted)} listings have drifted'))
+            return
+
+        for start in range(0, len(drifted), batch_size):
+            CropListing.objects.filter(
+                pk__in=drifted[start:start + batch_size]
+            ).refresh_bid_stats()
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drifted)} listings'))
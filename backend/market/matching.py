@@ -0,0 +1,461 @@
+"""
+Continuous double-auction matching between standing buy orders and
+``auto_match`` listings.
+
+Each worker keeps one in-memory order book per crop variety: a max-heap of
+open buy orders keyed by (price, time) and a min-heap of resting listings
+keyed by (expected price, time). An incoming listing is matched against the
+best buy orders that accept it (district and grade limits), an incoming buy
+order against the cheapest listings it accepts. Fills trade at the resting
+side's price and may be partial, so one listing can produce several orders
+and one buy order can be filled from several listings.
+
+The database stays the source of truth. Books are per process, so before
+each match the variety's book catches up with the buy orders and listings
+changed since it last looked (every write to either bumps ``updated_at``);
+a listing or buy order posted through another worker is therefore matched
+by the next submit on this one. Fills are written in one transaction with
+conditional UPDATEs that re-check the remaining quantities, prices and
+variety; if another worker (or an edit to the listing or order) got there
+first the write is rolled back, the variety's book is reloaded from the
+database and the match is retried.
+"""
+import heapq
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from itertools import count
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import events, recommendations
+from .models import BuyOrder, CropListing, Bid
+from .services import create_orders
+
+logger = logging.getLogger(__name__)
+
+# How far back a book re-reads on catch-up, so rows committed a little after
+# the ``updated_at`` they were stamped with are not missed
+SYNC_OVERLAP = timedelta(seconds=30)
+
+Fill = namedtuple('Fill', ['buy', 'sell', 'quantity', 'price'])
+
+
+class StaleBook(Exception):
+    """The in-memory book disagreed with the database"""
+
+
+class RestingBuy:
+    __slots__ = (
+        'pk', 'buyer_id', 'price', 'created_at', 'remaining',
+        'districts', 'max_moisture', 'max_foreign_matter', 'dead',
+    )
+
+    def __init__(self, pk, buyer_id, price, created_at, remaining,
+                 districts=(), max_moisture=None, max_foreign_matter=None):
+        self.pk = pk
+        self.buyer_id = buyer_id
+        self.price = price
+        self.created_at = created_at
+        self.remaining = remaining
+        self.districts = frozenset(districts)
+        self.max_moisture = max_moisture
+        self.max_foreign_matter = max_foreign_matter
+        self.dead = False
+
+    @classmethod
+    def from_order(cls, order):
+        return cls(
+            order.pk, order.buyer_id, order.max_price_per_quintal, order.created_at,
+            order.remaining_quintals, order.districts,
+            order.max_moisture_content, order.max_foreign_matter,
+        )
+
+    def accepts(self, sell):
+        if self.districts and sell.district not in self.districts:
+            return False
+        if self.max_moisture is not None and (sell.moisture is None or sell.moisture > self.max_moisture):
+            return False
+        if self.max_foreign_matter is not None and (
+            sell.foreign_matter is None or sell.foreign_matter > self.max_foreign_matter
+        ):
+            return False
+        return self.buyer_id not in sell.buyer_ids
+
+
+class RestingListing:
+    __slots__ = (
+        'pk', 'farmer_id', 'price', 'created_at', 'remaining', 'expires_at',
+        'district', 'moisture', 'foreign_matter', 'buyer_ids', 'dead',
+    )
+
+    def __init__(self, pk, farmer_id, price, created_at, remaining, expires_at,
+                 district='', moisture=None, foreign_matter=None, buyer_ids=()):
+        self.pk = pk
+        self.farmer_id = farmer_id
+        self.price = price
+        self.created_at = created_at
+        self.remaining = remaining
+        self.expires_at = expires_at
+        self.district = district
+        self.moisture = moisture
+        self.foreign_matter = foreign_matter
+        # Buyers already holding a fill on this listing (one bid per buyer per listing)
+        self.buyer_ids = set(buyer_ids)
+        self.dead = False
+
+    @classmethod
+    def from_listing(cls, listing, buyer_ids=()):
+        return cls(
+            listing.pk, listing.farmer_id, listing.expected_price_per_quintal,
+            listing.created_at, listing.quantity_quintals - listing.matched_quintals,
+            listing.expires_at, listing.district,
+            listing.moisture_content, listing.foreign_matter, buyer_ids,
+        )
+
+
+def accepted_buyers(listings):
+    """Buyers already holding a fill (an accepted bid) on each of ``listings``"""
+    buyer_ids = defaultdict(set)
+    for listing_id, buyer_id in Bid.objects.filter(
+        listing__in=listings, status=Bid.Status.ACCEPTED
+    ).values_list('listing_id', 'buyer_id'):
+        buyer_ids[listing_id].add(buyer_id)
+    return buyer_ids
+
+
+def rests(listing, now):
+    """Whether ``listing`` belongs in the book (the row-level twin of ``load_book``'s filter)"""
+    return (
+        listing.status == CropListing.Status.ACTIVE and listing.auto_match and not listing.is_auction
+        and listing.expires_at > now and listing.matched_quintals < listing.quantity_quintals
+    )
+
+
+class OrderBook:
+    """Resting buy orders and listings for one crop variety"""
+
+    def __init__(self, synced_at=None):
+        # Rows changed after this have not been read into the book yet
+        self.synced_at = synced_at
+        self.buys = []
+        self.sells = []
+        self.buys_by_pk = {}
+        self.sells_by_pk = {}
+        # Tie-breaker so a re-added entry never compares against its stale copy
+        self._sequence = count()
+
+    def add_buy(self, buy):
+        self.discard_buy(buy.pk)
+        self.buys_by_pk[buy.pk] = buy
+        heapq.heappush(self.buys, (-buy.price, buy.created_at, next(self._sequence), buy))
+
+    def add_sell(self, sell):
+        self.discard_sell(sell.pk)
+        self.sells_by_pk[sell.pk] = sell
+        heapq.heappush(self.sells, (sell.price, sell.created_at, next(self._sequence), sell))
+
+    def discard_buy(self, pk):
+        buy = self.buys_by_pk.pop(pk, None)
+        if buy is not None:
+            buy.dead = True
+
+    def discard_sell(self, pk):
+        sell = self.sells_by_pk.pop(pk, None)
+        if sell is not None:
+            sell.dead = True
+
+    def match_sell(self, sell, now):
+        """Fill an incoming listing from the best buy orders; rest any remainder"""
+        self.discard_sell(sell.pk)
+        fills, skipped = [], []
+        while sell.remaining > 0 and self.buys:
+            entry = self.buys[0]
+            buy = entry[-1]
+            if buy.dead or buy.remaining <= 0:
+                heapq.heappop(self.buys)
+                continue
+            if buy.price < sell.price:
+                break
+            heapq.heappop(self.buys)
+            if not buy.accepts(sell):
+                skipped.append(entry)
+                continue
+            fills.append(self._fill(buy, sell, buy.price))
+            if buy.remaining > 0:
+                skipped.append(entry)
+            else:
+                self.buys_by_pk.pop(buy.pk, None)
+        for entry in skipped:
+            heapq.heappush(self.buys, entry)
+        if sell.remaining > 0 and sell.expires_at > now:
+            self.add_sell(sell)
+        return fills
+
+    def match_buy(self, buy, now):
+        """Fill an incoming buy order from the cheapest acceptable listings"""
+        self.discard_buy(buy.pk)
+        fills, skipped = [], []
+        while buy.remaining > 0 and self.sells:
+            entry = self.sells[0]
+            sell = entry[-1]
+            if sell.dead or sell.remaining <= 0 or sell.expires_at <= now:
+                heapq.heappop(self.sells)
+                if not sell.dead:
+                    self.sells_by_pk.pop(sell.pk, None)
+                continue
+            if sell.price > buy.price:
+                break
+            heapq.heappop(self.sells)
+            if not buy.accepts(sell):
+                skipped.append(entry)
+                continue
+            fills.append(self._fill(buy, sell, sell.price))
+            if sell.remaining > 0:
+                skipped.append(entry)
+            else:
+                self.sells_by_pk.pop(sell.pk, None)
+        for entry in skipped:
+            heapq.heappush(self.sells, entry)
+        if buy.remaining > 0:
+            self.add_buy(buy)
+        return fills
+
+    @staticmethod
+    def _fill(buy, sell, price):
+        quantity = min(buy.remaining, sell.remaining)
+        buy.remaining -= quantity
+        sell.remaining -= quantity
+        sell.buyer_ids.add(buy.buyer_id)
+        return Fill(buy, sell, quantity, price)
+
+
+class MatchingEngine:
+    """Per-process set of order books, loaded lazily from the database"""
+
+    def __init__(self):
+        self.books = {}
+        self._lock = threading.Lock()
+
+    def load_book(self, variety_id, now):
+        book = OrderBook(synced_at=timezone.now())
+        for order in BuyOrder.objects.filter(crop_variety_id=variety_id, status=BuyOrder.Status.OPEN):
+            book.add_buy(RestingBuy.from_order(order))
+        listings = list(
+            CropListing.objects.filter(
+                crop_variety_id=variety_id, status=CropListing.Status.ACTIVE,
+                auto_match=True, is_auction=False, expires_at__gt=now,
+            ).filter(matched_quintals__lt=F('quantity_quintals'))
+        )
+        buyer_ids = accepted_buyers(listings)
+        for listing in listings:
+            book.add_sell(RestingListing.from_listing(listing, buyer_ids[listing.pk]))
+        return book
+
+    def catch_up(self, book, variety_id, now):
+        """Re-read the buy orders and listings of the variety changed since the book last synced"""
+        since = book.synced_at - SYNC_OVERLAP
+        synced_at = timezone.now()
+        for order in BuyOrder.objects.filter(crop_variety_id=variety_id, updated_at__gte=since):
+            if order.status == BuyOrder.Status.OPEN and order.remaining_quintals > 0:
+                book.add_buy(RestingBuy.from_order(order))
+            else:
+                book.discard_buy(order.pk)
+        listings = list(CropListing.objects.filter(crop_variety_id=variety_id, updated_at__gte=since))
+        buyer_ids = accepted_buyers(listings) if listings else {}
+        for listing in listings:
+            if rests(listing, now):
+                book.add_sell(RestingListing.from_listing(listing, buyer_ids[listing.pk]))
+            else:
+                book.discard_sell(listing.pk)
+        book.synced_at = synced_at
+
+    def book(self, variety_id, now):
+        book = self.books.get(variety_id)
+        if book is None:
+            book = self.books[variety_id] = self.load_book(variety_id, now)
+        else:
+            self.catch_up(book, variety_id, now)
+        return book
+
+    def reset(self, variety_id=None):
+        with self._lock:
+            if variety_id is None:
+                self.books.clear()
+            else:
+                self.books.pop(variety_id, None)
+
+    def submit_listing(self, listing, now=None):
+        """Match and persist a new or updated ``auto_match`` listing; returns the orders created"""
+        if not listing.auto_match or listing.is_auction:
+            return []
+        buyer_ids = accepted_buyers([listing])[listing.pk]
+        orders = self._submit(
+            listing.crop_variety_id, now,
+            lambda book, now: book.match_sell(RestingListing.from_listing(listing, buyer_ids), now),
+        )
+        if orders:
+            listing.refresh_from_db()
+        return orders
+
+    def submit_buy_order(self, buy_order, now=None):
+        """Match and persist a new buy order; returns the orders created"""
+        orders = self._submit(
+            buy_order.crop_variety_id, now,
+            lambda book, now: book.match_buy(RestingBuy.from_order(buy_order), now),
+        )
+        if orders:
+            buy_order.refresh_from_db()
+        return orders
+
+    def cancel_buy_order(self, buy_order):
+        with self._lock:
+            book = self.books.get(buy_order.crop_variety_id)
+            if book is not None:
+                book.discard_buy(buy_order.pk)
+
+    def cancel_listing(self, listing):
+        with self._lock:
+            book = self.books.get(listing.crop_variety_id)
+            if book is not None:
+                book.discard_sell(listing.pk)
+
+    def update_listing(self, listing, previous_variety_id):
+        """Replace an edited listing's book entry (price, quantity or variety may have changed)"""
+        with self._lock:
+            book = self.books.get(previous_variety_id)
+            if book is not None:
+                book.discard_sell(listing.pk)
+        if listing.status == CropListing.Status.ACTIVE:
+            return self.submit_listing(listing)
+        return []
+
+    def _submit(self, variety_id, now, match, attempts=2):
+        now = now or timezone.now()
+        for attempt in range(attempts):
+            with self._lock:
+                fills = match(self.book(variety_id, now), now)
+            if not fills:
+                return []
+            try:
+                return persist_fills(fills, variety_id, now)
+            except StaleBook:
+                logger.info('Order book for variety %s is stale, reloading', variety_id)
+                self.reset(variety_id)
+            except Exception:
+                # The fills were applied to the book but not saved
+                self.reset(variety_id)
+                raise
+        return []
+
+
+def persist_fills(fills, variety_id, now):
+    """
+    Write fills as accepted bids, orders and shipments in one transaction.
+    Every quantity change is a conditional UPDATE that also re-checks the
+    prices and variety the book matched on, and no buyer may be filled twice
+    on one listing; if any check misses, the whole set is rolled back and
+    ``StaleBook`` is raised.
+    """
+    quantities = defaultdict(Decimal)
+    # Lowest price each listing was filled at; the listing's ask may not exceed it
+    floor_prices = {}
+    for fill in fills:
+        quantities[fill.sell.pk] += fill.quantity
+        floor_prices[fill.sell.pk] = min(fill.price, floor_prices.get(fill.sell.pk, fill.price))
+
+    with transaction.atomic():
+        for fill in fills:
+            claimed = BuyOrder.objects.filter(
+                pk=fill.buy.pk, status=BuyOrder.Status.OPEN, crop_variety_id=variety_id,
+                remaining_quintals__gte=fill.quantity, max_price_per_quintal__gte=fill.price,
+            ).update(
+                remaining_quintals=F('remaining_quintals') - fill.quantity,
+                status=Case(
+                    When(remaining_quintals=fill.quantity, then=Value(BuyOrder.Status.FILLED)),
+                    default=Value(BuyOrder.Status.OPEN),
+                ),
+                updated_at=now,
+            )
+            if not claimed:
+                raise StaleBook(f'buy order {fill.buy.pk}')
+
+        # The bid upsert below must only ever turn a PENDING bid into a fill
+        filled = {(fill.sell.pk, fill.buy.buyer_id) for fill in fills}
+        already_filled = filled & set(
+            Bid.objects.filter(
+                listing_id__in=quantities, buyer_id__in={buyer_id for _, buyer_id in filled},
+                status=Bid.Status.ACCEPTED,
+            ).values_list('listing_id', 'buyer_id')
+        )
+        if already_filled:
+            raise StaleBook(f'listing {min(already_filled)[0]} already filled for buyer')
+
+        for listing_id, quantity in quantities.items():
+            claimed = CropListing.objects.filter(
+                pk=listing_id, status=CropListing.Status.ACTIVE, auto_match=True,
+                crop_variety_id=variety_id,
+                expected_price_per_quintal__lte=floor_prices[listing_id],
+                matched_quintals__lte=F('quantity_quintals') - quantity,
+            ).update(
+                matched_quintals=F('matched_quintals') + quantity,
+                status=Case(
+                    When(
+                        matched_quintals=F('quantity_quintals') - quantity,
+                        then=Value(CropListing.Status.SOLD),
+                    ),
+                    default=Value(CropListing.Status.ACTIVE),
+                ),
+                updated_at=now,
+            )
+            if not claimed:
+                raise StaleBook(f'listing {listing_id}')
+
+        listings = CropListing.objects.in_bulk(quantities)
+        # A buyer's pending bid on the listing becomes the filled bid
+        bids = Bid.objects.bulk_create(
+            [
+                Bid(
+                    listing=listings[fill.sell.pk], buyer_id=fill.buy.buyer_id,
+                    amount_per_quintal=fill.price, quantity_quintals=fill.quantity,
+                    total_amount=fill.price * fill.quantity, status=Bid.Status.ACCEPTED,
+                )
+                for fill in fills
+            ],
+            update_conflicts=True,
+            unique_fields=['listing', 'buyer'],
+            update_fields=['amount_per_quintal', 'quantity_quintals', 'total_amount', 'status', 'updated_at'],
+        )
+        orders = create_orders(bids, now)
+
+        sold = [listing for listing in listings.values() if listing.status == CropListing.Status.SOLD]
+        Bid.objects.filter(listing__in=sold, status=Bid.Status.PENDING).update(
+            status=Bid.Status.REJECTED, updated_at=now
+        )
+        CropListing.objects.filter(pk__in=quantities).refresh_bid_stats()
+        for bid in bids:
+            events.bid_saved(bid, True)
+        for listing in sold:
+            events.listing_sold(
+                listing, next(bid for bid in bids if bid.listing_id == listing.pk),
+                Bid.objects.filter(listing=listing).values_list('buyer_id', 'status')
+            )
+        recommendations.queue_buyers(bid.buyer_id for bid in bids)
+    return orders
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MatchingEngine()
+    return _engine
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:54
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_bid_stats(apps, schema_editor):
+    CropListing = apps.get_model('market', 'CropListing')
+    Bid = apps.get_model('market', 'Bid')
+    bids = Bid.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    CropListing.objects.update(
+        bids_count=Coalesce(Subquery(bids.annotate(c=Count('id')).values('c')), Value(0)),
+        highest_bid_amount=Subquery(bids.annotate(m=Max('amount_per_quintal')).values('m')),
+        last_bid_at=Subquery(bids.annotate(m=Max('created_at')).values('m')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='croplisting',
+            name='bids_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='croplisting',
+            name='highest_bid_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='croplisting',
+            name='last_bid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_bid_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('market', '0002_listing_bid_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['buyer', '-amount_per_quintal', '-created_at'], name='bid_buyer_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['listing', '-amount_per_quintal', '-created_at'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croplisting',
+            index=models.Index(fields=['farmer', '-created_at'], name='listing_farmer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croplisting',
+            index=models.Index(fields=['status', '-created_at'], name='listing_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['buyer', '-created_at'], name='order_buyer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['farmer', '-created_at'], name='order_farmer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# The SQL is frozen here rather than imported from market.search so later
+# changes to the live index code cannot alter what this migration does
+FTS_TABLE = 'market_croplisting_fts'
+
+SQLITE_REBUILD = f"""
+    INSERT INTO {FTS_TABLE} (rowid, variety, location, region)
+    SELECT l.id, v.name, l.location_description, l.district || ' ' || l.state
+    FROM market_croplisting l JOIN core_cropvariety v ON v.id = l.crop_variety_id
+"""
+
+POSTGRES_REBUILD = """
+    UPDATE market_croplisting l SET search_vector = (
+        setweight(to_tsvector('simple', v.name), 'A') ||
+        setweight(to_tsvector('simple', l.district || ' ' || l.state), 'B') ||
+        setweight(to_tsvector('simple', l.location_description), 'C')
+    )
+    FROM core_cropvariety v WHERE v.id = l.crop_variety_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"variety, location, region, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(SQLITE_REBUILD)
+    elif vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE market_croplisting ADD COLUMN search_vector tsvector')
+        schema_editor.execute(POSTGRES_REBUILD)
+        schema_editor.execute(
+            'CREATE INDEX listing_search_vector_idx ON market_croplisting USING GIN (search_vector)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS listing_search_vector_idx')
+        schema_editor.execute('ALTER TABLE market_croplisting DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('market', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
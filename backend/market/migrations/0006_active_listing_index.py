@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_pincode_centroid'),
+        ('market', '0005_listing_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='croplisting',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['expires_at', 'state', 'crop_variety'], name='listing_active_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0007_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BidRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_per_quintal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='market.bid')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_pincode_centroid'),
+        ('market', '0008_bid_revision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='croplisting',
+            name='is_auction',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='croplisting',
+            name='reserve_price_per_quintal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='croplisting',
+            index=models.Index(condition=models.Q(('is_auction', True), ('status', 'ACTIVE')), fields=['expires_at'], name='listing_auction_due_idx'),
+        ),
+    ]
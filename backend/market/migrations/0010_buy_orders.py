@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_pincode_centroid'),
+        ('market', '0009_listing_auction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bid',
+            name='quantity_quintals',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='croplisting',
+            name='auto_match',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='croplisting',
+            name='matched_quintals',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='BuyOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_quintals', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('remaining_quintals', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_price_per_quintal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('districts', models.JSONField(blank=True, default=list)),
+                ('max_moisture_content', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('max_foreign_matter', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('FILLED', 'Filled'), ('CANCELLED', 'Cancelled')], default='OPEN', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buy_orders', to=settings.AUTH_USER_MODEL)),
+                ('crop_variety', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.cropvariety')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['buyer', '-created_at'], name='buy_order_buyer_created_idx'), models.Index(condition=models.Q(('status', 'OPEN')), fields=['crop_variety', '-max_price_per_quintal', 'created_at'], name='buy_order_book_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0012_buyer_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('LISTING', 'Score new listing'), ('BUYER', 'Rescore buyer')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recommendationtask',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='recommendation_task_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0013_recommendation_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='croplisting',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
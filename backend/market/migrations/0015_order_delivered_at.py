@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_delivered_at(apps, schema_editor):
+    # Best available estimate for orders delivered before the column existed
+    Order = apps.get_model('market', 'Order')
+    Order.objects.filter(order_status='DELIVERED').update(delivered_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0014_listing_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('order_status', 'DELIVERED'), ('payment_status__in', ['TOKEN_DEPOSITED', 'FULL_DEPOSITED'])), fields=['delivered_at'], name='order_release_due_idx'),
+        ),
+        migrations.RunPython(backfill_delivered_at, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,27 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+from core import geo
 from core.models import CropVariety
+from . import events, images, search
+
+
+class CropListingQuerySet(models.QuerySet):
+    def refresh_bid_stats(self):
+        """Recompute the denormalized bid columns from the bids table in one UPDATE"""
+        bids = Bid.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+        return self.update(
+            bids_count=Coalesce(
+                Subquery(bids.annotate(c=Count('id')).values('c')), Value(0)
+            ),
+            highest_bid_amount=Subquery(
+                bids.annotate(m=Max('amount_per_quintal')).values('m')
+            ),
+            last_bid_at=Subquery(bids.annotate(m=Max('created_at')).values('m')),
+            updated_at=timezone.now(),
+        )
 
 
 class CropListing(models.Model):
@@ -23,6 +44,13 @@ class CropListing(models.Model):
     location_description = models.CharField(max_length=200)
     district = models.CharField(max_length=50)
     state = models.CharField(max_length=50)
+    pincode = models.CharField(max_length=10, blank=True)
+    
+    # Resolved from pincode (or district) centroid, bucketed into a grid for radius search
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    grid_row = models.IntegerField(null=True, blank=True)
+    grid_col = models.IntegerField(null=True, blank=True)
     
     # Quality (self-declared by farmer)
     moisture_content = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Moisture %")
@@ -32,15 +60,79 @@ class CropListing(models.Model):
     image1 = models.ImageField(upload_to='listings/', null=True, blank=True)
     image2 = models.ImageField(upload_to='listings/', null=True, blank=True)
     image3 = models.ImageField(upload_to='listings/', null=True, blank=True)
+    # WebP renditions per image field, filled in by market.images:
+    # {"image1": {"source": <image1 name>, "thumb": <path>, "medium": <path>}, ...}
+    image_variants = models.JSONField(default=dict, blank=True)
     
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.ACTIVE)
     
+    # Auction mode: the highest bid at or above the reserve wins automatically at expires_at
+    is_auction = models.BooleanField(default=False)
+    reserve_price_per_quintal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    
+    # Standing buy orders may fill this listing (fully or in parts) at or above the expected price
+    auto_match = models.BooleanField(default=False)
+    matched_quintals = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
+    # Bid aggregates (denormalized, kept in sync by Bid writes)
+    bids_count = models.PositiveIntegerField(default=0)
+    highest_bid_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_bid_at = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CropListingQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination for the farmer and buyer feeds
+            models.Index(fields=['farmer', '-created_at'], name='listing_farmer_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='listing_status_created_idx'),
+            models.Index(fields=['status', 'grid_row', 'grid_col'], name='listing_grid_idx'),
+            # Buyer feed: only live rows are indexed
+            models.Index(
+                fields=['expires_at', 'state', 'crop_variety'],
+                condition=models.Q(status='ACTIVE'),
+                name='listing_active_feed_idx',
+            ),
+            # Auction closer: live auctions by due time
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='ACTIVE', is_auction=True),
+                name='listing_auction_due_idx',
+            ),
+        ]
+    
+    def locate(self):
+        """Resolve coordinates and grid cell from the pincode, else the district"""
+        point = geo.locate_pincode(self.pincode) or geo.locate_district(self.state, self.district)
+        if point is None:
+            self.latitude = self.longitude = self.grid_row = self.grid_col = None
+            return
+        self.latitude, self.longitude = point
+        self.grid_row, self.grid_col = geo.grid_cell(*point)
+    
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None:
+            self.locate()
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            search.index_listing(self)
+            if created and self.status == self.Status.ACTIVE:
+                SavedSearchMatch.objects.record(self)
+            if images.stale_fields(self):
+                images.schedule_variants(self.pk)
+    
+    def delete(self, *args, **kwargs):
+        listing_id = self.pk
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            search.remove_listing(listing_id)
+        return result
     
     def __str__(self):
         return f"{self.crop_variety.name} - {self.quantity_quintals}Q by {self.farmer.username}"
@@ -60,6 +152,8 @@ class Bid(models.Model):
     
     amount_per_quintal = models.DecimalField(max_digits=10, decimal_places=2)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Set for partial fills from a buy order; empty means the whole listing
+    quantity_quintals = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
     
@@ -69,17 +163,214 @@ class Bid(models.Model):
     class Meta:
         ordering = ['-amount_per_quintal', '-created_at']
         unique_together = ['listing', 'buyer']  # One bid per buyer per listing
+        indexes = [
+            models.Index(fields=['buyer', '-amount_per_quintal', '-created_at'], name='bid_buyer_amount_idx'),
+            models.Index(fields=['listing', '-amount_per_quintal', '-created_at'], name='bid_listing_amount_idx'),
+        ]
     
     def save(self, *args, **kwargs):
-        # Auto-calculate total amount
+        # Auto-calculate total amount; partial fills cover only their own quantity
         if self.listing:
-            self.total_amount = self.amount_per_quintal * self.listing.quantity_quintals
-        super().save(*args, **kwargs)
+            quantity = self.quantity_quintals
+            if quantity is None:
+                quantity = self.listing.quantity_quintals
+            self.total_amount = self.amount_per_quintal * quantity
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CropListing.objects.filter(pk=self.listing_id).refresh_bid_stats()
+            events.bid_saved(self, created)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            CropListing.objects.filter(pk=self.listing_id).refresh_bid_stats()
+        return result
     
     def __str__(self):
         return f"Bid ₹{self.amount_per_quintal}/Q on {self.listing.id} by {self.buyer.username}"
 
 
+class BidRevision(models.Model):
+    """
+    Previous price of a bid, appended each time the buyer changes it.
+    """
+    bid = models.ForeignKey(Bid, on_delete=models.CASCADE, related_name='revisions')
+    amount_per_quintal = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Bid #{self.bid_id} was ₹{self.amount_per_quintal}/Q"
+
+
+class BuyOrder(models.Model):
+    """
+    Buyer's standing order for a crop variety, filled from matching listings
+    by market.matching.
+    """
+    class Status(models.TextChoices):
+        OPEN = 'OPEN', 'Open'
+        FILLED = 'FILLED', 'Filled'
+        CANCELLED = 'CANCELLED', 'Cancelled'
+    
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='buy_orders')
+    crop_variety = models.ForeignKey(CropVariety, on_delete=models.PROTECT)
+    
+    quantity_quintals = models.DecimalField(max_digits=10, decimal_places=2)
+    remaining_quintals = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price_per_quintal = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    # Acceptable listings: districts (empty = anywhere) and grade limits (empty = any)
+    districts = models.JSONField(default=list, blank=True)
+    max_moisture_content = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    max_foreign_matter = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.OPEN)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['buyer', '-created_at'], name='buy_order_buyer_created_idx'),
+            # Order book load: open orders of a variety
+            models.Index(
+                fields=['crop_variety', '-max_price_per_quintal', 'created_at'],
+                condition=models.Q(status='OPEN'),
+                name='buy_order_book_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Buy {self.remaining_quintals}/{self.quantity_quintals}Q {self.crop_variety.name} @ ₹{self.max_price_per_quintal} by {self.buyer.username}"
+
+
+class SavedSearchQuerySet(models.QuerySet):
+    def matching(self, listing):
+        """
+        Saved searches that ``listing`` satisfies, found in one indexed query.
+        Empty criteria match anything.
+        """
+        def unset_or(field, lookup, value):
+            if value is None:
+                return models.Q(**{f'{field}__isnull': True})
+            return models.Q(**{f'{field}__isnull': True}) | models.Q(**{f'{field}__{lookup}': value})
+        
+        return self.filter(
+            models.Q(crop_variety__isnull=True) | models.Q(crop_variety=listing.crop_variety_id),
+            models.Q(state='') | models.Q(state=listing.state),
+            models.Q(district='') | models.Q(district=listing.district),
+            unset_or('max_price_per_quintal', 'gte', listing.expected_price_per_quintal),
+            unset_or('min_quantity_quintals', 'lte', listing.quantity_quintals),
+            unset_or('max_moisture_content', 'gte', listing.moisture_content),
+            unset_or('max_foreign_matter', 'gte', listing.foreign_matter),
+            is_active=True,
+        )
+
+
+class SavedSearch(models.Model):
+    """
+    Buyer's stored listing filter. New listings are matched against all
+    saved searches once, on creation, and the hits land in the buyer's inbox.
+    """
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100)
+    
+    # Criteria; empty means "any"
+    crop_variety = models.ForeignKey(CropVariety, on_delete=models.CASCADE, null=True, blank=True)
+    state = models.CharField(max_length=50, blank=True)
+    district = models.CharField(max_length=50, blank=True)
+    max_price_per_quintal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    min_quantity_quintals = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_moisture_content = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    max_foreign_matter = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    
+    is_active = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = SavedSearchQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Saved searches"
+        indexes = [
+            models.Index(fields=['buyer', '-created_at'], name='saved_search_buyer_idx'),
+            # Listing -> searches lookup: equality criteria first, bounds checked on the hits
+            models.Index(
+                fields=['crop_variety', 'state', 'district'],
+                condition=models.Q(is_active=True),
+                name='saved_search_criteria_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.buyer.username})"
+
+
+class SavedSearchMatchManager(models.Manager):
+    def record(self, listing):
+        """Add ``listing`` to the inbox of every buyer whose saved search it matches"""
+        searches = SavedSearch.objects.matching(listing).values_list('pk', 'buyer_id')
+        return self.bulk_create(
+            [self.model(saved_search_id=pk, buyer_id=buyer_id, listing=listing) for pk, buyer_id in searches],
+            ignore_conflicts=True,
+        )
+
+
+class SavedSearchMatch(models.Model):
+    """
+    A listing that matched a saved search, shown in the buyer's inbox.
+    """
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    # Denormalized from saved_search so the inbox is a single index range scan
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='search_matches')
+    listing = models.ForeignKey(CropListing, on_delete=models.CASCADE, related_name='search_matches')
+    
+    seen_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = SavedSearchMatchManager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['saved_search', 'listing']
+        indexes = [
+            models.Index(fields=['buyer', '-created_at'], name='search_match_inbox_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Listing #{self.listing_id} matched {self.saved_search}"
+
+
+class BuyerRecommendation(models.Model):
+    """
+    Precomputed listing score for a buyer; only the top
+    RECOMMENDATIONS_PER_BUYER rows per buyer are kept (see market.recommendations).
+    """
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recommendations')
+    listing = models.ForeignKey(CropListing, on_delete=models.CASCADE, related_name='recommendations')
+    score = models.FloatField()
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['buyer', 'listing']
+        indexes = [
+            models.Index(fields=['buyer', '-score'], name='recommendation_buyer_score_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Listing #{self.listing_id} for {self.buyer_id} ({self.score:.2f})"
+
+
 class Order(models.Model):
     """
     Created when a bid is accepted. Tracks payment and delivery.
@@ -107,11 +398,58 @@ class Order(models.Model):
     
     final_amount = models.DecimalField(max_digits=12, decimal_places=2)
     
+    # Client-supplied Idempotency-Key of the accept request that created the order
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    
     payment_status = models.CharField(max_length=20, choices=PaymentStatus.choices, default=PaymentStatus.PENDING)
     order_status = models.CharField(max_length=20, choices=OrderStatus.choices, default=OrderStatus.CONFIRMED)
+    # Set when the shipment is delivered; escrow is released once the dispute window passes
+    delivered_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['buyer', '-created_at'], name='order_buyer_created_idx'),
+            models.Index(fields=['farmer', '-created_at'], name='order_farmer_created_idx'),
+            # Release queue: delivered orders still holding funds in escrow
+            models.Index(
+                fields=['delivered_at'], name='order_release_due_idx',
+                condition=models.Q(
+                    order_status='DELIVERED', payment_status__in=['TOKEN_DEPOSITED', 'FULL_DEPOSITED']
+                ),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['farmer', 'idempotency_key'], name='order_farmer_idempotency_key'
+            ),
+        ]
+    
     def __str__(self):
         return f"Order #{self.id} - {self.listing.crop_variety.name}"
+
+
+class RecommendationTask(models.Model):
+    """
+    Recommendation work deferred from request paths: a new listing to offer
+    to every buyer, or a buyer to rescore. Drained by
+    ``recommendations.process_queue``.
+    """
+    class Kind(models.TextChoices):
+        LISTING = 'LISTING', 'Score new listing'
+        BUYER = 'BUYER', 'Rescore buyer'
+    
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            # Queuing the same listing or buyer twice is a no-op
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='recommendation_task_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
@@ -0,0 +1,281 @@
+"""
+Precomputed listing recommendations for buyers.
+
+Every buyer keeps their top ``RECOMMENDATIONS_PER_BUYER`` active listings in
+``BuyerRecommendation``, scored from:
+
+* distance from the mill (buyer pincode) to the lot, or same district/state
+* the buyer's past orders by variety, and the price they usually paid
+* whether the lot fits the mill's weekly capacity
+* listing freshness
+
+Scores are kept current incrementally: a new listing is scored against all
+buyers and inserted only where it beats the buyer's current lowest entry,
+and a new order rescores just that buyer. Both cost O(buyers) or
+O(listings), so request paths only queue a ``RecommendationTask``;
+``process_queue`` (``manage.py process_recommendations`` or the scheduler
+job) does the work in batches. ``manage.py rebuild_recommendations``
+recomputes everything (run it from cron to let freshness decay and drop
+sold/expired lots).
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from accounts.models import BuyerProfile
+from core import geo
+from core.models import PincodeCentroid
+from .models import BuyerRecommendation, CropListing, Order, RecommendationTask
+
+LOCATION_WEIGHT = 3.0
+VARIETY_WEIGHT = 3.0
+PRICE_WEIGHT = 2.0
+CAPACITY_WEIGHT = 1.0
+FRESHNESS_WEIGHT = 1.0
+
+# Proximity score falls linearly to 0 at this distance
+NEARBY_KM = 300
+# A lot scores full price fit up to the buyer's usual price, 0 at 20% above it
+PRICE_TOLERANCE = 0.2
+# A lot fits if the mill can process it within this many days
+CAPACITY_DAYS = 7
+FRESHNESS_HALF_LIFE_HOURS = 48
+
+LISTING_FIELDS = [
+    'pk', 'crop_variety_id', 'state', 'district', 'latitude', 'longitude',
+    'expected_price_per_quintal', 'quantity_quintals', 'created_at',
+]
+
+
+class BuyerTaste:
+    """What a buyer's profile and order history say about them"""
+    __slots__ = ('buyer_id', 'state', 'district', 'point', 'daily_quintals', 'variety_share', 'variety_price')
+
+    def __init__(self, buyer_id, state, district, point=None, daily_quintals=None):
+        self.buyer_id = buyer_id
+        self.state = state
+        self.district = district
+        self.point = point
+        self.daily_quintals = daily_quintals
+        self.variety_share = {}
+        self.variety_price = {}
+
+
+def load_tastes(buyer_ids=None):
+    """Build ``BuyerTaste`` objects for the given buyers (default: all) in three queries"""
+    profiles = BuyerProfile.objects.all()
+    history = Order.objects.all()
+    if buyer_ids is not None:
+        profiles = profiles.filter(user_id__in=buyer_ids)
+        history = history.filter(buyer_id__in=buyer_ids)
+
+    profiles = list(profiles.values(
+        'user_id', 'state', 'district', 'pincode', 'mill_capacity_tons_per_day'
+    ))
+    centroids = PincodeCentroid.objects.in_bulk({p['pincode'] for p in profiles}, field_name='pincode')
+    tastes = {}
+    for profile in profiles:
+        centroid = centroids.get(profile['pincode'])
+        capacity = profile['mill_capacity_tons_per_day']
+        tastes[profile['user_id']] = BuyerTaste(
+            profile['user_id'], profile['state'], profile['district'],
+            point=(centroid.latitude, centroid.longitude) if centroid else None,
+            # 1 tonne = 10 quintals
+            daily_quintals=float(capacity) * 10 if capacity else None,
+        )
+
+    totals = defaultdict(int)
+    rows = list(
+        history.values('buyer_id', 'listing__crop_variety_id')
+        .annotate(orders=Count('id'), avg_price=Avg('bid__amount_per_quintal'))
+        .order_by()
+    )
+    for row in rows:
+        totals[row['buyer_id']] += row['orders']
+    for row in rows:
+        taste = tastes.get(row['buyer_id'])
+        if taste is None:
+            continue
+        variety_id = row['listing__crop_variety_id']
+        taste.variety_share[variety_id] = row['orders'] / totals[row['buyer_id']]
+        taste.variety_price[variety_id] = float(row['avg_price'])
+    return list(tastes.values())
+
+
+def score(listing, taste, now):
+    """Score a listing (a dict of ``LISTING_FIELDS``) for one buyer"""
+    if taste.point and listing['latitude'] is not None:
+        km = geo.haversine_km(*taste.point, listing['latitude'], listing['longitude'])
+        location = max(0.0, 1 - km / NEARBY_KM)
+    elif listing['state'] == taste.state:
+        location = 1.0 if listing['district'] == taste.district else 0.5
+    else:
+        location = 0.0
+
+    variety_id = listing['crop_variety_id']
+    variety = taste.variety_share.get(variety_id, 0.0)
+
+    usual_price = taste.variety_price.get(variety_id)
+    if usual_price:
+        overshoot = float(listing['expected_price_per_quintal']) / usual_price - 1
+        price = 1.0 if overshoot <= 0 else max(0.0, 1 - overshoot / PRICE_TOLERANCE)
+    else:
+        price = 0.5
+
+    if taste.daily_quintals:
+        quantity = float(listing['quantity_quintals'])
+        capacity = min(1.0, taste.daily_quintals * CAPACITY_DAYS / quantity) if quantity else 0.0
+    else:
+        capacity = 0.5
+
+    age_hours = max(0.0, (now - listing['created_at']).total_seconds() / 3600)
+    freshness = 0.5 ** (age_hours / FRESHNESS_HALF_LIFE_HOURS)
+
+    return (
+        LOCATION_WEIGHT * location
+        + VARIETY_WEIGHT * variety
+        + PRICE_WEIGHT * price
+        + CAPACITY_WEIGHT * capacity
+        + FRESHNESS_WEIGHT * freshness
+    )
+
+
+def active_listings(now):
+    return CropListing.objects.filter(status=CropListing.Status.ACTIVE, expires_at__gt=now)
+
+
+def trim(buyer_ids):
+    """Drop everything past the top N for these buyers"""
+    ranked = BuyerRecommendation.objects.filter(buyer_id__in=buyer_ids).annotate(
+        rank=Window(RowNumber(), partition_by=F('buyer_id'), order_by=F('score').desc())
+    ).filter(rank__gt=settings.RECOMMENDATIONS_PER_BUYER)
+    extra = list(ranked.values_list('pk', flat=True))
+    if extra:
+        BuyerRecommendation.objects.filter(pk__in=extra).delete()
+
+
+def add_listings(listing_ids, now=None):
+    """Offer new listings to every buyer whose top N they get into"""
+    now = now or timezone.now()
+    rows = list(active_listings(now).filter(pk__in=listing_ids).values(*LISTING_FIELDS))
+    if not rows:
+        return 0
+
+    limit = settings.RECOMMENDATIONS_PER_BUYER
+    floors = {
+        entry['buyer_id']: entry
+        for entry in BuyerRecommendation.objects.values('buyer_id')
+        .annotate(entries=Count('id'), floor=Min('score')).order_by()
+    }
+    recommendations = []
+    for taste in load_tastes():
+        floor = floors.get(taste.buyer_id)
+        for row in rows:
+            value = score(row, taste, now)
+            if floor is None or floor['entries'] < limit or value > floor['floor']:
+                recommendations.append(
+                    BuyerRecommendation(buyer_id=taste.buyer_id, listing_id=row['pk'], score=value)
+                )
+
+    with transaction.atomic():
+        BuyerRecommendation.objects.bulk_create(
+            recommendations,
+            update_conflicts=True,
+            unique_fields=['buyer', 'listing'],
+            update_fields=['score', 'updated_at'],
+        )
+        added = Counter(r.buyer_id for r in recommendations)
+        trim([
+            buyer_id for buyer_id, count in added.items()
+            if floors.get(buyer_id, {}).get('entries', 0) + count > limit
+        ])
+    return len(recommendations)
+
+
+def add_listing(listing, now=None):
+    """Offer one new listing to every buyer whose top N it gets into"""
+    return add_listings([listing.pk], now)
+
+
+def refresh_buyers(buyer_ids, now=None, chunk_size=2000):
+    """Recompute the top N from scratch for a set of buyers"""
+    now = now or timezone.now()
+    tastes = load_tastes(buyer_ids)
+    limit = settings.RECOMMENDATIONS_PER_BUYER
+    best = {taste.buyer_id: [] for taste in tastes}
+
+    for row in active_listings(now).values(*LISTING_FIELDS).iterator(chunk_size=chunk_size):
+        for taste in tastes:
+            heap = best[taste.buyer_id]
+            entry = (score(row, taste, now), row['pk'])
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    with transaction.atomic():
+        BuyerRecommendation.objects.filter(buyer_id__in=buyer_ids).delete()
+        BuyerRecommendation.objects.bulk_create(
+            BuyerRecommendation(buyer_id=buyer_id, listing_id=listing_id, score=value)
+            for buyer_id, heap in best.items()
+            for value, listing_id in heap
+        )
+
+
+def queue(kind, object_ids):
+    """Queue work for ``process_queue``; commits (or rolls back) with the caller's transaction"""
+    RecommendationTask.objects.bulk_create(
+        [RecommendationTask(kind=kind, object_id=object_id) for object_id in set(object_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def queue_listings(listing_ids):
+    """Have new listings offered to buyers by the next ``process_queue`` run"""
+    queue(RecommendationTask.Kind.LISTING, listing_ids)
+
+
+def queue_buyers(buyer_ids):
+    """Have these buyers (with new orders) rescored by the next ``process_queue`` run"""
+    queue(RecommendationTask.Kind.BUYER, buyer_ids)
+
+
+def process_queue(batch_size=500, now=None):
+    """
+    Apply queued tasks oldest first, a batch at a time: the batch's listings
+    are scored against all buyers in one pass and its buyers are rescored
+    together. Batches are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``
+    so several workers can drain the queue. Returns the number of tasks done.
+    """
+    done = 0
+    while True:
+        with transaction.atomic():
+            tasks = list(
+                RecommendationTask.objects.select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+            )
+            if not tasks:
+                return done
+            listing_ids = [t.object_id for t in tasks if t.kind == RecommendationTask.Kind.LISTING]
+            buyer_ids = [t.object_id for t in tasks if t.kind == RecommendationTask.Kind.BUYER]
+            if listing_ids:
+                add_listings(listing_ids, now)
+            if buyer_ids:
+                refresh_buyers(buyer_ids, now)
+            RecommendationTask.objects.filter(pk__in=[t.pk for t in tasks]).delete()
+        done += len(tasks)
+        if len(tasks) < batch_size:
+            return done
+
+
+def rebuild(batch_size=200):
+    """Recompute recommendations for every buyer; returns the number of buyers"""
+    buyer_ids = list(BuyerProfile.objects.order_by('user_id').values_list('user_id', flat=True))
+    for start in range(0, len(buyer_ids), batch_size):
+        refresh_buyers(buyer_ids[start:start + batch_size])
+    BuyerRecommendation.objects.exclude(buyer_id__in=BuyerProfile.objects.values('user_id')).delete()
+    return len(buyer_ids)
@@ -0,0 +1,114 @@
+"""
+Full-text search index for crop listings.
+
+SQLite uses an FTS5 virtual table keyed by the listing id; PostgreSQL uses a
+tsvector column with a GIN index on the listings table itself. Both are
+created by migration 0004 and kept up to date from CropListing.save().
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'market_croplisting_fts'
+
+# Relative weight of (variety, location, region) matches when ranking
+SQLITE_WEIGHTS = '10.0, 2.0, 5.0'
+
+SQLITE_REBUILD = f"""
+    INSERT INTO {FTS_TABLE} (rowid, variety, location, region)
+    SELECT l.id, v.name, l.location_description, l.district || ' ' || l.state
+    FROM market_croplisting l JOIN core_cropvariety v ON v.id = l.crop_variety_id
+"""
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('simple', coalesce(%s, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(%s, '') || ' ' || coalesce(%s, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(%s, '')), 'C')
+"""
+
+POSTGRES_REBUILD = """
+    UPDATE market_croplisting l SET search_vector = (
+        setweight(to_tsvector('simple', v.name), 'A') ||
+        setweight(to_tsvector('simple', l.district || ' ' || l.state), 'B') ||
+        setweight(to_tsvector('simple', l.location_description), 'C')
+    )
+    FROM core_cropvariety v WHERE v.id = l.crop_variety_id
+"""
+
+
+def is_available():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def index_listing(listing):
+    """Add or refresh a single listing in the search index"""
+    if not is_available():
+        return
+    variety = listing.crop_variety.name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [listing.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, variety, location, region) VALUES (%s, %s, %s, %s)',
+                [listing.pk, variety, listing.location_description, f'{listing.district} {listing.state}']
+            )
+        else:
+            cursor.execute(
+                f'UPDATE market_croplisting SET search_vector = {POSTGRES_VECTOR} WHERE id = %s',
+                [variety, listing.district, listing.state, listing.location_description, listing.pk]
+            )
+
+
+def remove_listing(listing_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [listing_id])
+
+
+def rebuild_index():
+    """Re-index every listing from scratch"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(SQLITE_REBUILD)
+        else:
+            cursor.execute(POSTGRES_REBUILD)
+
+
+def search_listings(queryset, terms):
+    """
+    Restrict a listing queryset to full-text matches for all of ``terms``
+    (prefix-matched) and annotate each row with a ``search_rank`` score.
+    """
+    words = [word for term in terms for word in re.findall(r'\w+', term)]
+    if not words:
+        return queryset
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join('"%s"*' % word for word in words)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, {SQLITE_WEIGHTS}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = market_croplisting.id',
+                [match], output_field=FloatField()
+            )
+        )
+
+    query = ' & '.join('%s:*' % word for word in words)
+    return queryset.alias(
+        search_match=RawSQL(
+            "market_croplisting.search_vector @@ to_tsquery('simple', %s)", [query],
+            output_field=BooleanField()
+        )
+    ).filter(search_match=True).annotate(
+        search_rank=RawSQL(
+            "ts_rank(market_croplisting.search_vector, to_tsquery('simple', %s))", [query],
+            output_field=FloatField()
+        )
+    )
@@ -1,45 +1,85 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import CropListing, Bid, Order
+from django.conf import settings
+from django.utils import timezone
+from . import images
+from .models import CropListing, Bid, BuyOrder, Order, SavedSearch, SavedSearchMatch
+from core.expansion import ExpandableFieldsMixin
 from core.models import CropVariety
 from core.serializers import CropVarietySerializer
-from accounts.serializers import UserSerializer
+from accounts.serializers import UserSummarySerializer
+
+MIN_BID_AMOUNT = Decimal('0.01')
 
 
-class CropListingSerializer(serializers.ModelSerializer):
-    farmer = UserSerializer(read_only=True)
-    crop_variety = CropVarietySerializer(read_only=True)
+class CropListingSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    farmer = serializers.PrimaryKeyRelatedField(read_only=True)
+    crop_variety = serializers.PrimaryKeyRelatedField(read_only=True)
     crop_variety_id = serializers.PrimaryKeyRelatedField(
         queryset=CropVariety.objects.all(),
         source='crop_variety',
         write_only=True
     )
-    bids_count = serializers.SerializerMethodField()
-    highest_bid = serializers.SerializerMethodField()
+    highest_bid = serializers.DecimalField(
+        source='highest_bid_amount', max_digits=10, decimal_places=2, read_only=True
+    )
+    distance_km = serializers.SerializerMethodField()
+    images = serializers.SerializerMethodField()
     
     class Meta:
         model = CropListing
         fields = [
             'id', 'farmer', 'crop_variety', 'crop_variety_id',
             'quantity_quintals', 'expected_price_per_quintal',
-            'location_description', 'district', 'state',
+            'location_description', 'district', 'state', 'pincode',
+            'latitude', 'longitude', 'distance_km',
             'moisture_content', 'foreign_matter',
-            'image1', 'image2', 'image3',
+            'image1', 'image2', 'image3', 'images',
             'status', 'created_at', 'expires_at', 'updated_at',
-            'bids_count', 'highest_bid'
+            'is_auction', 'reserve_price_per_quintal',
+            'auto_match', 'matched_quintals',
+            'bids_count', 'highest_bid', 'last_bid_at'
         ]
-        read_only_fields = ['id', 'farmer', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'farmer', 'created_at', 'updated_at', 'matched_quintals',
+            'bids_count', 'last_bid_at', 'latitude', 'longitude'
+        ]
+    
+    expandable_fields = {
+        'farmer': (UserSummarySerializer, {}),
+        'crop_variety': (CropVarietySerializer, {}),
+    }
+    
+    def get_distance_km(self, obj):
+        # Only present when the queryset was filtered with ?near=
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 1) if distance is not None else None
     
-    def get_bids_count(self, obj):
-        return obj.bids.count()
+    def get_images(self, obj):
+        return images.image_urls(obj, self.context.get('request'))
     
-    def get_highest_bid(self, obj):
-        highest = obj.bids.order_by('-amount_per_quintal').first()
-        return highest.amount_per_quintal if highest else None
+    def validate_quantity_quintals(self, value):
+        if self.instance is not None and value < self.instance.matched_quintals:
+            raise serializers.ValidationError(
+                f"{self.instance.matched_quintals} quintals are already sold to buy orders"
+            )
+        return value
+    
+    def clean_image(self, value):
+        if not value:
+            return value
+        try:
+            return images.clean_upload(value)
+        except images.ImageRejected as exc:
+            raise serializers.ValidationError(str(exc))
+    
+    validate_image1 = validate_image2 = validate_image3 = clean_image
 
 
-class BidSerializer(serializers.ModelSerializer):
-    buyer = UserSerializer(read_only=True)
-    listing = CropListingSerializer(read_only=True)
+class BidSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    buyer = serializers.PrimaryKeyRelatedField(read_only=True)
+    listing = serializers.PrimaryKeyRelatedField(read_only=True)
     listing_id = serializers.PrimaryKeyRelatedField(
         queryset=CropListing.objects.all(),
         source='listing',
@@ -50,23 +90,122 @@ class BidSerializer(serializers.ModelSerializer):
         model = Bid
         fields = [
             'id', 'listing', 'listing_id', 'buyer',
-            'amount_per_quintal', 'total_amount',
+            'amount_per_quintal', 'total_amount', 'quantity_quintals',
             'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'buyer', 'total_amount', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'buyer', 'total_amount', 'quantity_quintals', 'created_at', 'updated_at']
+        extra_kwargs = {'amount_per_quintal': {'min_value': MIN_BID_AMOUNT}}
+    
+    expandable_fields = {
+        'buyer': (UserSummarySerializer, {}),
+        'listing': (CropListingSerializer, {}),
+    }
     
     def validate(self, data):
         listing = data.get('listing')
         if listing and listing.status != 'ACTIVE':
             raise serializers.ValidationError("Cannot bid on inactive listing")
+        if listing and listing.expires_at <= timezone.now():
+            raise serializers.ValidationError("Cannot bid on expired listing")
         return data
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    listing = CropListingSerializer(read_only=True)
-    buyer = UserSerializer(read_only=True)
-    farmer = UserSerializer(read_only=True)
-    bid = BidSerializer(read_only=True)
+class BuyOrderSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    buyer = serializers.PrimaryKeyRelatedField(read_only=True)
+    crop_variety = serializers.PrimaryKeyRelatedField(read_only=True)
+    crop_variety_id = serializers.PrimaryKeyRelatedField(
+        queryset=CropVariety.objects.all(),
+        source='crop_variety',
+        write_only=True
+    )
+    districts = serializers.ListField(child=serializers.CharField(max_length=50), required=False)
+    
+    class Meta:
+        model = BuyOrder
+        fields = [
+            'id', 'buyer', 'crop_variety', 'crop_variety_id',
+            'quantity_quintals', 'remaining_quintals', 'max_price_per_quintal',
+            'districts', 'max_moisture_content', 'max_foreign_matter',
+            'status', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'buyer', 'remaining_quintals', 'status', 'created_at', 'updated_at']
+    
+    expandable_fields = {
+        'buyer': (UserSummarySerializer, {}),
+        'crop_variety': (CropVarietySerializer, {}),
+    }
+    
+    def validate_quantity_quintals(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Quantity must be positive")
+        return value
+
+
+class SavedSearchSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    buyer = serializers.PrimaryKeyRelatedField(read_only=True)
+    crop_variety = serializers.PrimaryKeyRelatedField(read_only=True)
+    crop_variety_id = serializers.PrimaryKeyRelatedField(
+        queryset=CropVariety.objects.all(),
+        source='crop_variety',
+        write_only=True,
+        required=False,
+        allow_null=True
+    )
+    
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'id', 'buyer', 'name', 'crop_variety', 'crop_variety_id',
+            'state', 'district', 'max_price_per_quintal', 'min_quantity_quintals',
+            'max_moisture_content', 'max_foreign_matter',
+            'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'buyer', 'created_at', 'updated_at']
+    
+    expandable_fields = {
+        'crop_variety': (CropVarietySerializer, {}),
+    }
+
+
+class SavedSearchMatchSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    saved_search = serializers.PrimaryKeyRelatedField(read_only=True)
+    listing = serializers.PrimaryKeyRelatedField(read_only=True)
+    
+    class Meta:
+        model = SavedSearchMatch
+        fields = ['id', 'saved_search', 'listing', 'seen_at', 'created_at', 'updated_at']
+        read_only_fields = fields
+    
+    expandable_fields = {
+        'saved_search': (SavedSearchSerializer, {}),
+        'listing': (CropListingSerializer, {}),
+    }
+
+
+class BulkBidItemSerializer(serializers.Serializer):
+    listing_id = serializers.IntegerField()
+    amount_per_quintal = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=MIN_BID_AMOUNT)
+
+
+class BulkBidSerializer(serializers.Serializer):
+    """Input for POST /api/bids/bulk/; per-listing checks happen in place_bids"""
+    bids = serializers.ListField(
+        child=BulkBidItemSerializer(),
+        allow_empty=False,
+        max_length=settings.BULK_BID_MAX_ITEMS
+    )
+
+
+class InboxSeenSerializer(serializers.Serializer):
+    """Input for POST /api/inbox/seen/; without ``ids`` every entry is marked"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=1000)
+
+
+class OrderSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    listing = serializers.PrimaryKeyRelatedField(read_only=True)
+    buyer = serializers.PrimaryKeyRelatedField(read_only=True)
+    farmer = serializers.PrimaryKeyRelatedField(read_only=True)
+    bid = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = Order
@@ -76,3 +215,10 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    expandable_fields = {
+        'listing': (CropListingSerializer, {}),
+        'buyer': (UserSummarySerializer, {}),
+        'farmer': (UserSummarySerializer, {}),
+        'bid': (BidSerializer, {}),
+    }
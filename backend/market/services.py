@@ -0,0 +1,229 @@
+"""
+Transactional market operations shared by the API views and background jobs.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import events, recommendations
+from .models import CropListing, Bid, BidRevision, Order
+
+PICKUP_LEAD_DAYS = 3
+
+BID_CREATED = 'created'
+BID_UPDATED = 'updated'
+BID_FAILED = 'error'
+
+
+class MarketError(Exception):
+    """A market operation was refused; ``status_code`` is the HTTP status to report"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def find_replayed_order(farmer, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(farmer=farmer, idempotency_key=idempotency_key).first()
+
+
+def create_orders(bids, now, idempotency_key=''):
+    """
+    Create an order at the bid's total, and the order's shipment, for each
+    accepted bid in two bulk INSERTs. Whole-listing sales and buy-order
+    fills both open orders through here.
+    """
+    Shipment = apps.get_model('logistics', 'Shipment')
+    orders = Order.objects.bulk_create(
+        Order(
+            listing=bid.listing,
+            buyer_id=bid.buyer_id,
+            farmer_id=bid.listing.farmer_id,
+            bid=bid,
+            final_amount=bid.total_amount,
+            idempotency_key=idempotency_key or None,
+        )
+        for bid in bids
+    )
+    Shipment.objects.bulk_create(
+        Shipment(order=order, pickup_date=now.date() + timedelta(days=PICKUP_LEAD_DAYS))
+        for order in orders
+    )
+    return orders
+
+
+def complete_sale(listing, bid, now, idempotency_key=''):
+    """
+    Record ``bid`` as the winner of ``listing``: accept it, reject the other
+    bids and create the order and its shipment. The caller must already have
+    moved the listing to SOLD with a conditional UPDATE inside a transaction.
+    """
+    Bid.objects.filter(pk=bid.pk).update(status=Bid.Status.ACCEPTED, updated_at=now)
+    Bid.objects.filter(listing=listing, status=Bid.Status.PENDING).exclude(pk=bid.pk).update(
+        status=Bid.Status.REJECTED, updated_at=now
+    )
+    bid.listing = listing
+    order, = create_orders([bid], now, idempotency_key)
+    CropListing.objects.filter(pk=listing.pk).refresh_bid_stats()
+
+    bid.status = Bid.Status.ACCEPTED
+    listing.status = CropListing.Status.SOLD
+    events.listing_sold(
+        listing, bid,
+        Bid.objects.filter(listing=listing).values_list('buyer_id', 'status')
+    )
+    return order
+
+
+def accept_bid(bid, farmer, idempotency_key=''):
+    """
+    Accept ``bid`` on behalf of ``farmer`` and create its order and shipment.
+
+    All writes happen in one transaction. Instead of locking the listing, the
+    ACTIVE -> SOLD transition is a conditional UPDATE, so exactly one of any
+    number of concurrent accepts for a listing wins and the rest fail fast.
+    A listing that buy orders have already partly filled cannot be sold
+    whole, so the same UPDATE also requires ``matched_quintals = 0``.
+    A retry carrying the same ``idempotency_key`` gets the original order back.
+
+    Returns ``(order, created)``.
+    """
+    order = find_replayed_order(farmer, idempotency_key)
+    if order is not None:
+        return order, False
+
+    listing = bid.listing
+    if listing.farmer_id != farmer.pk:
+        raise MarketError('Only the listing owner can accept bids', status_code=403)
+
+    try:
+        with transaction.atomic():
+            now = timezone.now()
+            claimed = CropListing.objects.filter(
+                pk=listing.pk, status=CropListing.Status.ACTIVE, matched_quintals=0
+            ).update(status=CropListing.Status.SOLD, updated_at=now)
+            if not claimed:
+                if CropListing.objects.filter(pk=listing.pk, matched_quintals__gt=0).exists():
+                    raise MarketError('Listing has already been partly filled by buy orders', status_code=409)
+                raise MarketError('Listing is not active')
+
+            order = complete_sale(listing, bid, now, idempotency_key)
+            recommendations.queue_buyers([bid.buyer_id])
+    except (MarketError, IntegrityError):
+        # A concurrent request with the same key may have won the race
+        order = find_replayed_order(farmer, idempotency_key)
+        if order is not None:
+            return order, False
+        raise
+
+    return order, True
+
+
+def place_bids(buyer, items):
+    """
+    Place or raise ``buyer``'s bids on one or more listings.
+
+    ``items`` is a list of ``{'listing_id': ..., 'amount_per_quintal': ...}``.
+    All listings are fetched in one query and the valid bids are written with
+    a single ``INSERT ... ON CONFLICT (listing, buyer) DO UPDATE``, so a re-bid
+    replaces the amount instead of failing. A re-bid must be higher than the
+    buyer's current bid, and bids that are no longer PENDING (accepted fills,
+    rejected bids) are left alone; the price a raised bid had before is
+    appended to ``BidRevision``. Invalid items are skipped, not fatal.
+
+    Returns one result dict per item, in order.
+    """
+    now = timezone.now()
+    listing_ids = {item['listing_id'] for item in items}
+    listings = CropListing.objects.only(
+        'id', 'farmer_id', 'status', 'expires_at', 'quantity_quintals'
+    ).in_bulk(listing_ids)
+
+    results, bids = [], {}
+    for index, item in enumerate(items):
+        listing_id = item['listing_id']
+        listing = listings.get(listing_id)
+        result = {'index': index, 'listing': listing_id}
+        results.append(result)
+        if listing is None:
+            error = 'Listing not found'
+        elif listing_id in bids:
+            error = 'Duplicate listing in batch'
+        elif listing.status != CropListing.Status.ACTIVE:
+            error = 'Cannot bid on inactive listing'
+        elif listing.expires_at <= now:
+            error = 'Cannot bid on expired listing'
+        else:
+            amount = item['amount_per_quintal']
+            bids[listing_id] = Bid(
+                listing=listing, buyer=buyer, amount_per_quintal=amount,
+                total_amount=amount * listing.quantity_quintals, status=Bid.Status.PENDING,
+            )
+            continue
+        result.update(status=BID_FAILED, error=error)
+
+    if not bids:
+        return results
+
+    with transaction.atomic():
+        previous, statuses = {}, {}
+        for listing_id, pk, amount, bid_status in (
+            Bid.objects.select_for_update().filter(buyer=buyer, listing_id__in=bids)
+            .values_list('listing_id', 'pk', 'amount_per_quintal', 'status')
+        ):
+            previous[listing_id] = (pk, amount)
+            statuses[listing_id] = bid_status
+        for result in results:
+            listing_id = result['listing']
+            if 'status' in result or listing_id not in previous:
+                continue
+            current = previous[listing_id][1]
+            if statuses[listing_id] != Bid.Status.PENDING:
+                error = f'Your bid on this listing is already {statuses[listing_id].lower()}'
+            elif bids[listing_id].amount_per_quintal <= current:
+                error = f'Bid must be higher than your current bid of {current}'
+            else:
+                continue
+            result.update(status=BID_FAILED, error=error)
+            del bids[listing_id], previous[listing_id]
+        if not bids:
+            return results
+
+        saved = Bid.objects.bulk_create(
+            bids.values(),
+            update_conflicts=True,
+            unique_fields=['listing', 'buyer'],
+            update_fields=['amount_per_quintal', 'total_amount', 'status', 'updated_at'],
+        )
+        BidRevision.objects.bulk_create(
+            BidRevision(bid_id=pk, amount_per_quintal=amount) for pk, amount in previous.values()
+        )
+        CropListing.objects.filter(pk__in=bids).refresh_bid_stats()
+        summaries = events.listing_summaries(bids)
+        for bid in saved:
+            events.bid_saved(bid, bid.listing_id not in previous, summaries.get(bid.listing_id))
+
+    for result in results:
+        if 'status' not in result:
+            # PostgreSQL and SQLite return the id of both inserted and updated rows
+            result.update(
+                status=BID_UPDATED if result['listing'] in previous else BID_CREATED,
+                bid=bids[result['listing']].pk,
+            )
+    return results
+
+
+def place_bid(buyer, listing_id, amount_per_quintal):
+    """
+    Place or raise a single bid. Returns ``(bid, created)``; raises
+    ``MarketError`` when the listing cannot take bids.
+    """
+    result, = place_bids(buyer, [{'listing_id': listing_id, 'amount_per_quintal': amount_per_quintal}])
+    if result['status'] == BID_FAILED:
+        raise MarketError(result['error'])
+    return Bid.objects.get(pk=result['bid']), result['status'] == BID_CREATED
@@ -0,0 +1,168 @@
+"""
+ASGI push channel for live bid events, mounted by agrobid.asgi.
+
+* WebSocket: ``/ws/bids/?token=<access token>[&listing=<id>]``
+* Server-sent events: ``GET /api/stream/bids/?token=...[&listing=<id>]``
+
+Farmers get every bid on their listings (or one listing's), buyers get their
+own bids and may follow any active listing's public summary (bid count and
+top price, see market.events). Each connection is one
+coroutine with a bounded queue, so a worker holds thousands of idle
+connections; a comment/ping is sent every ``STREAM_HEARTBEAT_SECONDS``.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from core.pubsub import get_broker
+from .models import CropListing
+
+WEBSOCKET_PATH = '/ws/bids/'
+SSE_PATH = '/api/stream/bids/'
+
+
+class StreamDenied(Exception):
+    pass
+
+
+def resolve_topics(token, listing_id):
+    """Authenticate the access token and return the topics it may follow"""
+    try:
+        user_id = AccessToken(token)['user_id']
+        user = User.objects.get(pk=user_id, is_active=True)
+    except (TokenError, KeyError, User.DoesNotExist):
+        raise StreamDenied('Invalid or expired token')
+
+    if listing_id:
+        listing = CropListing.objects.filter(pk=listing_id).values('farmer_id', 'status').first()
+        if listing is None:
+            raise StreamDenied('Listing not found')
+        if user.role == 'FARMER' and listing['farmer_id'] != user.pk:
+            raise StreamDenied('Not your listing')
+        if user.role == 'BUYER':
+            if listing['status'] != CropListing.Status.ACTIVE:
+                raise StreamDenied('Listing is not active')
+            # Competitors' bids stay private: the public summary plus their own bids
+            return [f'market:{listing_id}', f'buyer:{user.pk}']
+        return [f'listing:{listing_id}']
+
+    if user.role == 'FARMER':
+        return [f'farmer:{user.pk}']
+    if user.role == 'BUYER':
+        return [f'buyer:{user.pk}']
+    raise StreamDenied('Invalid user role')
+
+
+def get_credentials(scope):
+    params = parse_qs(scope.get('query_string', b'').decode())
+    token = params.get('token', [''])[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization' and value.startswith(b'Bearer '):
+            token = value[7:].decode()
+    listing = params.get('listing', [''])[0]
+    return token, int(listing) if listing.isdigit() else None
+
+
+async def wait_for_disconnect(receive, disconnect_type):
+    while True:
+        message = await receive()
+        if message['type'] == disconnect_type:
+            return
+
+
+async def pump(subscription, receive, disconnect_type, send_message, send_heartbeat):
+    """Forward messages until the client goes away"""
+    heartbeat = settings.STREAM_HEARTBEAT_SECONDS
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive, disconnect_type))
+    try:
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                getter.cancel()
+                return
+            if getter in done:
+                await send_message(getter.result())
+            else:
+                getter.cancel()
+                await send_heartbeat()
+    finally:
+        disconnected.cancel()
+        get_broker().unsubscribe(subscription)
+
+
+async def websocket_stream(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    token, listing_id = get_credentials(scope)
+    try:
+        topics = await sync_to_async(resolve_topics)(token, listing_id)
+    except StreamDenied:
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    subscription = get_broker().subscribe(topics)
+    await send({'type': 'websocket.accept'})
+
+    async def send_message(data):
+        await send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def send_heartbeat():
+        await send({'type': 'websocket.send', 'text': '{"type": "ping"}'})
+
+    await pump(subscription, receive, 'websocket.disconnect', send_message, send_heartbeat)
+
+
+async def sse_stream(scope, receive, send):
+    token, listing_id = get_credentials(scope)
+    try:
+        topics = await sync_to_async(resolve_topics)(token, listing_id)
+    except StreamDenied as exc:
+        await send({
+            'type': 'http.response.start', 'status': 403,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps({'error': str(exc)}).encode()})
+        return
+
+    subscription = get_broker().subscribe(topics)
+    await send({
+        'type': 'http.response.start', 'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+    async def send_message(data):
+        body = f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+        await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+
+    async def send_heartbeat():
+        await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+
+    await pump(subscription, receive, 'http.disconnect', send_message, send_heartbeat)
+
+
+def handles(scope):
+    if scope['type'] == 'websocket':
+        return scope['path'] == WEBSOCKET_PATH
+    return scope['type'] == 'http' and scope['path'] == SSE_PATH and scope['method'] == 'GET'
+
+
+async def bid_stream(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_stream(scope, receive, send)
+    else:
+        await sse_stream(scope, receive, send)
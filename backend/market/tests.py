@@ -1,3 +1,917 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.apps import apps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from agrobid.asgi import application
+
+from core.testing import (
+    QueryCountAssertionsMixin, make_bid, make_buyer, make_farmer, make_listing, make_variety
+)
+from . import matching, recommendations, services
+from .auctions import close_due_auctions
+from .expiry import expire_listings
+from .models import Bid, BuyOrder, CropListing, Order, SavedSearch
+from .streams import SSE_PATH
+
+
+class ListEndpointQueryCountTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+
+    def add_listings(self, n):
+        for _ in range(n):
+            make_bid(make_listing(self.farmer), self.buyer)
+
+    def add_orders(self, n):
+        for _ in range(n):
+            bid = make_bid(make_listing(self.farmer), make_buyer())
+            self.client.force_authenticate(self.farmer)
+            response = self.client.post(f'/api/bids/{bid.pk}/accept/')
+            self.assertEqual(response.status_code, 201, response.content)
+
+    def test_listings(self):
+        self.client.force_authenticate(self.buyer)
+        self.assertQueryCountConstant('/api/listings/', self.add_listings)
+
+    def test_listings_expanded(self):
+        self.client.force_authenticate(self.buyer)
+        self.assertQueryCountConstant(
+            '/api/listings/', self.add_listings, expand='farmer,crop_variety'
+        )
+
+    def test_bids_expanded(self):
+        self.client.force_authenticate(self.buyer)
+        self.assertQueryCountConstant(
+            '/api/bids/', self.add_listings, expand='buyer,listing.farmer,listing.crop_variety'
+        )
+
+    def test_orders_expanded(self):
+        def add_rows(n):
+            self.add_orders(n)
+            self.client.force_authenticate(self.farmer)
+
+        self.assertQueryCountConstant(
+            '/api/orders/', add_rows, expand='listing.crop_variety,buyer,farmer,bid.buyer'
+        )
+
+
+class BidStatsTests(TestCase):
+    def setUp(self):
+        self.listing = make_listing(make_farmer())
+        self.bids = [make_bid(self.listing, make_buyer(), amount) for amount in (2300, 2500)]
+
+    def assertStats(self, count, highest, last):
+        self.listing.refresh_from_db()
+        self.assertEqual(
+            (self.listing.bids_count, self.listing.highest_bid_amount, self.listing.last_bid_at),
+            (count, highest, last)
+        )
+
+    def test_bid_writes_refresh_listing_columns(self):
+        self.assertStats(2, 2500, self.bids[1].created_at)
+
+        self.bids[1].delete()
+        self.assertStats(1, 2300, self.bids[0].created_at)
+
+    def test_backfill_and_sync_repair_drift(self):
+        CropListing.objects.update(bids_count=0, highest_bid_amount=None, last_bid_at=None)
+        import_module('market.migrations.0002_listing_bid_stats').backfill_bid_stats(apps, None)
+        self.assertStats(2, 2500, self.bids[1].created_at)
+
+        CropListing.objects.update(bids_count=7)
+        out = StringIO()
+        call_command('sync_bid_stats', '--check', stdout=out)
+        self.assertIn('1 listings have drifted', out.getvalue())
+        self.assertStats(7, 2500, self.bids[1].created_at)
+
+        call_command('sync_bid_stats', stdout=out)
+        self.assertIn('Repaired 1 listings', out.getvalue())
+        self.assertStats(2, 2500, self.bids[1].created_at)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        listing = make_listing(self.farmer)
+        for amount in (2300, 2400, 2300, 2300, 2400, 2200, 2300):
+            make_bid(listing, make_buyer(), amount)
+        self.client.force_authenticate(self.farmer)
+
+    def test_cursor_walks_tied_amounts_without_gaps_or_repeats(self):
+        seen = []
+        url = '/api/bids/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertNotIn('count', response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        expected = Bid.objects.order_by('-amount_per_quintal', '-created_at').values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_page_param_falls_back_to_page_numbers(self):
+        response = self.client.get('/api/bids/', {'page': 2, 'page_size': 2})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class ExpansionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        self.listing = make_listing(self.farmer)
+        self.bid = make_bid(self.listing, self.buyer)
+        self.client.force_authenticate(self.buyer)
+
+    def get_bid(self, **params):
+        response = self.client.get('/api/bids/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['results'][0]
+
+    def test_relations_render_as_ids_by_default(self):
+        bid = self.get_bid()
+        self.assertEqual(bid['buyer'], self.buyer.pk)
+        self.assertEqual(bid['listing'], self.listing.pk)
+
+    def test_expand_follows_dotted_paths_and_users_stay_flat(self):
+        bid = self.get_bid(expand='buyer,listing.farmer')
+        self.assertEqual(bid['listing']['farmer']['id'], self.farmer.pk)
+        self.assertNotIn('farmer_profile', bid['listing']['farmer'])
+        self.assertNotIn('buyer_profile', bid['buyer'])
+
+        bid = self.get_bid(expand='buyer.buyer_profile')
+        self.assertEqual(bid['buyer']['buyer_profile']['company_name'], self.buyer.buyer_profile.company_name)
+
+    def test_profile_endpoint_keeps_the_profile(self):
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.data['buyer_profile']['gst_number'], self.buyer.buyer_profile.gst_number)
+        self.assertIsNone(response.data['farmer_profile'])
+
+    def test_fields_trim_at_every_depth(self):
+        bid = self.get_bid(expand='listing', fields='id,listing.id')
+        self.assertEqual(bid, {'id': self.bid.pk, 'listing': {'id': self.listing.pk}})
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.listing = make_listing(self.farmer)
+        self.client.force_authenticate(self.farmer)
+
+    def test_unchanged_list_answers_304_until_a_row_changes(self):
+        first = self.client.get('/api/listings/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        make_listing(self.farmer)
+        response = self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/api/listings/{self.listing.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        CropListing.objects.filter(pk=self.listing.pk).update(
+            updated_at=self.listing.updated_at + timedelta(seconds=5)
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+
+class ListingSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        basmati = make_variety('Pusa Basmati 1121', 3500)
+        self.basmati = make_listing(self.farmer, crop_variety=basmati, location_description='Cold store')
+        self.nearby = make_listing(self.farmer, location_description='Behind the basmati mandi')
+        self.other = make_listing(self.farmer, district='Panipat', location_description='Highway godown')
+        self.client.force_authenticate(make_buyer())
+
+    def search(self, terms, **params):
+        response = self.client.get('/api/listings/', {'search': terms, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefix_terms_rank_variety_matches_first(self):
+        self.assertEqual(self.search('basm'), [self.basmati.pk, self.nearby.pk])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('basmati store'), [self.basmati.pk])
+        self.assertEqual(self.search('panipat godown'), [self.other.pk])
+        self.assertEqual(self.search('panipat basmati'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.other.location_description = 'Basmati warehouse'
+        self.other.save()
+        self.assertIn(self.other.pk, self.search('basmati'))
+
+        self.basmati.delete()
+        self.assertNotIn(self.basmati.pk, self.search('basmati'))
+
+    def test_explicit_ordering_overrides_relevance(self):
+        self.assertEqual(self.search('basmati', ordering='created_at'), [self.basmati.pk, self.nearby.pk])
+        self.assertEqual(self.search('basmati', ordering='-created_at'), [self.nearby.pk, self.basmati.pk])
+
+
+class ProximityFilterTests(TestCase):
+    def setUp(self):
+        call_command('load_pincodes', stdout=StringIO())
+        self.client = APIClient()
+        farmer = make_farmer()
+        self.karnal = make_listing(farmer, pincode='132001')
+        self.panipat = make_listing(farmer, pincode='132103', district='Panipat')
+        self.amritsar = make_listing(farmer, pincode='143001', district='Amritsar', state='Punjab')
+        self.client.force_authenticate(make_buyer())
+
+    def near(self, **params):
+        return self.client.get('/api/listings/', params)
+
+    def test_radius_limits_and_orders_by_distance(self):
+        response = self.near(near='132103', radius_km=50)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.panipat.pk, self.karnal.pk])
+
+        response = self.near(near='132103', radius_km=10)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.panipat.pk])
+
+    def test_near_me_uses_the_buyer_pincode(self):
+        response = self.near(near='me', radius_km=10)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.karnal.pk])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'near': '999999'}, {'near': '132001', 'radius_km': 'far'},
+                       {'near': '132001', 'radius_km': 'nan'}, {'near': '132001', 'radius_km': 'inf'}):
+            with self.subTest(**params):
+                self.assertEqual(self.near(**params).status_code, 400)
+
+
+class AcceptBidTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.listing = make_listing(self.farmer)
+        self.bids = [make_bid(self.listing, make_buyer(), 2300 + i) for i in range(8)]
+
+    def test_parallel_accepts_create_one_order(self):
+        barrier = threading.Barrier(len(self.bids))
+        outcomes = []
+
+        def accept(bid):
+            try:
+                barrier.wait()
+                outcomes.append(services.accept_bid(bid, self.farmer)[1])
+            except (services.MarketError, OperationalError) as exc:
+                # SQLite serializes writers; a locked database is a lost race too
+                outcomes.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(bid,)) for bid in self.bids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count(True), 1, outcomes)
+        self.assertEqual(Order.objects.filter(listing=self.listing).count(), 1)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.status, CropListing.Status.SOLD)
+        self.assertEqual(self.listing.bids.filter(status='ACCEPTED').count(), 1)
+
+    def test_retry_with_idempotency_key_returns_original_order(self):
+        self.client.force_authenticate(self.farmer)
+        url = f'/api/bids/{self.bids[0].pk}/accept/'
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='accept-1')
+        retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY='accept-1')
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(retry.status_code, 200, retry.content)
+        self.assertEqual(retry.data['id'], first.data['id'])
+
+        other = self.client.post(f'/api/bids/{self.bids[1].pk}/accept/')
+        self.assertEqual(other.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_only_owner_and_winner_see_the_winning_bid(self):
+        winner, loser = self.bids[0], self.bids[1]
+        with mock.patch('market.events.get_broker') as get_broker:
+            services.accept_bid(winner, self.farmer)
+        sent = {topic: message for (topic, message), _ in get_broker().publish.call_args_list}
+
+        for topic in (f'farmer:{self.farmer.pk}', f'buyer:{winner.buyer_id}'):
+            self.assertEqual(sent[topic]['bid']['id'], winner.pk)
+        self.assertEqual(sent[f'buyer:{loser.buyer_id}'], {
+            'type': 'listing.sold', 'listing': self.listing.pk, 'status': 'SOLD', 'bid_lost': True,
+        })
+        self.assertNotIn('bid', sent[f'market:{self.listing.pk}'])
+
+
+class ListingExpiryTests(TestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.now = timezone.now()
+
+    def test_only_overdue_fixed_price_listings_expire(self):
+        overdue = [make_listing(self.farmer, expires_at=self.now - timedelta(hours=h)) for h in (1, 2, 3)]
+        current = make_listing(self.farmer)
+        auction = make_listing(self.farmer, is_auction=True, expires_at=self.now - timedelta(hours=1))
+        sold = make_listing(self.farmer, status=CropListing.Status.SOLD, expires_at=self.now - timedelta(hours=1))
+
+        self.assertEqual(expire_listings(batch_size=2, now=self.now), 3)
+        self.assertEqual(expire_listings(batch_size=2, now=self.now), 0)
+
+        statuses = dict(CropListing.objects.values_list('pk', 'status'))
+        for listing in overdue:
+            self.assertEqual(statuses[listing.pk], CropListing.Status.EXPIRED)
+        self.assertEqual(statuses[current.pk], CropListing.Status.ACTIVE)
+        self.assertEqual(statuses[auction.pk], CropListing.Status.ACTIVE)
+        self.assertEqual(statuses[sold.pk], CropListing.Status.SOLD)
+
+    def test_command_reports_the_sweep(self):
+        make_listing(self.farmer, expires_at=self.now - timedelta(hours=1))
+        out = StringIO()
+        call_command('expire_listings', '--batch-size', '1', stdout=out)
+        self.assertIn('Expired 1 listings', out.getvalue())
+
+
+class AuctionCloseTests(TestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+
+    def make_due_auction(self, reserve=None):
+        listing = make_listing(self.farmer, is_auction=True, reserve_price_per_quintal=reserve)
+        CropListing.objects.filter(pk=listing.pk).update(expires_at=timezone.now())
+        return listing
+
+    def test_highest_bid_above_reserve_wins(self):
+        listing = self.make_due_auction(reserve=2400)
+        low = make_bid(listing, make_buyer(), 2350)
+        high = make_bid(listing, make_buyer(), 2500)
+        unsold = self.make_due_auction(reserve=2400)
+        make_bid(unsold, make_buyer(), 2350)
+
+        self.assertEqual(expire_listings(), 0)
+        self.assertEqual(close_due_auctions(batch_size=1), (1, 1))
+        self.assertEqual(close_due_auctions(), (0, 0))
+
+        order = Order.objects.get()
+        self.assertEqual((order.listing_id, order.bid_id), (listing.pk, high.pk))
+        self.assertTrue(hasattr(order, 'shipment'))
+        low.refresh_from_db()
+        self.assertEqual(low.status, Bid.Status.REJECTED)
+        unsold.refresh_from_db()
+        self.assertEqual(unsold.status, CropListing.Status.EXPIRED)
+
+
+class MatchingTests(TestCase):
+    def setUp(self):
+        matching.get_engine().reset()
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.variety = make_variety()
+
+    def buy(self, quantity, price, buyer=None, **extra):
+        buyer = buyer or make_buyer()
+        self.client.force_authenticate(buyer)
+        response = self.client.post('/api/buy-orders/', {
+            'crop_variety_id': self.variety.pk, 'quantity_quintals': quantity,
+            'max_price_per_quintal': price, **extra
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return BuyOrder.objects.get(pk=response.data['id'])
+
+    def sell(self, quantity, price, **extra):
+        listing = make_listing(
+            self.farmer, crop_variety=self.variety, quantity_quintals=quantity,
+            expected_price_per_quintal=price, auto_match=True, **extra
+        )
+        return listing, matching.get_engine().submit_listing(listing)
+
+    def test_listing_fills_best_buy_orders_in_parts(self):
+        first = self.buy(40, 2400)
+        second = self.buy(70, 2350)
+        self.buy(100, 2500, districts=['Ambala'])
+        self.buy(100, 2200)
+
+        listing, orders = self.sell(100, 2300)
+
+        self.assertEqual(
+            sorted((o.buyer_id, o.final_amount) for o in orders),
+            sorted([(first.buyer_id, 96000), (second.buyer_id, 141000)])
+        )
+        self.assertEqual(listing.status, CropListing.Status.SOLD)
+        self.assertEqual(Order.objects.filter(listing=listing).count(), 2)
+        second.refresh_from_db()
+        self.assertEqual((second.remaining_quintals, second.status), (10, BuyOrder.Status.OPEN))
+        first.refresh_from_db()
+        self.assertEqual(first.status, BuyOrder.Status.FILLED)
+
+    def test_buy_order_fills_from_resting_listings_at_their_price(self):
+        listing, orders = self.sell(30, 2250)
+        self.assertEqual(orders, [])
+
+        buy_order = self.buy(50, 2400)
+
+        bid = Bid.objects.get(listing=listing)
+        self.assertEqual((bid.quantity_quintals, bid.amount_per_quintal), (30, 2250))
+        self.assertEqual(bid.order.final_amount, 67500)
+        buy_order.refresh_from_db()
+        self.assertEqual(buy_order.remaining_quintals, 20)
+
+    def test_stale_book_is_reloaded(self):
+        buy_order = self.buy(50, 2400)
+        self.sell(10, 2300)
+        # Another worker fills the order behind this engine's back
+        BuyOrder.objects.filter(pk=buy_order.pk).update(status=BuyOrder.Status.FILLED)
+
+        listing, orders = self.sell(10, 2300)
+
+        self.assertEqual(orders, [])
+        self.assertEqual(listing.status, CropListing.Status.ACTIVE)
+
+    def test_repriced_listing_is_matched_at_its_new_price(self):
+        listing, _ = self.sell(10, 2000)
+        self.client.force_authenticate(self.farmer)
+        response = self.client.patch(
+            f'/api/listings/{listing.pk}/', {'expected_price_per_quintal': '3000'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.buy(10, 2500)
+        self.assertFalse(Order.objects.exists())
+        buy_order = self.buy(10, 3100)
+        self.assertEqual(Order.objects.get().final_amount, 30000)
+        self.assertEqual(Order.objects.get().buyer_id, buy_order.buyer_id)
+
+    def test_repricing_does_not_fill_a_buyer_twice(self):
+        listing, _ = self.sell(10, 2200)
+        buyer = make_buyer()
+        self.buy(4, 2300, buyer=buyer)
+        resting = self.buy(3, 2100, buyer=buyer)
+
+        self.client.force_authenticate(self.farmer)
+        response = self.client.patch(
+            f'/api/listings/{listing.pk}/', {'expected_price_per_quintal': '2000'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        bid = Bid.objects.get(listing=listing, buyer=buyer)
+        self.assertEqual((bid.status, bid.quantity_quintals, bid.total_amount), (Bid.Status.ACCEPTED, 4, 8800))
+        self.assertEqual(Order.objects.get().bid, bid)
+        resting.refresh_from_db()
+        self.assertEqual((resting.status, resting.remaining_quintals), (BuyOrder.Status.OPEN, 3))
+
+    def test_failed_rematch_keeps_the_old_price(self):
+        listing, _ = self.sell(10, 2200)
+        self.buy(3, 2100)
+        self.client.force_authenticate(self.farmer)
+        with mock.patch('market.matching.persist_fills', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(
+                    f'/api/listings/{listing.pk}/', {'expected_price_per_quintal': '2000'}, format='json'
+                )
+        listing.refresh_from_db()
+        self.assertEqual(listing.expected_price_per_quintal, 2200)
+
+    def test_books_catch_up_with_other_workers(self):
+        self.buy(10, 1500)  # loads this worker's book
+        listing = make_listing(
+            self.farmer, crop_variety=self.variety, quantity_quintals=10,
+            expected_price_per_quintal=2000, auto_match=True,
+        )
+        # Posted through another process, whose engine rests it in its own book
+        self.assertEqual(matching.MatchingEngine().submit_listing(listing), [])
+
+        buy_order = self.buy(10, 2100)
+
+        self.assertEqual(Order.objects.get().buyer_id, buy_order.buyer_id)
+        listing.refresh_from_db()
+        self.assertEqual(listing.status, CropListing.Status.SOLD)
+
+    def test_fills_recheck_the_database_price(self):
+        listing, _ = self.sell(10, 2000)
+        # Repriced by another worker whose edit this book never saw
+        CropListing.objects.filter(pk=listing.pk).update(expected_price_per_quintal=3000)
+
+        self.buy(10, 2500)
+
+        self.assertFalse(Order.objects.exists())
+        listing.refresh_from_db()
+        self.assertEqual(listing.matched_quintals, 0)
+
+    def test_partly_filled_listing_cannot_be_accepted_whole(self):
+        listing, _ = self.sell(10, 2000)
+        filled = self.buy(4, 2000)
+        bid = make_bid(listing, make_buyer(), 2100)
+
+        self.client.force_authenticate(self.farmer)
+        response = self.client.post(f'/api/bids/{bid.pk}/accept/')
+
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(Order.objects.get().buyer_id, filled.buyer_id)
+
+        response = self.client.patch(f'/api/listings/{listing.pk}/', {'quantity_quintals': '3'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_filled_bid_cannot_be_rebid(self):
+        listing, _ = self.sell(10, 2000)
+        buy_order = self.buy(4, 2000)
+
+        response = self.client.post('/api/bids/', {
+            'listing_id': listing.pk, 'amount_per_quintal': '2500'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        bid = Bid.objects.get(buyer_id=buy_order.buyer_id)
+        self.assertEqual((bid.status, bid.total_amount), (Bid.Status.ACCEPTED, 8000))
+
+    def test_fill_bid_total_covers_its_own_quantity(self):
+        bid = Bid.objects.create(
+            listing=make_listing(self.farmer), buyer=make_buyer(),
+            amount_per_quintal=2000, quantity_quintals=4,
+        )
+        self.assertEqual(bid.total_amount, 8000)
+
+
+class SavedSearchTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        self.client.force_authenticate(self.buyer)
+
+    def test_new_listings_land_in_matching_inboxes(self):
+        variety = make_variety()
+        wanted = SavedSearch.objects.create(
+            buyer=self.buyer, name='Karnal IR 64', crop_variety=variety,
+            state='Haryana', max_price_per_quintal=2300, max_moisture_content=14,
+        )
+        SavedSearch.objects.create(buyer=self.buyer, name='Punjab', state='Punjab')
+        SavedSearch.objects.create(buyer=make_buyer(), name='Cheap', max_price_per_quintal=2000)
+
+        hit = make_listing(self.farmer, crop_variety=variety, moisture_content=13)
+        make_listing(self.farmer, crop_variety=variety, moisture_content=15)
+        make_listing(self.farmer, crop_variety=variety, expected_price_per_quintal=2400)
+
+        response = self.client.get('/api/inbox/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(m['saved_search'], m['listing']) for m in response.data['results']],
+            [(wanted.pk, hit.pk)]
+        )
+
+        response = self.client.post('/api/inbox/seen/')
+        self.assertEqual(response.data['marked'], 1)
+        response = self.client.get('/api/inbox/', {'unseen': 'true'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_seen_marks_only_the_given_ids(self):
+        SavedSearch.objects.create(buyer=self.buyer, name='Anything')
+        first, second = make_listing(self.farmer), make_listing(self.farmer)
+        match = self.buyer.search_matches.get(listing=first)
+
+        response = self.client.post('/api/inbox/seen/', {'ids': [match.pk]}, format='json')
+        self.assertEqual(response.data['marked'], 1)
+        response = self.client.get('/api/inbox/', {'unseen': 'true'})
+        self.assertEqual([m['listing'] for m in response.data['results']], [second.pk])
+
+    def test_seen_rejects_malformed_ids(self):
+        for ids in ('1', [1, 'x'], {'a': 1}, None):
+            with self.subTest(ids=ids):
+                response = self.client.post('/api/inbox/seen/', {'ids': ids}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_inbox_query_count(self):
+        SavedSearch.objects.create(buyer=self.buyer, name='Anything')
+        self.assertQueryCountConstant(
+            '/api/inbox/', lambda n: [make_listing(self.farmer) for _ in range(n)],
+            expand='listing.crop_variety,saved_search'
+        )
+
+
+class RecommendationTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        self.client.force_authenticate(self.buyer)
+
+    def recommended(self):
+        response = self.client.get('/api/listings/recommended/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [listing['id'] for listing in response.data['results']]
+
+    def test_nearby_familiar_varieties_rank_first(self):
+        usual = make_variety('IR 64')
+        other = make_variety('Swarna')
+        services.accept_bid(make_bid(make_listing(self.farmer, crop_variety=usual), self.buyer), self.farmer)
+
+        far = make_listing(self.farmer, crop_variety=usual, state='Odisha', district='Cuttack')
+        unfamiliar = make_listing(self.farmer, crop_variety=other)
+        best = make_listing(self.farmer, crop_variety=usual)
+        pricey = make_listing(self.farmer, crop_variety=usual, expected_price_per_quintal=2900)
+        recommendations.queue_listings([far.pk, unfamiliar.pk, best.pk, pricey.pk])
+        self.assertEqual(recommendations.process_queue(), 5)
+
+        ranked = self.recommended()
+        self.assertEqual(ranked[:2], [best.pk, pricey.pk])
+        self.assertCountEqual(ranked[2:], [unfamiliar.pk, far.pk])
+
+    def test_only_top_n_are_kept(self):
+        with self.settings(RECOMMENDATIONS_PER_BUYER=2):
+            for listing in [make_listing(self.farmer) for _ in range(4)]:
+                recommendations.add_listing(listing)
+            self.assertEqual(len(self.recommended()), 2)
+
+            recommendations.add_listings([make_listing(self.farmer).pk for _ in range(3)])
+            self.assertEqual(len(self.recommended()), 2)
+
+    def test_new_listings_are_queued_not_scored_in_the_request(self):
+        self.client.force_authenticate(self.farmer)
+        response = self.client.post('/api/listings/', {
+            'crop_variety_id': make_variety().pk, 'quantity_quintals': '10',
+            'expected_price_per_quintal': '2200', 'location_description': 'Near the grain market',
+            'district': 'Karnal', 'state': 'Haryana',
+            'expires_at': (timezone.now() + timedelta(days=3)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.recommended(), [])
+
+        out = StringIO()
+        call_command('process_recommendations', stdout=out)
+        self.assertIn('Processed 1 recommendation tasks', out.getvalue())
+        self.assertEqual(self.recommended(), [response.data['id']])
+
+    def test_recommended_query_count(self):
+        def add_rows(n):
+            for _ in range(n):
+                recommendations.add_listing(make_listing(self.farmer))
+
+        self.assertQueryCountConstant('/api/listings/recommended/', add_rows, expand='crop_variety')
+
+
+class ListingImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+
+    def photo(self, size=(3000, 2000)):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'  # Make
+        buffer = BytesIO()
+        Image.new('RGB', size, 'green').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('field.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def create(self, **files):
+        return self.client.post('/api/listings/', {
+            'crop_variety_id': make_variety().pk, 'quantity_quintals': '10',
+            'expected_price_per_quintal': '2200', 'location_description': 'Farm gate',
+            'district': 'Karnal', 'state': 'Haryana',
+            'expires_at': (timezone.now() + timedelta(days=3)).isoformat(), **files
+        }, format='multipart')
+
+    def test_upload_is_sanitized_and_variants_are_rendered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create(image1=self.photo())
+        self.assertEqual(response.status_code, 201, response.content)
+
+        listing = CropListing.objects.get(pk=response.data['id'])
+        with listing.image1.open('rb') as handle:
+            stored = Image.open(handle)
+            self.assertEqual(max(stored.size), 2048)
+            self.assertEqual(dict(stored.getexif()), {})
+        self.assertEqual(set(listing.image_variants['image1']), {'source', 'thumb', 'medium'})
+
+        urls = self.client.get(f'/api/listings/{listing.pk}/').data['images']['image1']
+        self.assertTrue(urls['thumb'].endswith('.webp'))
+        self.assertIn(' 320w, ', urls['srcset'])
+
+    def test_oversized_upload_is_rejected(self):
+        with self.settings(LISTING_IMAGE_MAX_BYTES=1024):
+            response = self.create(image1=self.photo())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image1', response.data)
+
+    def test_too_many_pixels_are_rejected_before_decoding(self):
+        with self.settings(LISTING_IMAGE_MAX_PIXELS=5_000_000), \
+                mock.patch.object(Image.Image, 'convert') as convert:
+            response = self.create(image1=self.photo())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('megapixels', str(response.data['image1']))
+        convert.assert_not_called()
+
+    def test_decompression_bomb_is_a_validation_error(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.create(image1=self.photo())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image1', response.data)
+
+    def test_large_jpegs_are_decoded_at_reduced_scale(self):
+        with self.settings(LISTING_IMAGE_MAX_DIMENSION=500), \
+                mock.patch.object(JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft) as draft:
+            response = self.create(image1=self.photo())
+        self.assertEqual(response.status_code, 201, response.content)
+        draft.assert_called_once_with(mock.ANY, 'RGB', (500, 500))
+        with CropListing.objects.get(pk=response.data['id']).image1.open('rb') as handle:
+            self.assertEqual(Image.open(handle).size, (500, 333))
+
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = make_buyer()
+        self.listing = make_listing(make_farmer())
+        self.client.force_authenticate(self.buyer)
+
+    def bid(self, amount):
+        return self.client.post('/api/bids/', {
+            'listing_id': self.listing.pk, 'amount_per_quintal': amount
+        }, format='json')
+
+    def test_rebid_raises_existing_bid_and_records_revision(self):
+        first = self.bid('2300')
+        second = self.bid('2450')
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(second.status_code, 200, second.content)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['total_amount'], '24500.00')
+        bid = Bid.objects.get()
+        self.assertEqual(list(bid.revisions.values_list('amount_per_quintal', flat=True)), [2300])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bids_count, 1)
+        self.assertEqual(self.listing.highest_bid_amount, 2450)
+
+    def test_rebid_must_beat_the_current_bid(self):
+        self.bid('2300')
+        for amount in ('2300', '2250'):
+            response = self.bid(amount)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('current bid of 2300', response.data['error'])
+        bid = Bid.objects.get()
+        self.assertEqual(bid.amount_per_quintal, 2300)
+        self.assertFalse(bid.revisions.exists())
+
+    def test_bids_cannot_be_edited_directly(self):
+        bid_id = self.bid('2300').data['id']
+        for method in ('put', 'patch', 'delete'):
+            response = getattr(self.client, method)(
+                f'/api/bids/{bid_id}/', {'amount_per_quintal': '2000', 'status': 'ACCEPTED'}, format='json'
+            )
+            self.assertEqual(response.status_code, 405)
+        bid = Bid.objects.get()
+        self.assertEqual((bid.amount_per_quintal, bid.status), (2300, Bid.Status.PENDING))
+
+
+class BulkBidTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.farmer = make_farmer()
+        self.buyer = make_buyer()
+        self.client.force_authenticate(self.buyer)
+
+    def test_bulk_creates_raises_and_reports_per_item(self):
+        listings = [make_listing(self.farmer) for _ in range(3)]
+        make_bid(listings[0], self.buyer, 2300)
+        listings[2].status = CropListing.Status.SOLD
+        listings[2].save()
+
+        response = self.client.post('/api/bids/bulk/', {'bids': [
+            {'listing_id': listings[0].pk, 'amount_per_quintal': '2400'},
+            {'listing_id': listings[1].pk, 'amount_per_quintal': '2350'},
+            {'listing_id': listings[2].pk, 'amount_per_quintal': '2350'},
+            {'listing_id': 999999, 'amount_per_quintal': '2350'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, ['updated', 'created', 'error', 'error'])
+        raised = Bid.objects.get(listing=listings[0], buyer=self.buyer)
+        self.assertEqual(raised.total_amount, 24000)
+        self.assertEqual(response.data['results'][0]['bid'], raised.pk)
+        listings[0].refresh_from_db()
+        self.assertEqual(listings[0].highest_bid_amount, 2400)
+
+    def test_bulk_handles_a_full_batch_in_set_based_queries(self):
+        listings = [make_listing(self.farmer) for _ in range(500)]
+        payload = {'bids': [
+            {'listing_id': listing.pk, 'amount_per_quintal': '2300'} for listing in listings
+        ]}
+
+        # Listings, savepoint, existing bids, the upsert (split into 5 batches
+        # by SQLite's parameter limit), bid stats, stream summaries, release
+        with self.assertNumQueries(11):
+            response = self.client.post('/api/bids/bulk/', payload, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['created'], 500)
+        self.assertEqual(Bid.objects.filter(buyer=self.buyer).count(), 500)
+
+    def test_bulk_rejects_non_positive_amounts(self):
+        listing = make_listing(self.farmer)
+        for amount in ('0', '-5'):
+            response = self.client.post('/api/bids/bulk/', {'bids': [
+                {'listing_id': listing.pk, 'amount_per_quintal': amount}
+            ]}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_bulk_rejects_oversized_batches(self):
+        payload = {'bids': [{'listing_id': i, 'amount_per_quintal': '1'} for i in range(501)]}
+        response = self.client.post('/api/bids/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BidStreamTests(TransactionTestCase):
+    def open_stream(self, user, path=SSE_PATH, query=''):
+        token = str(AccessToken.for_user(user))
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': f'token={token}{query}'.encode(), 'headers': [],
+        }
+        return ApplicationCommunicator(application, scope)
+
+    async def test_farmer_receives_new_bids_on_their_listings(self):
+        farmer = await sync_to_async(make_farmer)()
+        buyer = await sync_to_async(make_buyer)()
+        listing = await sync_to_async(make_listing)(farmer)
+
+        stream = self.open_stream(farmer)
+        await stream.send_input({'type': 'http.request'})
+        start = await stream.receive_output(timeout=5)
+        self.assertEqual(start['status'], 200)
+        await stream.receive_output(timeout=1)  # retry hint
+
+        await sync_to_async(make_bid)(listing, buyer, 2450)
+        event = await stream.receive_output(timeout=5)
+        self.assertIn(b'event: bid.created', event['body'])
+        self.assertIn(b'"amount_per_quintal": "2450.00"', event['body'])
+
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(timeout=5)
+
+    async def test_buyers_following_a_listing_only_see_the_summary(self):
+        listing = await sync_to_async(make_listing)(await sync_to_async(make_farmer)())
+        watcher = await sync_to_async(make_buyer)()
+        rival = await sync_to_async(make_buyer)()
+
+        stream = self.open_stream(watcher, query=f'&listing={listing.pk}')
+        await stream.send_input({'type': 'http.request'})
+        self.assertEqual((await stream.receive_output(timeout=5))['status'], 200)
+        await stream.receive_output(timeout=1)  # retry hint
+
+        await sync_to_async(make_bid)(listing, rival, 2450)
+        event = await stream.receive_output(timeout=5)
+        self.assertIn(b'event: bid.created', event['body'])
+        self.assertIn(b'"bids_count": 1, "highest_bid_amount": "2450.00"', event['body'])
+        self.assertNotIn(b'"buyer"', event['body'])
+
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(timeout=5)
+
+    async def test_invalid_token_is_rejected(self):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': SSE_PATH,
+            'query_string': b'token=bogus', 'headers': [],
+        }
+        stream = ApplicationCommunicator(application, scope)
+        await stream.send_input({'type': 'http.request'})
+        start = await stream.receive_output(timeout=5)
+        self.assertEqual(start['status'], 403)
@@ -1,11 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CropListingViewSet, BidViewSet, OrderViewSet
+from .views import (
+    CropListingViewSet, BidViewSet, BuyOrderViewSet, OrderViewSet, SavedSearchViewSet, InboxViewSet
+)
 
 router = DefaultRouter()
 router.register(r'listings', CropListingViewSet, basename='listing')
 router.register(r'bids', BidViewSet, basename='bid')
+router.register(r'buy-orders', BuyOrderViewSet, basename='buy-order')
 router.register(r'orders', OrderViewSet, basename='order')
+router.register(r'saved-searches', SavedSearchViewSet, basename='saved-search')
+router.register(r'inbox', InboxViewSet, basename='inbox')
 
 urlpatterns = [
     path('', include(router.urls)),
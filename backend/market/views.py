@@ -1,21 +1,37 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.utils import timezone
-from django.apps import apps
-from .models import CropListing, Bid, Order
-from .serializers import CropListingSerializer, BidSerializer, OrderSerializer
+from core.conditional import ConditionalGetMixin
+from core.expansion import EagerLoadingMixin
+from core.pagination import KeysetPagination
+from . import matching, recommendations, services
+from .filters import ListingSearchFilter, ListingProximityFilter
+from .models import CropListing, Bid, BuyOrder, Order, SavedSearch, SavedSearchMatch
+from .serializers import (
+    CropListingSerializer, BidSerializer, BulkBidSerializer, BuyOrderSerializer, InboxSeenSerializer,
+    OrderSerializer, SavedSearchSerializer, SavedSearchMatchSerializer
+)
 
 
-class CropListingViewSet(viewsets.ModelViewSet):
+class CropListingViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     """CRUD for crop listings - Farmers only create, all authenticated users can view"""
     queryset = CropListing.objects.all()
     serializer_class = CropListingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ListingSearchFilter, ListingProximityFilter]
     filterset_fields = ['status', 'state', 'district', 'crop_variety']
     search_fields = ['location_description', 'district', 'state']
+    # Relevance- and distance-ranked results are paged by page number, not by cursor
+    ranked_query_params = ['search', 'near']
     ordering_fields = ['created_at', 'expected_price_per_quintal', 'quantity_quintals']
+    ordering = ['-created_at']
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -30,7 +46,30 @@ class CropListingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         if self.request.user.role != 'FARMER':
             raise PermissionError("Only farmers can create listings")
-        serializer.save(farmer=self.request.user)
+        listing = serializer.save(farmer=self.request.user)
+        matching.get_engine().submit_listing(listing)
+        recommendations.queue_listings([listing.pk])
+    
+    def perform_update(self, serializer):
+        if serializer.instance.farmer_id != self.request.user.pk:
+            raise PermissionDenied('Only the listing owner can edit it')
+        previous_variety_id = serializer.instance.crop_variety_id
+        # An edit that cannot be re-matched is not kept either
+        with transaction.atomic():
+            listing = serializer.save()
+            # Re-price the resting book entry so buy orders match the new terms
+            matching.get_engine().update_listing(listing, previous_variety_id)
+    
+    @action(detail=False)
+    def recommended(self, request):
+        """The buyer's precomputed top listings, best first"""
+        if request.user.role != 'BUYER':
+            return Response({'error': 'Only buyers get recommendations'}, status=status.HTTP_403_FORBIDDEN)
+        queryset = self.get_queryset().filter(
+            recommendations__buyer=request.user
+        ).order_by('-recommendations__score')
+        # Same envelope as the paginated feeds; the table already caps the length
+        return Response({'results': self.get_serializer(queryset, many=True).data})
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -43,16 +82,21 @@ class CropListingViewSet(viewsets.ModelViewSet):
             )
         listing.status = 'CANCELLED'
         listing.save()
+        matching.get_engine().cancel_listing(listing)
         return Response({'status': 'listing cancelled'})
 
 
-class BidViewSet(viewsets.ModelViewSet):
+class BidViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     """Buyers create bids, farmers view bids on their listings"""
     queryset = Bid.objects.all()
     serializer_class = BidSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Bids only change through place_bids (re-bid) and accept_bid
+    http_method_names = ['get', 'post', 'head', 'options']
     filterset_fields = ['status', 'listing']
     ordering_fields = ['created_at', 'amount_per_quintal']
+    ordering = ['-amount_per_quintal', '-created_at']
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -66,70 +110,156 @@ class BidViewSet(viewsets.ModelViewSet):
             return queryset.filter(listing__farmer=user)
         return queryset.none()
     
-    def perform_create(self, serializer):
-        if self.request.user.role != 'BUYER':
-            raise PermissionError("Only buyers can create bids")
-        serializer.save(buyer=self.request.user)
-    
-    @action(detail=True, methods=['post'])
-    def accept(self, request, pk=None):
-        """Farmer accepts a bid and creates an order"""
-        bid = self.get_object()
+    def create(self, request, *args, **kwargs):
+        """Place a bid, or raise the buyer's existing bid on the same listing"""
+        if request.user.role != 'BUYER':
+            return Response({'error': 'Only buyers can place bids'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if farmer owns the listing
-        if bid.listing.farmer != request.user:
-            return Response(
-                {'error': 'Only the listing owner can accept bids'},
-                status=status.HTTP_403_FORBIDDEN
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            bid, created = services.place_bid(
+                request.user,
+                serializer.validated_data['listing'].pk,
+                serializer.validated_data['amount_per_quintal']
             )
+        except services.MarketError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
         
-        # Check if listing is still active
-        if bid.listing.status != 'ACTIVE':
-            return Response(
-                {'error': 'Listing is not active'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            self.get_serializer(bid).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Buyer places or raises bids on many listings in one request"""
+        if request.user.role != 'BUYER':
+            return Response({'error': 'Only buyers can place bids'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Accept the bid
-        bid.status = 'ACCEPTED'
-        bid.save()
+        serializer = BulkBidSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = services.place_bids(request.user, serializer.validated_data['bids'])
         
-        # Mark listing as sold
-        bid.listing.status = 'SOLD'
-        bid.listing.save()
+        return Response({
+            'created': sum(r['status'] == services.BID_CREATED for r in results),
+            'updated': sum(r['status'] == services.BID_UPDATED for r in results),
+            'failed': sum(r['status'] == services.BID_FAILED for r in results),
+            'results': results,
+        })
+    
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        """Farmer accepts a bid and creates an order"""
+        bid = self.get_object()
+        idempotency_key = request.headers.get('Idempotency-Key', '')[:64]
         
-        # Reject all other bids
-        Bid.objects.filter(
-            listing=bid.listing
-        ).exclude(id=bid.id).update(status='REJECTED')
+        try:
+            order, created = services.accept_bid(bid, request.user, idempotency_key)
+        except services.MarketError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
         
-        # Create order
-        order = Order.objects.create(
-            listing=bid.listing,
-            buyer=bid.buyer,
-            farmer=bid.listing.farmer,
-            bid=bid,
-            final_amount=bid.total_amount
+        return Response(
+            OrderSerializer(order, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
         )
-        
-        # Create shipment (auto-create for MVP)
-        from datetime import timedelta
-        Shipment = apps.get_model('logistics', 'Shipment')
-        Shipment.objects.create(
-            order=order,
-            pickup_date=timezone.now().date() + timedelta(days=3)
+
+
+class BuyOrderViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    """Buyers' standing buy orders, filled automatically from matching listings"""
+    queryset = BuyOrder.objects.all()
+    serializer_class = BuyOrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    http_method_names = ['get', 'post', 'head', 'options']
+    filterset_fields = ['status', 'crop_variety']
+    ordering_fields = ['created_at', 'max_price_per_quintal']
+    ordering = ['-created_at']
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(buyer=self.request.user)
+    
+    def create(self, request, *args, **kwargs):
+        if request.user.role != 'BUYER':
+            return Response({'error': 'Only buyers can place buy orders'}, status=status.HTTP_403_FORBIDDEN)
+        return super().create(request, *args, **kwargs)
+    
+    def perform_create(self, serializer):
+        buy_order = serializer.save(
+            buyer=self.request.user,
+            remaining_quintals=serializer.validated_data['quantity_quintals']
         )
-        
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        matching.get_engine().submit_buy_order(buy_order)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel the unfilled part of a buy order"""
+        buy_order = self.get_object()
+        cancelled = BuyOrder.objects.filter(
+            pk=buy_order.pk, status=BuyOrder.Status.OPEN
+        ).update(status=BuyOrder.Status.CANCELLED, updated_at=timezone.now())
+        if not cancelled:
+            return Response({'error': 'Buy order is not open'}, status=status.HTTP_400_BAD_REQUEST)
+        matching.get_engine().cancel_buy_order(buy_order)
+        return Response({'status': 'buy order cancelled'})
+
+
+class SavedSearchViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
+    """Buyers' saved listing searches"""
+    queryset = SavedSearch.objects.all()
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(buyer=self.request.user)
+    
+    def create(self, request, *args, **kwargs):
+        if request.user.role != 'BUYER':
+            return Response({'error': 'Only buyers can save searches'}, status=status.HTTP_403_FORBIDDEN)
+        return super().create(request, *args, **kwargs)
+    
+    def perform_create(self, serializer):
+        serializer.save(buyer=self.request.user)
+
+
+class InboxViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
+    """New listings that matched the buyer's saved searches; ?unseen=true for unread only"""
+    queryset = SavedSearchMatch.objects.all()
+    serializer_class = SavedSearchMatchSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filterset_fields = ['saved_search']
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(buyer=self.request.user)
+        if self.request.query_params.get('unseen') in ('1', 'true'):
+            queryset = queryset.filter(seen_at__isnull=True)
+        return queryset
+    
+    @action(detail=False, methods=['post'])
+    def seen(self, request):
+        """Mark inbox entries as seen (all of them unless ids are given)"""
+        serializer = InboxSeenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        matches = self.get_queryset().filter(seen_at__isnull=True)
+        if 'ids' in serializer.validated_data:
+            matches = matches.filter(pk__in=serializer.validated_data['ids'])
+        now = timezone.now()
+        marked = matches.update(seen_at=now, updated_at=now)
+        return Response({'marked': marked})
 
 
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """View orders - farmers see sales, buyers see purchases"""
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_fields = ['payment_status', 'order_status']
     ordering_fields = ['created_at']
+    ordering = ['-created_at']
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import UploadSession, StoredBlob
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'target', 'object_id', 'filename', 'offset', 'size',
+                    'status', 'created_at', 'expires_at']
+    list_filter = ['status', 'target']
+    search_fields = ['user__username', 'filename']
+    list_select_related = ['user']
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'size', 'ref_count', 'created_at', 'updated_at']
+    search_fields = ['digest', 'name']
@@ -0,0 +1,100 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from uploads.models import StoredBlob
+from uploads.storage import BLOB_DIR, blob_name, file_fields, hash_file
+
+
+class Command(BaseCommand):
+    """
+    Files are hard-linked (or copied) into ``blobs/`` first, references are
+    rewritten in one transaction, and the originals are only removed after
+    it commits. An interrupted run leaves every row pointing at a file that
+    exists; just run it again.
+    """
+    help = 'One-time move of existing MEDIA_ROOT files into content-addressed blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        dry_run = options['dry_run']
+        renames = {}
+        targets = set()
+        originals = []
+        saved = 0
+
+        for directory, subdirs, files in os.walk(root):
+            relative_dir = os.path.relpath(directory, root)
+            if relative_dir == BLOB_DIR or relative_dir.startswith(BLOB_DIR + os.sep):
+                subdirs[:] = []
+                continue
+            for filename in files:
+                path = os.path.join(directory, filename)
+                old_name = os.path.relpath(path, root).replace(os.sep, '/')
+                digest = hash_file(path)
+                new_name = blob_name(digest, os.path.splitext(filename)[1])
+                new_path = os.path.join(root, new_name)
+                size = os.path.getsize(path)
+                if new_name in targets or os.path.exists(new_path):
+                    saved += size
+                renames[old_name] = new_name
+                targets.add(new_name)
+                if dry_run:
+                    continue
+                if not os.path.exists(new_path):
+                    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                    self.link(path, new_path)
+                originals.append(path)
+                StoredBlob.objects.get_or_create(digest=digest, defaults={'name': new_name, 'size': size})
+
+        updated = 0
+        if not dry_run:
+            updated = self.rewrite_references(renames)
+            # Only now that no row points at them
+            for path in originals:
+                os.remove(path)
+            self.remove_empty_dirs(root)
+
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(renames)} files into {len(set(renames.values()))} blobs '
+            f'({saved / (1024 * 1024):.1f} MB of duplicates); {updated} rows updated'
+        ))
+
+    def link(self, path, new_path):
+        try:
+            os.link(path, new_path)
+        except OSError:
+            # Different filesystem, or links not supported
+            shutil.copy2(path, new_path)
+
+    def rewrite_references(self, renames):
+        updated = 0
+        with transaction.atomic():
+            for model, names in file_fields():
+                for name in names:
+                    for row in model._base_manager.filter(**{f'{name}__in': list(renames)}).values('pk', name):
+                        updated += model._base_manager.filter(pk=row['pk']).update(**{name: renames[row[name]]})
+            # Listing image variants are stored as plain paths in JSON
+            from market.models import CropListing
+            listings = []
+            for listing in CropListing._base_manager.exclude(image_variants={}).only('id', 'image_variants'):
+                variants = {
+                    field: {key: renames.get(value, value) for key, value in entry.items()}
+                    for field, entry in listing.image_variants.items()
+                }
+                if variants != listing.image_variants:
+                    listing.image_variants = variants
+                    listings.append(listing)
+            CropListing._base_manager.bulk_update(listings, ['image_variants'], batch_size=500)
+        return updated + len(listings)
+
+    def remove_empty_dirs(self, root):
+        for directory, subdirs, files in os.walk(root, topdown=False):
+            if directory != root and not os.listdir(directory):
+                os.rmdir(directory)
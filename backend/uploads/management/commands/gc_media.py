@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from uploads.models import StoredBlob
+from uploads.storage import ContentAddressedStorage, count_references, is_referenced
+
+
+class Command(BaseCommand):
+    help = 'Recount references to stored blobs and delete the unreferenced ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int, default=24,
+            help='Keep unreferenced blobs younger than this (uploads not yet attached)'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        references = count_references()
+
+        changed = []
+        for blob in StoredBlob.objects.only('id', 'name', 'ref_count').iterator(chunk_size=2000):
+            count = references.get(blob.name, 0)
+            if blob.ref_count != count:
+                blob.ref_count = count
+                changed.append(blob)
+        if not options['dry_run']:
+            StoredBlob.objects.bulk_update(changed, ['ref_count'], batch_size=1000)
+
+        # updated_at is bumped whenever an upload reuses a blob
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        garbage = StoredBlob.objects.filter(ref_count=0, updated_at__lt=cutoff)
+        if options['dry_run']:
+            garbage = [b for b in StoredBlob.objects.filter(updated_at__lt=cutoff) if not references.get(b.name)]
+        freed = deleted = 0
+        for blob in list(garbage):
+            if not options['dry_run'] and not self.collect(blob, cutoff):
+                continue
+            freed += blob.size
+            deleted += 1
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} unreferenced blobs ({freed / (1024 * 1024):.1f} MB); '
+            f'{len(changed)} reference counts updated'
+        ))
+
+    def collect(self, blob, cutoff):
+        """
+        Delete one blob unless it was reused or referenced since the recount.
+        The row lock holds off uploads of the same content until the file is gone.
+        """
+        with transaction.atomic():
+            locked = list(StoredBlob.objects.select_for_update().filter(
+                pk=blob.pk, updated_at__lt=cutoff
+            ).values_list('pk', flat=True))
+            if not locked or is_referenced(blob.name):
+                return False
+            StoredBlob.objects.filter(pk=blob.pk).delete()
+            if isinstance(default_storage, ContentAddressedStorage):
+                default_storage.purge(blob.name)
+        return True
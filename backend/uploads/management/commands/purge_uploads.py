@@ -0,0 +1,34 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from uploads.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete expired or finished upload sessions and their spool files'
+
+    def handle(self, *args, **options):
+        stale = UploadSession.objects.filter(
+            Q(expires_at__lt=timezone.now()) | ~Q(status=UploadSession.Status.ACTIVE)
+        )
+        purged = 0
+        for session in stale.iterator():
+            session.remove_spool()
+            purged += 1
+        stale.delete()
+
+        # Spool files whose session row is gone
+        live = {f'{pk}.part' for pk in UploadSession.objects.values_list('pk', flat=True)}
+        orphans = 0
+        if os.path.isdir(settings.UPLOAD_SPOOL_DIR):
+            for name in os.listdir(settings.UPLOAD_SPOOL_DIR):
+                if name.endswith('.part') and name not in live:
+                    os.remove(os.path.join(settings.UPLOAD_SPOOL_DIR, name))
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {purged} upload sessions and {orphans} orphaned spool files'
+        ))
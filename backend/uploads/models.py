@@ -0,0 +1,76 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress. Received bytes are appended to a spool
+    file on disk until ``offset`` reaches ``size``, then the file is attached
+    to the target model field.
+    """
+    class Status(models.TextChoices):
+        ACTIVE = 'ACTIVE', 'Active'
+        COMPLETED = 'COMPLETED', 'Completed'
+        CANCELLED = 'CANCELLED', 'Cancelled'
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    
+    # Key into uploads.targets.TARGETS, plus the listing id for listing images
+    target = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField(null=True, blank=True)
+    
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.ACTIVE)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='upload_user_created_idx'),
+            models.Index(fields=['status', 'expires_at'], name='upload_status_expires_idx'),
+        ]
+    
+    @property
+    def spool_path(self):
+        return os.path.join(settings.UPLOAD_SPOOL_DIR, f'{self.pk}.part')
+    
+    def remove_spool(self):
+        try:
+            os.remove(self.spool_path)
+        except FileNotFoundError:
+            pass
+    
+    def __str__(self):
+        return f"{self.filename} -> {self.target} ({self.offset}/{self.size})"
+
+
+class StoredBlob(models.Model):
+    """
+    A file kept once under its content digest by ContentAddressedStorage.
+    ``ref_count`` is the number of references found by the last gc_media run.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'created_at'], name='blob_unreferenced_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from . import targets
+from .models import UploadSession
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    target = serializers.ChoiceField(choices=sorted(targets.TARGETS))
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'target', 'object_id', 'filename', 'size', 'offset',
+            'status', 'created_at', 'updated_at', 'expires_at'
+        ]
+        read_only_fields = ['id', 'offset', 'status', 'created_at', 'updated_at', 'expires_at']
+    
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive")
+        return value
+    
+    def validate(self, data):
+        user = self.context['request'].user
+        if targets.resolve(data['target'], user, data.get('object_id')) is None:
+            raise serializers.ValidationError({'object_id': 'You cannot upload to this target'})
+        limit = targets.TARGETS[data['target']].max_bytes()
+        if data['size'] > limit:
+            raise serializers.ValidationError({'size': f'File is larger than {limit // (1024 * 1024)} MB'})
+        return data
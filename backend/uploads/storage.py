@@ -0,0 +1,144 @@
+"""
+Content-addressed media storage.
+
+Every uploaded file is hashed (SHA-256) while it is streamed to a temporary
+file and then stored once as ``blobs/<ab>/<cd>/<digest><ext>``. Saving the
+same content again returns the existing name, so identical photos and
+re-submitted documents share one file on disk.
+
+Blobs are tracked in ``StoredBlob``. Because a blob may be shared,
+``delete()`` never removes files directly; ``manage.py gc_media`` recounts
+the references held by model file fields (and listing image variants) and
+removes blobs nobody points at any more. Saving content that already has a
+blob bumps its ``updated_at``, which restarts gc_media's grace period.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+TMP_DIR = 'blobs/tmp'
+HASH_CHUNK_BYTES = 64 * 1024
+
+_extension = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+
+def blob_name(digest, extension=''):
+    extension = extension.lower()
+    if not _extension.match(extension):
+        extension = ''
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage`` that names files by content digest"""
+
+    def get_available_name(self, name, max_length=None):
+        # Names are chosen in _save() from the content, never suffixed
+        return name
+
+    def _save(self, name, content):
+        StoredBlob = apps.get_model('uploads', 'StoredBlob')
+        tmp_dir = self.path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            name = blob_name(digest, os.path.splitext(name)[1])
+            path = self.path(name)
+            # Waits on gc_media's row lock; no row means the blob was just collected
+            reused = StoredBlob.objects.filter(digest=digest).update(updated_at=timezone.now())
+            if reused and os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if not reused:
+            StoredBlob.objects.get_or_create(digest=digest, defaults={'name': name, 'size': size})
+        return name
+
+    def delete(self, name):
+        # Blobs may be shared between records; gc_media removes unreferenced ones
+        pass
+
+    def purge(self, name):
+        """Really delete a blob (used by gc_media)"""
+        super().delete(name)
+
+
+def file_fields():
+    """Yield (model, field names) for every concrete model with file fields"""
+    for model in apps.get_models():
+        names = [
+            field.name for field in model._meta.concrete_fields
+            if isinstance(field, models.FileField)
+        ]
+        if names:
+            yield model, names
+
+
+def iter_references():
+    """Yield every stored file name a database row points at"""
+    for model, names in file_fields():
+        for row in model._base_manager.values_list(*names).iterator(chunk_size=2000):
+            for name in row:
+                if name:
+                    yield name
+    CropListing = apps.get_model('market', 'CropListing')
+    for variants in CropListing._base_manager.exclude(image_variants={}).values_list(
+        'image_variants', flat=True
+    ).iterator(chunk_size=2000):
+        for entry in (variants or {}).values():
+            for key, name in entry.items():
+                if key != 'source' and name:
+                    yield name
+
+
+def count_references():
+    return Counter(iter_references())
+
+
+def is_referenced(name):
+    """Check the database for any row pointing at ``name`` right now"""
+    for model, names in file_fields():
+        query = models.Q()
+        for field in names:
+            query |= models.Q(**{field: name})
+        if model._base_manager.filter(query).exists():
+            return True
+    CropListing = apps.get_model('market', 'CropListing')
+    return CropListing._base_manager.annotate(
+        variants_text=Cast('image_variants', TextField())
+    ).filter(variants_text__contains=f'"{name}"').exists()
@@ -0,0 +1,57 @@
+"""
+Model file fields that resumable uploads may be attached to.
+
+Each target says which object the signed-in user may write to, the size
+limit, and an optional cleaning step run on the finished file.
+"""
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+from market import images
+from market.models import CropListing
+
+
+class Target:
+    def __init__(self, field, get_object, max_bytes, clean=None):
+        self.field = field
+        self.get_object = get_object
+        self.max_bytes = max_bytes
+        self.clean = clean
+
+
+def own_listing(user, object_id):
+    return CropListing.objects.get(pk=object_id, farmer=user)
+
+
+def farmer_profile(user, object_id):
+    return user.farmer_profile
+
+
+def buyer_profile(user, object_id):
+    return user.buyer_profile
+
+
+def listing_image_limit():
+    return settings.LISTING_IMAGE_MAX_BYTES
+
+
+def document_limit():
+    return settings.UPLOAD_DOCUMENT_MAX_BYTES
+
+
+TARGETS = {
+    'listing.image1': Target('image1', own_listing, listing_image_limit, images.clean_upload),
+    'listing.image2': Target('image2', own_listing, listing_image_limit, images.clean_upload),
+    'listing.image3': Target('image3', own_listing, listing_image_limit, images.clean_upload),
+    'farmer.aadhar_document': Target('aadhar_document', farmer_profile, document_limit),
+    'farmer.land_document': Target('land_document', farmer_profile, document_limit),
+    'buyer.gst_document': Target('gst_document', buyer_profile, document_limit),
+}
+
+
+def resolve(target, user, object_id):
+    """Return the model instance ``user`` may upload ``target`` to, or None"""
+    try:
+        return TARGETS[target].get_object(user, object_id)
+    except (KeyError, ObjectDoesNotExist, ValueError, TypeError):
+        return None
@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from collections import Counter
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.testing import make_buyer, make_farmer, make_listing
+from .management.commands.dedupe_media import Command as DedupeCommand
+from .models import StoredBlob, UploadSession
+from .views import UPLOAD_CONTENT_TYPE
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=f'{tmp}/media', UPLOAD_SPOOL_DIR=f'{tmp}/spool', IMAGE_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def open_session(self, user, target, data, object_id=None):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/uploads/', {
+            'target': target, 'object_id': object_id, 'filename': 'scan.jpg', 'size': len(data)
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response['Upload-Offset'], '0')
+        return f"/api/uploads/{response.data['id']}/"
+
+    def patch(self, url, offset, chunk):
+        return self.client.generic(
+            'PATCH', url, chunk, content_type=UPLOAD_CONTENT_TYPE, HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunks_resume_and_attach_to_listing(self):
+        farmer = make_farmer()
+        listing = make_listing(farmer)
+        buffer = BytesIO()
+        Image.new('RGB', (640, 480), 'yellow').save(buffer, 'JPEG')
+        data = buffer.getvalue()
+        url = self.open_session(farmer, 'listing.image1', data, listing.pk)
+
+        self.assertEqual(self.patch(url, 0, data[:1000]).status_code, 204)
+        # A retried chunk at a stale offset is refused with the offset to resume from
+        stale = self.patch(url, 0, data[:1000])
+        self.assertEqual((stale.status_code, stale['Upload-Offset']), (409, '1000'))
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '1000')
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+
+        response = self.patch(url, 1000, data[1000:])
+        self.assertEqual(response['Upload-Offset'], str(len(data)))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        listing.refresh_from_db()
+        self.assertTrue(listing.image1.name.endswith('.jpg'))
+        self.assertIn('thumb', listing.image_variants['image1'])
+        self.assertEqual(UploadSession.objects.get().status, UploadSession.Status.COMPLETED)
+
+    def test_document_upload_to_own_profile(self):
+        buyer = make_buyer()
+        data = b'%PDF-1.4 fake gst certificate'
+        url = self.open_session(buyer, 'buyer.gst_document', data)
+        self.patch(url, 0, data)
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 200)
+        buyer.buyer_profile.refresh_from_db()
+        with buyer.buyer_profile.gst_document.open('rb') as handle:
+            self.assertEqual(handle.read(), data)
+
+    def test_cannot_target_someone_elses_listing(self):
+        listing = make_listing(make_farmer())
+        self.client.force_authenticate(make_farmer())
+        response = self.client.post('/api/uploads/', {
+            'target': 'listing.image1', 'object_id': listing.pk, 'filename': 'a.jpg', 'size': 10
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_identical_documents_share_one_blob(self):
+        farmers = [make_farmer(), make_farmer()]
+        for farmer in farmers:
+            farmer.farmer_profile.aadhar_document.save('aadhar.pdf', ContentFile(b'%PDF same scan'))
+        names = {farmer.farmer_profile.aadhar_document.name for farmer in farmers}
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().startswith('blobs/'))
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def test_gc_removes_only_unreferenced_blobs(self):
+        profile = make_farmer().farmer_profile
+        profile.aadhar_document.save('kept.pdf', ContentFile(b'kept'))
+        profile.land_document.save('dropped.pdf', ContentFile(b'dropped'))
+        dropped = profile.land_document.name
+        profile.land_document.delete()
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, dropped)))
+        StoredBlob.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        call_command('gc_media', stdout=StringIO())
+
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, dropped)))
+        self.assertEqual(
+            list(StoredBlob.objects.values_list('name', 'ref_count')),
+            [(profile.aadhar_document.name, 1)]
+        )
+
+    def test_reused_blob_survives_gc(self):
+        profile = make_farmer().farmer_profile
+        profile.aadhar_document.save('scan.pdf', ContentFile(b'scan'))
+        profile.aadhar_document.delete()
+        two_days_ago = timezone.now() - timedelta(days=2)
+        StoredBlob.objects.update(created_at=two_days_ago, updated_at=two_days_ago)
+
+        # The same content is uploaded again, but not attached yet
+        name = make_farmer().farmer_profile.aadhar_document.storage.save('again.pdf', ContentFile(b'scan'))
+        call_command('gc_media', stdout=StringIO())
+
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertTrue(StoredBlob.objects.filter(name=name).exists())
+
+    def test_gc_rechecks_references_before_deleting(self):
+        profile = make_farmer().farmer_profile
+        profile.aadhar_document.save('scan.pdf', ContentFile(b'scan'))
+        StoredBlob.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        # Attached after the recount saw no references
+        with mock.patch('uploads.management.commands.gc_media.count_references', return_value=Counter()):
+            call_command('gc_media', stdout=StringIO())
+
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, profile.aadhar_document.name)))
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def test_dedupe_moves_existing_files_into_blobs(self):
+        profiles = [make_farmer().farmer_profile, make_farmer().farmer_profile]
+        for number, profile in enumerate(profiles):
+            name = f'verification/farmer/aadhar/scan{number}.pdf'
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as handle:
+                handle.write(b'same scan')
+            profile.aadhar_document.name = name
+            profile.save(update_fields=['aadhar_document'])
+
+        call_command('dedupe_media', stdout=StringIO())
+
+        for profile in profiles:
+            profile.refresh_from_db()
+            with profile.aadhar_document.open('rb') as handle:
+                self.assertEqual(handle.read(), b'same scan')
+        self.assertEqual(profiles[0].aadhar_document.name, profiles[1].aadhar_document.name)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'verification')))
+
+    def test_dedupe_keeps_originals_until_references_are_rewritten(self):
+        profile = make_farmer().farmer_profile
+        name = 'verification/farmer/aadhar/scan.pdf'
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as handle:
+            handle.write(b'scan')
+        profile.aadhar_document.name = name
+        profile.save(update_fields=['aadhar_document'])
+
+        with mock.patch.object(DedupeCommand, 'rewrite_references', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('dedupe_media', stdout=StringIO())
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.aadhar_document.name, name)
+        with profile.aadhar_document.open('rb') as handle:
+            self.assertEqual(handle.read(), b'scan')
@@ -0,0 +1,159 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from market.images import ImageRejected
+from . import targets
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+
+UPLOAD_CONTENT_TYPE = 'application/offset+octet-stream'
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable uploads (tus-like):
+    
+    1. POST /api/uploads/ {target, object_id, filename, size} opens a session
+    2. PATCH /api/uploads/<id>/ with Upload-Offset and an
+       application/offset+octet-stream body appends a chunk
+    3. HEAD /api/uploads/<id>/ reports the Upload-Offset to resume from
+    4. POST /api/uploads/<id>/finalize/ attaches the file to the target
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+    
+    def offset_headers(self, session):
+        return {
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.size),
+            'Cache-Control': 'no-store',
+        }
+    
+    def perform_create(self, serializer):
+        serializer.save(
+            user=self.request.user,
+            expires_at=timezone.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+        )
+    
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        session = UploadSession(pk=response.data['id'], size=response.data['size'])
+        response['Location'] = request.build_absolute_uri(f"{request.path}{session.pk}/")
+        for name, value in self.offset_headers(session).items():
+            response[name] = value
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        session = self.get_object()
+        return Response(
+            self.get_serializer(session).data,
+            headers=self.offset_headers(session)
+        )
+    
+    def partial_update(self, request, *args, **kwargs):
+        """Append one chunk at Upload-Offset, streaming it to the spool file"""
+        session = self.get_object()
+        if session.status != UploadSession.Status.ACTIVE or session.expires_at <= timezone.now():
+            return Response({'error': 'Upload is no longer active'}, status=status.HTTP_410_GONE)
+        if request.content_type != UPLOAD_CONTENT_TYPE:
+            return Response(
+                {'error': f'Content-Type must be {UPLOAD_CONTENT_TYPE}'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset header is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if offset != session.offset:
+            return Response(
+                {'error': 'Upload-Offset does not match'},
+                status=status.HTTP_409_CONFLICT,
+                headers=self.offset_headers(session)
+            )
+        if length > settings.UPLOAD_CHUNK_MAX_BYTES or offset + length > session.size:
+            return Response({'error': 'Chunk is too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+        mode = 'r+b' if os.path.exists(session.spool_path) else 'w+b'
+        with open(session.spool_path, mode) as spool:
+            # Drop bytes past the recorded offset left by an interrupted request
+            spool.truncate(offset)
+            spool.seek(offset)
+            written = 0
+            while written < length:
+                chunk = request.stream.read(min(READ_CHUNK_BYTES, length - written))
+                if not chunk:
+                    break
+                spool.write(chunk)
+                written += len(chunk)
+        
+        updated = UploadSession.objects.filter(
+            pk=session.pk, offset=offset, status=UploadSession.Status.ACTIVE
+        ).update(offset=offset + written, updated_at=timezone.now())
+        if not updated:
+            session.refresh_from_db()
+            return Response(
+                {'error': 'Upload-Offset does not match'},
+                status=status.HTTP_409_CONFLICT,
+                headers=self.offset_headers(session)
+            )
+        session.offset = offset + written
+        return Response(status=status.HTTP_204_NO_CONTENT, headers=self.offset_headers(session))
+    
+    def perform_destroy(self, instance):
+        instance.remove_spool()
+        instance.delete()
+    
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Attach the completed upload to its target field"""
+        session = self.get_object()
+        if session.status != UploadSession.Status.ACTIVE:
+            return Response({'error': 'Upload is no longer active'}, status=status.HTTP_410_GONE)
+        if session.offset != session.size:
+            return Response(
+                {'error': 'Upload is incomplete'},
+                status=status.HTTP_409_CONFLICT,
+                headers=self.offset_headers(session)
+            )
+        target = targets.TARGETS[session.target]
+        instance = targets.resolve(session.target, request.user, session.object_id)
+        if instance is None:
+            return Response({'error': 'You cannot upload to this target'}, status=status.HTTP_403_FORBIDDEN)
+        
+        field_file = getattr(instance, target.field)
+        with open(session.spool_path, 'rb') as spool:
+            upload = File(spool, name=os.path.basename(session.filename))
+            if target.clean:
+                try:
+                    upload = target.clean(upload)
+                except ImageRejected as exc:
+                    return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            field_file.save(upload.name, upload, save=False)
+        instance.save(update_fields=[target.field, 'updated_at'])
+        
+        UploadSession.objects.filter(pk=session.pk).update(
+            status=UploadSession.Status.COMPLETED, updated_at=timezone.now()
+        )
+        session.remove_spool()
+        return Response({
+            'target': session.target,
+            'object_id': session.object_id,
+            'url': request.build_absolute_uri(field_file.url),
+        })
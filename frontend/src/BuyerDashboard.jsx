@@ -19,8 +19,8 @@ export default function BuyerDashboard() {
     const loadData = async () => {
         try {
             const [listingsRes, bidsRes] = await Promise.all([
-                api.get('/listings/'),
-                api.get('/bids/')
+                api.get('/listings/?expand=crop_variety'),
+                api.get('/bids/?expand=listing')
             ]);
             setListings(listingsRes.data.results || listingsRes.data);
             setMyBids(bidsRes.data.results || bidsRes.data);
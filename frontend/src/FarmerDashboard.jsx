@@ -18,7 +18,7 @@ export default function FarmerDashboard() {
 
     const loadListings = async () => {
         try {
-            const response = await api.get('/listings/');
+            const response = await api.get('/listings/?expand=crop_variety');
             setListings(response.data.results || response.data);
             setLoading(false);
         } catch (error) {
@@ -30,7 +30,7 @@ export default function FarmerDashboard() {
     const fetchBids = async (listingId) => {
         setViewingBids(listingId);
         try {
-            const response = await api.get(`/bids/?listing=${listingId}`);
+            const response = await api.get(`/bids/?listing=${listingId}&expand=buyer`);
             setBids(response.data.results || response.data);
         } catch (error) {
             console.error('Error fetching bids:', error);
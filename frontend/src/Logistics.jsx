@@ -17,7 +17,7 @@ export default function Logistics() {
 
     const loadShipments = async () => {
         try {
-            const response = await api.get('/logistics/shipments/');
+            const response = await api.get('/logistics/shipments/?expand=order.listing.crop_variety');
             setShipments(response.data.results || response.data);
             setLoading(false);
         } catch (err) {
@@ -176,12 +176,12 @@ export default function Logistics() {
 
                                 </div>
 
-                                {/* Actions (Farmer Only) */}
-                                {isFarmer && shipment.status !== 'DELIVERED' && shipment.status !== 'FAILED' && (
+                                {/* Actions: the farmer ships, the buyer confirms delivery */}
+                                {(isFarmer ? shipment.status === 'SCHEDULED' : shipment.status === 'IN_TRANSIT') && (
                                     <div style={{ marginTop: '8px', paddingTop: '16px', borderTop: '1px solid #f0f0f0' }}>
                                         <p style={{ fontSize: '12px', color: '#878787', marginBottom: '8px' }}>Update Status:</p>
                                         <div style={{ display: 'flex', gap: '8px' }}>
-                                            {shipment.status === 'SCHEDULED' && (
+                                            {isFarmer && (
                                                 <button
                                                     onClick={() => handleStatusUpdate(shipment.id, 'IN_TRANSIT')}
                                                     style={{
@@ -198,7 +198,7 @@ export default function Logistics() {
                                                     Start Transit
                                                 </button>
                                             )}
-                                            {shipment.status === 'IN_TRANSIT' && (
+                                            {!isFarmer && (
                                                 <button
                                                     onClick={() => handleStatusUpdate(shipment.id, 'DELIVERED')}
                                                     style={{
@@ -212,7 +212,7 @@ export default function Logistics() {
                                                         fontSize: '13px'
                                                     }}
                                                 >
-                                                    Mark Delivered
+                                                    Confirm Delivery
                                                 </button>
                                             )}
                                         </div>